@@ -0,0 +1,8 @@
+"""
+Reproducible performance benchmarks for the scanner.
+
+python -m bench generates a synthetic RimWorld-like corpus (bench/corpus.py),
+puts a deterministic stub ilspycmd (bench/stub_ilspycmd.py) first on PATH
+and times end-to-end scans and individual pipeline stages, each in a fresh
+process. Results are written as JSON and can be compared with --compare.
+"""
@@ -0,0 +1,343 @@
+"""
+Benchmark runner: python -m bench [--preset small] [--output results.json]
+
+Every scenario runs in its own child process (python -m bench --child ...)
+so peak RSS is per scenario and caches in memory do not leak between them.
+End-to-end scenarios run ScanEngine, the engine behind ScanWorker, on the
+synthetic corpus:
+
+    cold             empty decompilation cache, few terms
+    warm             decompilations cached, manifest off, few terms
+    incremental      decompilations cached and manifest reused, few terms
+    many_terms       decompilations cached, manifest off, MANY_TERMS
+    scan_for_string  the legacy XML-only scan_for_string()
+
+Stage scenarios time one pipeline stage on its own: stage_walk (directory
+enumeration), stage_hash (DLL SHA-1), stage_xml_search (single-threaded
+XML matching), stage_decompile (stub ilspycmd on every distinct DLL, in
+batches of --decompile-batch DLLs per run), stage_dll_search (trigram index plus matching over decompiled sources) and
+stage_default_terms (matching every XML and decompiled source against the
+search_string shipped in the repository's settings.json).
+
+Results are printed as a table and written as JSON; --compare OLD.json
+prints the ratio of this run (or of NEW.json) to an earlier one.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench.corpus import PRESETS, API_NAMES, generate
+
+END_TO_END = ['cold', 'warm', 'incremental', 'many_terms', 'scan_for_string']
+STAGES = ['stage_walk', 'stage_hash', 'stage_xml_search', 'stage_decompile', 'stage_dll_search', 'stage_default_terms']
+SCENARIOS = END_TO_END + STAGES
+
+FEW_TERMS = "steel;CompProperties_Power;System.Diagnostics.Process.Start"
+# Every API name plus wildcard and regex terms, like a security sweep's term list
+MANY_TERMS = ";".join(API_NAMES + ["System.Reflection.Emit.*", "System.Security.Cryptography.*",
+                                   r"re:File\.(Copy|Move|Delete)", "plasteel", "hyperweave", "uranium"])
+
+
+def peak_rss_mb():
+    """ Peak RSS of this process and of its largest finished child, in MB (None where unknown) """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024), None
+        except (ImportError, AttributeError):
+            return None, None
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / (1024 * 1024)
+    return own, children
+
+
+def install_stub(bin_dir, delay, delay_per_mb, startup):
+    """ Put an ilspycmd wrapper around bench/stub_ilspycmd.py in bin_dir """
+    os.makedirs(bin_dir, exist_ok=True)
+    stub = os.path.join(REPO_DIR, 'bench', 'stub_ilspycmd.py')
+    options = f'--stub-startup {startup} --stub-delay {delay} --stub-delay-per-mb {delay_per_mb}'
+    if os.name == 'nt':
+        with open(os.path.join(bin_dir, 'ilspycmd.cmd'), 'w') as f:
+            f.write(f'@"{sys.executable}" "{stub}" {options} %*\n')
+        return
+    path = os.path.join(bin_dir, 'ilspycmd')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{stub}" {options} "$@"\n')
+    os.chmod(path, 0o755)
+
+
+# -- Child side: one scenario per process --
+
+def _files(corpus, extension):
+    from core.discovery import walk_files
+    return [(path, st.st_size) for path, _, st in walk_files(corpus, [extension])]
+
+
+def _run_engine(args, terms, incremental, fresh_cache=False):
+    from core.engine import ScanEngine
+    from libs.Settings import Settings
+    cache_dir = os.path.join(args.workdir, 'decomp_cache')
+    if fresh_cache:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    # A settings file that does not exist, so the user's settings.json plays no part
+    engine = ScanEngine([args.corpus], terms, cache_dir=cache_dir,
+                        settings=Settings(os.path.join(args.workdir, 'settings.json')),
+                        search_backend=args.backend, search_workers=args.workers, incremental=incremental,
+                        cache_format=args.cache_format, decompile_batch_size=args.decompile_batch,
+                        prefilter=args.prefilter or None, targeted=args.targeted)
+    summary = engine.run()
+    description = args.description
+    return {'files': summary.files_found, 'bytes': description['xml_bytes'] + description['dll_bytes'],
+            'matches': len(summary.records), 'errors': summary.errors, 'scan_report': summary.report}
+
+
+def _stage_decompile_dir(args):
+    return os.path.join(args.workdir, 'stage_decompiled')
+
+
+def run_scenario(args):
+    name = args.child
+    if name == 'cold':
+        return _run_engine(args, FEW_TERMS, incremental=True, fresh_cache=True)
+    if name == 'warm':
+        return _run_engine(args, FEW_TERMS, incremental=False)
+    if name == 'incremental':
+        return _run_engine(args, FEW_TERMS, incremental=True)
+    if name == 'many_terms':
+        return _run_engine(args, MANY_TERMS, incremental=False)
+    if name == 'scan_for_string':
+        from core.engine import scan_for_string
+        found = scan_for_string(args.corpus, FEW_TERMS)
+        return {'files': args.description['xml_files'], 'bytes': args.description['xml_bytes'], 'matches': len(found)}
+    if name == 'stage_walk':
+        from core.discovery import walk_files
+        files = list(walk_files(args.corpus, ['.xml', '.dll']))
+        return {'files': len(files), 'bytes': 0}
+    if name == 'stage_hash':
+        from core.identity import file_sha1
+        dlls = _files(args.corpus, '.dll')
+        for path, _ in dlls:
+            file_sha1(path)
+        return {'files': len(dlls), 'bytes': sum(size for _, size in dlls)}
+    if name == 'stage_xml_search':
+        from core.matcher import TermMatcher, extract_matches, parse_terms
+        matcher = TermMatcher(parse_terms(FEW_TERMS))
+        xmls = _files(args.corpus, '.xml')
+        matches = sum(1 for path, _ in xmls if extract_matches(path, matcher))
+        return {'files': len(xmls), 'bytes': sum(size for _, size in xmls), 'matches': matches}
+    if name == 'stage_decompile':
+        from core.decompile_scheduler import DEFAULT_BATCH_SIZE
+        from core.decompiler import ProcessBackend
+        from core.identity import file_sha1
+        out_dir = _stage_decompile_dir(args)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        distinct = {}
+        for path, size in _files(args.corpus, '.dll'):
+            distinct.setdefault(file_sha1(path), (path, size))
+        decompiler = ProcessBackend()
+        jobs = list(distinct.items())
+        batch_size = args.decompile_batch or DEFAULT_BATCH_SIZE
+        for start in range(0, len(jobs), batch_size):
+            batch = jobs[start:start + batch_size]
+            errors = decompiler.decompile_batch([path for _, (path, _) in batch],
+                                                [os.path.join(out_dir, file_hash) for file_hash, _ in batch])
+            for error in errors:
+                if error is not None:
+                    raise error
+        return {'files': len(distinct), 'bytes': sum(size for _, size in distinct.values())}
+    if name == 'stage_dll_search':
+        from core.decomp_index import load_or_build_index
+        from core.matcher import TermMatcher, extract_matches, parse_terms
+        out_dir = _stage_decompile_dir(args)
+        if not os.path.isdir(out_dir):
+            raise RuntimeError("stage_dll_search needs the output of stage_decompile")
+        matcher = TermMatcher(parse_terms(MANY_TERMS))
+        files = searched = size = matches = 0
+        for entry in sorted(os.listdir(out_dir)):
+            index = load_or_build_index(os.path.join(out_dir, entry))
+            files += len(index.files)
+            for path in index.candidates(matcher.index_terms()):
+                searched += 1
+                size += os.path.getsize(path)
+                matches += 1 if extract_matches(path, matcher) else 0
+        return {'files': files, 'bytes': size, 'matches': matches, 'searched': searched}
+    if name == 'stage_default_terms':
+        from core.matcher import TermMatcher, extract_matches, parse_terms
+        from libs.Settings import Settings
+        matcher = TermMatcher(parse_terms(Settings(os.path.join(REPO_DIR, 'settings.json')).get('search_string', '')))
+        files = _files(args.corpus, '.xml') + _files(_stage_decompile_dir(args), '.cs')
+        matches = sum(1 for path, _ in files if extract_matches(path, matcher))
+        return {'files': len(files), 'bytes': sum(size for _, size in files), 'matches': matches,
+                'terms': len(matcher.terms)}
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def child_main(args):
+    with open(os.path.join(args.corpus, 'corpus.json'), 'r', encoding='utf-8') as f:
+        args.description = json.load(f)
+    start_times = os.times()
+    start = time.perf_counter()
+    result = run_scenario(args)
+    wall = time.perf_counter() - start
+    end_times = os.times()
+    cpu = sum(end_times[:4]) - sum(start_times[:4])
+    own_rss, children_rss = peak_rss_mb()
+    mb = result.get('bytes', 0) / (1024 * 1024)
+    result.update({
+        'scenario': args.child,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'files_per_s': round(result['files'] / wall, 1) if wall else None,
+        'mb_per_s': round(mb / wall, 2) if wall and mb else None,
+        'peak_rss_mb': round(own_rss, 1) if own_rss is not None else None,
+        'peak_children_rss_mb': round(children_rss, 1) if children_rss is not None else None,
+    })
+    print(json.dumps(result))
+
+
+# -- Parent side --
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    previous = {r['scenario']: r for r in baseline['results']} if baseline else {}
+    header = f"{'scenario':<18}{'wall s':>9}{'cpu s':>9}{'files/s':>11}{'MB/s':>9}{'RSS MB':>9}"
+    print(header + ("   vs baseline" if baseline else ""))
+    for r in results:
+        if 'error' in r:
+            print(f"{r['scenario']:<18}  failed: {r['error']}")
+            continue
+        line = (f"{r['scenario']:<18}{r['wall_s']:>9.2f}{r['cpu_s']:>9.2f}{r['files_per_s'] or 0:>11.0f}"
+                f"{r['mb_per_s'] or 0:>9.1f}{r['peak_rss_mb'] or 0:>9.0f}")
+        old = previous.get(r['scenario'])
+        if old and old.get('wall_s'):
+            line += f"   {r['wall_s'] / old['wall_s']:.2f}x time"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scanner on a synthetic RimWorld-like corpus")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default='small', help="Corpus size (default: small)")
+    parser.add_argument("--seed", type=int, default=1, help="Corpus seed (default: 1)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), 'xmlscanner-bench'),
+                        help="Where the corpus, stub and caches live; reused between runs")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run, in order (default: all of {','.join(SCENARIOS)})")
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="Seconds every stub decompile takes at least")
+    parser.add_argument("--stub-delay-per-mb", type=float, default=0.5, help="Extra stub decompile seconds per MB")
+    parser.add_argument("--stub-startup", type=float, default=0.0,
+                        help="Seconds each stub process takes to start, like .NET and ILSpy startup (default: 0)")
+    parser.add_argument("--decompile-batch", type=int,
+                        help="Most small DLLs per decompiler run in cold and stage_decompile, 1 for one run per DLL "
+                             "(default: the engine's)")
+    parser.add_argument("--backend", help="Search backend for end-to-end scenarios (default: the engine's)")
+    parser.add_argument("--workers", type=int, help="Search workers for end-to-end scenarios")
+    parser.add_argument("--cache-format", help="Decompilation cache format for end-to-end scenarios (default: the engine's)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Check each uncached DLL's metadata before decompiling it in end-to-end scenarios")
+    parser.add_argument("--targeted", action="store_true",
+                        help="Decompile only the types that can match in end-to-end scenarios (targeted_decompile; implies --prefilter)")
+    parser.add_argument("--output", help="JSON results file (default: bench-<preset>-<time>.json)")
+    parser.add_argument("--compare", nargs='+', metavar='JSON',
+                        help="OLD.json to compare this run with, or OLD.json NEW.json to compare two saved runs")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return 0
+
+    baseline = None
+    if args.compare:
+        with open(args.compare[0], 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if len(args.compare) > 1:
+            with open(args.compare[1], 'r', encoding='utf-8') as f:
+                print_table(json.load(f)['results'], baseline)
+            return 0
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    workdir = os.path.abspath(args.workdir)
+    corpus = os.path.join(workdir, f'corpus-{args.preset}-{args.seed}')
+    print(f"Generating {args.preset} corpus in {corpus}...", file=sys.stderr)
+    description = generate(corpus, PRESETS[args.preset], args.seed)
+    bin_dir = os.path.join(workdir, 'bin')
+    install_stub(bin_dir, args.stub_delay, args.stub_delay_per_mb, args.stub_startup)
+    env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''))
+
+    results = []
+    for scenario in scenarios:
+        print(f"Running {scenario}...", file=sys.stderr)
+        command = [sys.executable, '-m', 'bench', '--child', scenario, '--workdir', workdir, '--corpus', corpus]
+        if args.backend:
+            command += ['--backend', args.backend]
+        if args.workers:
+            command += ['--workers', str(args.workers)]
+        if args.cache_format:
+            command += ['--cache-format', args.cache_format]
+        if args.decompile_batch:
+            command += ['--decompile-batch', str(args.decompile_batch)]
+        if args.prefilter:
+            command.append('--prefilter')
+        if args.targeted:
+            command.append('--targeted')
+        process = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            results.append({'scenario': scenario, 'error': (process.stderr.strip().splitlines() or ['?'])[-1]})
+            continue
+        results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'preset': args.preset,
+        'corpus': description,
+        'stub_delay': args.stub_delay,
+        'stub_delay_per_mb': args.stub_delay_per_mb,
+        'stub_startup': args.stub_startup,
+        'decompile_batch': args.decompile_batch,
+        'prefilter': args.prefilter or args.targeted,
+        'targeted': args.targeted,
+        'backend': args.backend,
+        'workers': args.workers,
+        'cache_format': args.cache_format,
+        'results': results,
+    }
+    output = args.output or f"bench-{args.preset}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_table(results, baseline)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 1 if any('error' in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
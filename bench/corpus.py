@@ -0,0 +1,274 @@
+"""
+Synthetic RimWorld-like corpus for benchmarks.
+
+generate() lays out, under one root:
+
+    Core/Defs/<Category>/*.xml                 a Core Defs-like tree
+    294100/<id>/About/About.xml                workshop mods, each with
+    294100/<id>/<version>/Defs/**/*.xml        versioned Defs folders,
+    294100/<id>/<version>/Assemblies/*.dll     versioned assemblies and
+                                               a shared 0Harmony.dll
+
+Everything is derived from a seed, so the same spec always produces the
+same bytes. DLLs are minimal .NET PE files with one class per 2 KB, whose
+methods call a few API names (MemberRefs) and patch types (TypeRefs) from
+their IL, followed by filler bytes. bench/stub_ilspycmd.py decompiles the
+classes from that metadata, and the metadata prefilter reads it like a
+real assembly's. Mods reuse their assembly across version folders and all
+ship the same 0Harmony.dll, as real ones do, so duplicate detection gets
+exercised.
+"""
+
+import json
+import os
+import random
+import struct
+from typing import Dict, NamedTuple, Tuple
+
+SPEC_FILENAME = 'corpus.json'
+# Bumped when the same spec and seed start producing different files
+CORPUS_FORMAT = 3
+# One class per this many bytes of DLL
+BYTES_PER_TYPE = 2048
+
+# API names embedded in DLLs; the terms used by the scenarios come from here
+API_NAMES = [
+    "System.Diagnostics.Process.Start", "System.IO.File.Copy", "System.IO.File.WriteAllText",
+    "System.IO.File.Delete", "System.IO.Directory.CreateDirectory", "System.Net.WebClient.DownloadString",
+    "System.Net.Http.HttpClient.GetAsync", "System.Reflection.Assembly.Load",
+    "System.Reflection.Emit.DynamicMethod", "System.Threading.Tasks.Task.Run",
+    "System.Runtime.InteropServices.Marshal.AllocHGlobal", "Microsoft.Win32.Registry.CurrentUser",
+    "Environment.GetEnvironmentVariable", "Convert.FromBase64String",
+    "Verse.Log.Message", "Verse.GenSpawn.Spawn", "RimWorld.PawnGenerator.GeneratePawn",
+    "HarmonyLib.Harmony.PatchAll", "Verse.Scribe_Values.Look", "UnityEngine.GUI.Label",
+]
+CATEGORIES = ["ThingDefs_Items", "ThingDefs_Buildings", "ThingDefs_Races", "RecipeDefs", "ResearchProjectDefs",
+              "HediffDefs", "JobDefs", "WorkGiverDefs", "TerrainDefs", "PawnKindDefs"]
+WORDS = ["steel", "plasteel", "wood", "component", "pawn", "colonist", "turret", "bed", "table", "medicine",
+         "meal", "silver", "gold", "uranium", "jade", "cloth", "leather", "hyperweave", "power", "battery"]
+COMPS = ["CompProperties_Power", "CompProperties_Flickable", "CompProperties_Breakdownable",
+         "CompProperties_Forbiddable", "CompProperties_Glower", "CompProperties_Refuelable"]
+
+
+class CorpusSpec(NamedTuple):
+    core_xml: int  # XML files in Core/Defs
+    mods: int  # workshop mods under 294100/
+    versions: Tuple[str, ...]  # version folders per mod
+    xml_per_version: int
+    defs_per_xml: int
+    dlls_per_mod: int
+    dll_kb: int
+    harmony_kb: int  # size of the 0Harmony.dll every mod ships
+    large_xml_mb: int  # one oversized XML file to exercise windowed scanning (0 = none)
+
+
+PRESETS: Dict[str, CorpusSpec] = {
+    'tiny': CorpusSpec(20, 10, ('1.5',), 5, 20, 1, 16, 32, 0),
+    'small': CorpusSpec(200, 60, ('1.4', '1.5'), 10, 40, 1, 64, 128, 0),
+    'medium': CorpusSpec(800, 300, ('1.3', '1.4', '1.5'), 12, 60, 2, 128, 256, 16),
+    'large': CorpusSpec(2000, 1200, ('1.3', '1.4', '1.5'), 15, 60, 2, 256, 512, 64),
+}
+
+
+def _thing_def(rng, index):
+    word = rng.choice(WORDS)
+    lines = [
+        '  <ThingDef ParentName="ResourceBase">',
+        f'    <defName>{word.capitalize()}{index}</defName>',
+        f'    <label>{word} {index}</label>',
+        f'    <description>A synthetic {word} made of {rng.choice(WORDS)} and {rng.choice(WORDS)}.</description>',
+        '    <statBases>',
+        f'      <MarketValue>{rng.randint(1, 500)}</MarketValue>',
+        f'      <Mass>{rng.random():.2f}</Mass>',
+        '    </statBases>',
+        '    <costList>',
+        f'      <{rng.choice(WORDS).capitalize()}>{rng.randint(1, 80)}</{rng.choice(WORDS).capitalize()}>',
+        '    </costList>',
+    ]
+    if rng.random() < 0.4:
+        lines += ['    <comps>', f'      <li Class="{rng.choice(COMPS)}" />', '    </comps>']
+    lines.append('  </ThingDef>')
+    return "\n".join(lines)
+
+
+def _defs_xml(rng, defs):
+    return '<?xml version="1.0" encoding="utf-8"?>\n<Defs>\n' + "\n".join(_thing_def(rng, i) for i in range(defs)) + '\n</Defs>\n'
+
+
+# Method signature blob: default calling convention, no parameters, returns void
+_VOID_SIGNATURE = b'\x00\x00\x01'
+# IL: ldc.i4.0, call or box <token>, pop
+_CALL, _BOX = b'\x16\x28', b'\x16\x8C'
+_POP, _RET = b'\x26', b'\x2A'
+# Metadata tables written, in table order
+_MODULE, _TYPE_REF, _TYPE_DEF, _METHOD_DEF, _MEMBER_REF, _ASSEMBLY = 0x00, 0x01, 0x02, 0x06, 0x0A, 0x20
+
+
+def _method_body(code):
+    """ code behind a fat method header, padded to 4 bytes """
+    body = struct.pack('<HHII', 0x3003, 8, len(code), 0) + code
+    return body + b'\0' * (-len(body) % 4)
+
+
+def _pe_assembly(name, type_refs, member_refs, type_defs, size, rng):
+    """ A PE32 .NET DLL of about size bytes: one .text section holding the CLI header, method bodies and
+    metadata, then filler standing in for resources.
+
+    type_refs are (namespace, name), member_refs (TypeRef row, name) and type_defs (namespace, name,
+    methods), each method the list of tokens its body uses.
+    """
+    strings = {'': 0}
+    heap = bytearray(b'\0')
+    for text in [name, f'{name}.dll', '<Module>'] + [n for ref in type_refs for n in ref] \
+            + [n for _, n in member_refs] + [n for t in type_defs for n in t[:2]] \
+            + [f'Method{m}' for t in type_defs for m in range(len(t[2]))]:
+        if text not in strings:
+            strings[text] = len(heap)
+            heap += text.encode('ascii') + b'\0'
+    heap += b'\0' * (-len(heap) % 4)
+    s = 'I' if len(heap) >= 1 << 16 else 'H'
+    blob = b'\0' + bytes([len(_VOID_SIGNATURE)]) + _VOID_SIGNATURE
+    blob += b'\0' * (-len(blob) % 4)
+    section_rva, section_offset, cli_size = 0x2000, 0x200, 72
+
+    bodies = b''
+    method_rvas = []
+    for _, _, methods in type_defs:
+        for tokens in methods:
+            code = b''.join((_CALL if token >> 24 == _MEMBER_REF else _BOX) + struct.pack('<I', token) + _POP
+                            for token in tokens) + _RET
+            method_rvas.append(section_rva + cli_size + len(bodies))
+            bodies += _method_body(code)
+
+    rows = {
+        _MODULE: [struct.pack(f'<H{s}HHH', 0, strings[f'{name}.dll'], 0, 0, 0)],
+        # Resolution scope: this module
+        _TYPE_REF: [struct.pack(f'<H{s}{s}', 1 << 2, strings[n], strings[ns]) for ns, n in type_refs],
+        _TYPE_DEF: [struct.pack(f'<I{s}{s}HHH', 0, strings['<Module>'], 0, 0, 1, 1)],
+        _METHOD_DEF: [],
+        _MEMBER_REF: [struct.pack(f'<H{s}H', parent << 3 | 1, strings[n], 1) for parent, n in member_refs],
+        _ASSEMBLY: [struct.pack(f'<IHHHHIH{s}{s}', 0x8004, 1, 0, 0, 0, 0, 0, strings[name], 0)],
+    }
+    for namespace, type_name, methods in type_defs:
+        # Public class, its methods following those of the previous class
+        rows[_TYPE_DEF].append(struct.pack(f'<I{s}{s}HHH', 0x100001, strings[type_name], strings[namespace], 0, 1,
+                                           len(rows[_METHOD_DEF]) + 1))
+        for m in range(len(methods)):
+            rows[_METHOD_DEF].append(struct.pack(f'<IHH{s}HH', method_rvas[len(rows[_METHOD_DEF])], 0, 0x86,
+                                                 strings[f'Method{m}'], 1, 1))
+    present = [table for table, table_rows in rows.items() if table_rows]
+    tables = struct.pack('<IBBBBQQ', 0, 2, 0, 1 if s == 'I' else 0, 1, sum(1 << t for t in present), 0)
+    tables += b''.join(struct.pack('<I', len(rows[t])) for t in present)
+    tables += b''.join(row for t in present for row in rows[t])
+    tables += b'\0' * (-len(tables) % 4)
+
+    version = b'v4.0.30319\0\0'
+    headers = [(b'#~\0\0', tables), (b'#Strings\0\0\0\0', bytes(heap)), (b'#Blob\0\0\0', blob)]
+    root_size = 16 + len(version) + 4 + sum(8 + len(n) for n, _ in headers)
+    metadata = struct.pack('<IHHII', 0x424A5342, 1, 1, 0, len(version)) + version + struct.pack('<HH', 0, len(headers))
+    offset = root_size
+    for stream_name, stream in headers:
+        metadata += struct.pack('<II', offset, len(stream)) + stream_name
+        offset += len(stream)
+    metadata += b''.join(stream for _, stream in headers)
+    cli = struct.pack('<IHHIII', cli_size, 2, 5, section_rva + cli_size + len(bodies), len(metadata), 1) + b'\0' * 52
+    filler_size = max(0, size - section_offset - len(cli) - len(bodies) - len(metadata))
+    section = cli + bodies + metadata + (rng.getrandbits(8 * filler_size).to_bytes(filler_size, 'little')
+                                         if filler_size else b'')
+    directories = [(0, 0)] * 16
+    directories[14] = (section_rva, cli_size)
+    optional = struct.pack('<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII', 0x10B, 8, 0, len(section), 0, 0, 0, section_rva, 0,
+                           0x10000000, 0x2000, 0x200, 4, 0, 0, 0, 4, 0, 0, section_rva + len(section), section_offset,
+                           0, 3, 0x8540, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16)
+    optional += b''.join(struct.pack('<II', *d) for d in directories)
+    coff = struct.pack('<HHIIIHH', 0x14C, 1, 0, 0, 0, len(optional), 0x2102)
+    section_header = struct.pack('<8sIIIIIIHHI', b'.text', len(section), section_rva, len(section), section_offset,
+                                 0, 0, 0, 0, 0x60000020)
+    dos = b'MZ' + b'\0' * 58 + struct.pack('<I', 0x80)
+    head = dos + b'\0' * (0x80 - len(dos)) + b'PE\0\0' + coff + optional + section_header
+    return head + b'\0' * (section_offset - len(head)) + section
+
+
+def _dll_bytes(rng, size, name):
+    """ An assembly named name whose classes call a few APIs and use a few patch types """
+    type_refs, member_refs, uses = [], [], []
+    for api in rng.sample(API_NAMES, rng.randint(1, 5)):
+        *namespace, type_name, member = api.split('.')
+        type_ref = ('.'.join(namespace), type_name)
+        if type_ref not in type_refs:
+            type_refs.append(type_ref)
+        member_refs.append((type_refs.index(type_ref) + 1, member))
+        uses.append(_MEMBER_REF << 24 | len(member_refs))
+    for _ in range(rng.randint(2, 8)):
+        type_ref = (f"Mod{rng.randint(0, 9999)}", f"{rng.choice(WORDS).capitalize()}Patch")
+        if type_ref not in type_refs:
+            type_refs.append(type_ref)
+        uses.append(_TYPE_REF << 24 | type_refs.index(type_ref) + 1)
+    type_count = max(1, size // BYTES_PER_TYPE)
+    type_defs = []
+    for i in range(type_count):
+        # Each API call and patch type lands in one class, so searches have to find it
+        own = [token for n, token in enumerate(uses) if n % type_count == i]
+        methods = [[token for token in own if m == 0 or rng.random() < 0.5] for m in range(rng.randint(2, 6))]
+        type_defs.append((f'{name}.Part{i % 7}', f'Class{i}', methods))
+    return _pe_assembly(name, type_refs, member_refs, type_defs, size, rng)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data.encode('utf-8') if isinstance(data, str) else data)
+    return len(data)
+
+
+def generate(root: str, spec: CorpusSpec, seed: int = 1) -> dict:
+    """ Write the corpus for spec under root, unless root already holds exactly that corpus.
+
+    Returns the corpus description: spec, seed and file/byte counts per kind.
+    """
+    description = {'spec': spec._asdict(), 'seed': seed, 'format': CORPUS_FORMAT}
+    spec_path = os.path.join(root, SPEC_FILENAME)
+    try:
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if {k: existing.get(k) for k in description} == json.loads(json.dumps(description)):
+            return existing
+    except (OSError, ValueError):
+        pass
+
+    rng = random.Random(seed)
+    counts = {'xml_files': 0, 'xml_bytes': 0, 'dll_files': 0, 'dll_bytes': 0}
+
+    def add(kind, path, data):
+        counts[f'{kind}_files'] += 1
+        counts[f'{kind}_bytes'] += _write(path, data)
+
+    for i in range(spec.core_xml):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        add('xml', os.path.join(root, 'Core', 'Defs', category, f'{category}_{i}.xml'), _defs_xml(rng, spec.defs_per_xml))
+
+    harmony = _dll_bytes(random.Random(seed + 1), spec.harmony_kb * 1024, '0Harmony')
+    for m in range(spec.mods):
+        mod_dir = os.path.join(root, '294100', str(2000000000 + m * 7919))
+        add('xml', os.path.join(mod_dir, 'About', 'About.xml'),
+            f'<?xml version="1.0" encoding="utf-8"?>\n<ModMetaData>\n  <name>Synthetic Mod {m}</name>\n'
+            f'  <packageId>bench.mod{m}</packageId>\n</ModMetaData>\n')
+        assemblies = [_dll_bytes(rng, spec.dll_kb * 1024, f'Mod{m}_{d}') for d in range(spec.dlls_per_mod)]
+        for version in spec.versions:
+            for x in range(spec.xml_per_version):
+                category = CATEGORIES[(m + x) % len(CATEGORIES)]
+                add('xml', os.path.join(mod_dir, version, 'Defs', category, f'Mod{m}_{x}.xml'),
+                    _defs_xml(rng, spec.defs_per_xml))
+            # The same assembly in every version folder, as many mods do
+            for d, data in enumerate(assemblies):
+                add('dll', os.path.join(mod_dir, version, 'Assemblies', f'Mod{m}_{d}.dll'), data)
+            add('dll', os.path.join(mod_dir, version, 'Assemblies', '0Harmony.dll'), harmony)
+
+    if spec.large_xml_mb:
+        chunk = _defs_xml(rng, 200)
+        repeats = spec.large_xml_mb * 1024 * 1024 // len(chunk) + 1
+        add('xml', os.path.join(root, 'Core', 'Defs', 'Large', 'Large.xml'), chunk * repeats)
+
+    description.update(counts)
+    _write(spec_path, json.dumps(description, indent=2))
+    return description
@@ -0,0 +1,124 @@
+"""
+Stand-in for ilspycmd in benchmarks.
+
+Accepts the same command lines the scanner uses (dll -o outdir -p ... for a
+project, dll -o outdir -t type ... for one type) and decompiles the DLL's
+metadata (see bench/corpus.py) into deterministic C#: one class per
+TypeDef, with a call for every API member and patch type its IL uses. A
+project puts each class in a namespace folder, and -t writes
+outdir/<type>.decompiled.cs, as ilspycmd does. --stub-delay and
+--stub-delay-per-mb make each run take a controlled amount of time, like
+the real decompiler does for big assemblies (a single type costs its share
+of the DLL), and --stub-startup adds a one-off delay per process like .NET
+and ILSpy startup.
+
+Several DLLs with -p make one project per assembly, in
+outdir/<assembly name>/, next to a solution file, as ilspycmd does; the
+startup delay is paid once for the whole run.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.clr_metadata import MEMBER_REF, METHOD_DEF, TYPE_DEF, TYPE_REF, il_tokens, read_metadata  # noqa: E402
+
+
+def _class_source(metadata, row, seed):
+    """ C# for the TypeDef at row """
+    _, name, namespace, _, _, first = metadata.rows(TYPE_DEF)[row - 1]
+    namespace, name = metadata.string(namespace), metadata.string(name)
+    type_defs, method_defs = metadata.rows(TYPE_DEF), metadata.rows(METHOD_DEF)
+    end = type_defs[row][5] if row < len(type_defs) else len(method_defs) + 1
+    rng = random.Random(f'{seed}:{namespace}.{name}')
+    methods = []
+    for method in range(first, end):
+        rva, _, _, method_name, _, _ = method_defs[method - 1]
+        body = [f'            var value{i} = {rng.randint(0, 1000)};' for i in range(rng.randint(3, 12))]
+        for token in il_tokens(metadata.method_body(rva).code):
+            if token >> 24 == MEMBER_REF:
+                parent, member, _ = metadata.rows(MEMBER_REF)[(token & 0xFFFFFF) - 1]
+                parent_row = metadata.decode_coded('MemberRefParent', parent)[1]
+                body.append(f'            {metadata.type_ref_name(parent_row)}.{metadata.string(member)}(value0);')
+            elif token >> 24 == TYPE_REF:
+                body.append(f'            new {metadata.type_ref_name(token & 0xFFFFFF)}(value0);')
+        methods.append(f'        public void {metadata.string(method_name)}()\n        {{\n' + "\n".join(body)
+                       + '\n        }\n')
+    return (f'namespace {namespace}\n{{\n    public class {name}\n    {{\n'
+            + "\n".join(methods) + '    }\n}\n')
+
+
+def decompile(dll_path, output_dir, types=None):
+    """ Write the project for dll_path, or just types, to output_dir; returns the share of the DLL decompiled """
+    with open(dll_path, 'rb') as f:
+        seed = hashlib.sha1(f.read()).hexdigest()
+    metadata = read_metadata(dll_path)
+    if metadata is None:
+        raise ValueError(f"Not a .NET assembly: {dll_path}")
+    project = os.path.splitext(os.path.basename(dll_path))[0]
+    rows = {metadata.type_def_name(row): row for row in range(2, len(metadata.rows(TYPE_DEF)) + 1)}
+    os.makedirs(output_dir, exist_ok=True)
+    if types is not None:
+        for name in types:
+            if name not in rows:
+                raise ValueError(f"Could not find type definition {name} in type system")
+            with open(os.path.join(output_dir, f'{name}.decompiled.cs'), 'w', encoding='utf-8') as f:
+                f.write(_class_source(metadata, rows[name], seed))
+        return len(types) / max(1, len(rows))
+    with open(os.path.join(output_dir, f'{project}.csproj'), 'w', encoding='utf-8') as f:
+        f.write('<Project Sdk="Microsoft.NET.Sdk" />\n')
+    for name, row in rows.items():
+        namespace, _, class_name = name.rpartition('.')
+        folder = os.path.join(output_dir, *namespace.split('.'))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'{class_name}.cs'), 'w', encoding='utf-8') as f:
+            f.write(_class_source(metadata, row, seed))
+    return 1.0
+
+
+def timed_decompile(args, dll_path, output_dir, types=None):
+    start = time.monotonic()
+    share = decompile(dll_path, output_dir, types)
+    size = os.path.getsize(dll_path)
+    remaining = (args.stub_delay + args.stub_delay_per_mb * share * size / (1024 * 1024)
+                 - (time.monotonic() - start))
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic ilspycmd stand-in for benchmarks")
+    parser.add_argument("dll", nargs='+')
+    parser.add_argument("-o", "--outputdir")
+    parser.add_argument("-t", "--type", help="Decompile only this type, to OUTPUTDIR/TYPE.decompiled.cs")
+    parser.add_argument("--stub-startup", type=float, default=0.0, help="Seconds every process takes to start")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Seconds every run takes at least")
+    parser.add_argument("--stub-delay-per-mb", type=float, default=0.0, help="Extra seconds per MB of DLL")
+    args, _ = parser.parse_known_args(argv)
+    if not args.outputdir:
+        parser.error("-o OUTPUTDIR is required")
+    if len(args.dll) > 1 and args.type:
+        parser.error("-t takes a single DLL")
+    time.sleep(args.stub_startup)
+    if len(args.dll) == 1:
+        timed_decompile(args, args.dll[0], args.outputdir, [args.type] if args.type else None)
+        return 0
+    projects = []
+    for dll_path in args.dll:
+        project = os.path.splitext(os.path.basename(dll_path))[0]
+        timed_decompile(args, dll_path, os.path.join(args.outputdir, project))
+        projects.append(project)
+    solution = os.path.basename(os.path.normpath(args.outputdir))
+    with open(os.path.join(args.outputdir, f'{solution}.sln'), 'w', encoding='utf-8') as f:
+        f.write("".join(f'Project("{project}") = "{project}", "{project}\\{project}.csproj"\n'
+                        for project in projects))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Cross-process locks on decompilation cache entries.
+
+Every cache entry has a lock file, decomp_cache/locks/<sha1>.lock, locked
+with flock() on POSIX and msvcrt.locking() on Windows. A scan holds the
+exclusive lock while it decompiles and publishes an entry, so another
+scanner sharing the cache waits for that decompile and then reuses its
+result instead of repeating it. Searches hold a shared lock while they read
+an entry, and eviction only removes entries it can lock exclusively.
+
+The operating system drops a lock when the process holding it exits, so
+a crashed scan never leaves an entry locked. Windows has no shared locks
+here, so on Windows readers of one entry take turns.
+
+Lock files are left in place: deleting a lock file another process has
+open would let two processes lock the same entry.
+"""
+
+import os
+import time
+
+from core.cancel import CancelToken
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCKS_DIRNAME = 'locks'
+# Seconds between attempts while waiting for a lock
+POLL_INTERVAL = 0.1
+
+
+class EntryLock:
+    """ Lock on one cache entry, exclusive unless shared is set """
+
+    def __init__(self, cache_dir: str, file_hash: str, shared: bool = False):
+        self.path = os.path.join(cache_dir, LOCKS_DIRNAME, file_hash + '.lock')
+        self.shared = shared
+        self.fd = None
+
+    def try_acquire(self) -> bool:
+        """ Take the lock if nobody else holds it in a conflicting mode """
+        if self.fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl:
+                fcntl.flock(self.fd, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self, timeout: float = None, cancel_token: CancelToken = None):
+        """ Wait for the lock; raises TimeoutError after timeout seconds and ScanCancelled if cancelled """
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while not self.try_acquire():
+                if cancel_token:
+                    cancel_token.check()
+                if deadline and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out after {timeout:.0f} seconds waiting for {self.path}")
+                time.sleep(POLL_INTERVAL)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        """ Drop the lock (if held) and close the lock file """
+        if self.fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        os.close(self.fd)
+        self.fd = None
@@ -0,0 +1,275 @@
+"""
+Size budget and maintenance for the decompilation cache.
+
+CacheIndex (decomp_cache/cache_index.json) remembers the size and last use
+of every cache entry, a decomp_cache/<sha1> folder or <sha1>.pack file.
+Scans touch the entries they read and add the ones they publish. With a
+budget set (cache_max_mb), entries the scan did not use are then evicted,
+least recently used first, until the cache fits. Anything that is not an
+entry (manifests/, the JSON stores) is never counted or deleted.
+
+Decompiles are written to PARTIAL_PREFIX folders inside the cache and
+renamed into place when complete, so a crashed scan leaves a recognisable
+partial folder rather than a broken entry. Entries are only removed while
+holding their exclusive EntryLock (core/cache_lock.py), so eviction skips
+entries another scan is decompiling or reading. maintain() reports on the
+cache, verifies that entries can be read, and prunes broken entries,
+stale partial files and anything over the budget.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from core.decomp_index import TrigramIndex, INDEX_FILENAME
+from core.decomp_pack import DecompPack, PACK_SUFFIX, read_members
+from core.cache_lock import EntryLock
+
+CACHE_INDEX_FILENAME = 'cache_index.json'
+# Decompiles in progress are written to folders named like this inside the cache
+PARTIAL_PREFIX = '.partial-'
+# Partial folders and .tmp files older than this are left over from crashed scans
+STALE_PARTIAL_SECONDS = 3600
+MAINTENANCE_ACTIONS = ('report', 'verify', 'prune')
+
+_ENTRY_NAME = re.compile(r'^[0-9a-f]{40}(\.pack)?$')
+
+
+def entry_size(path: str) -> int:
+    """ Bytes on disk of a cache entry in either format """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def list_entries(cache_dir: str) -> List[str]:
+    """ Names of the cache entries in cache_dir """
+    try:
+        return [name for name in os.listdir(cache_dir) if _ENTRY_NAME.match(name)]
+    except OSError:
+        return []
+
+
+def remove_entry(path: str) -> bool:
+    """ Delete the cache entry at path unless a scan is using it; returns whether it was deleted """
+    name = os.path.basename(path)
+    lock = None
+    if _ENTRY_NAME.match(name):
+        lock = EntryLock(os.path.dirname(path), name[:-len(PACK_SUFFIX)] if name.endswith(PACK_SUFFIX) else name)
+        if not lock.try_acquire():
+            lock.release()
+            return False
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    finally:
+        if lock:
+            lock.release()
+    return True
+
+
+def verify_entry(path: str) -> Optional[str]:
+    """ Why the cache entry at path cannot be used, or None if every file in it reads back """
+    try:
+        if path.endswith(PACK_SUFFIX):
+            pack = DecompPack.open(path)
+            members = pack.members(f"{path}/{rel}" for rel in pack.entries)
+            for member, data in read_members(path, members):
+                if len(data) != member.size:
+                    return f"wrong size for {member.path}"
+            return None
+        index = TrigramIndex.load(path)
+        if index is None:
+            if os.path.exists(os.path.join(path, INDEX_FILENAME)):
+                return "unreadable index"
+            # Entries from before indexing get their index on first use
+            return None
+        missing = [rel for rel in index.files if not os.path.isfile(os.path.join(path, rel))]
+        if missing:
+            return f"{len(missing)} indexed files missing, e.g. {missing[0]}"
+    except Exception as e:
+        # OSError, or ValueError and zlib.error from a damaged pack
+        return str(e) or type(e).__name__
+    return None
+
+
+class CacheIndex:
+    """ Persistent size and last-use record of cache entries, keyed by entry name """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, CACHE_INDEX_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = {}  # name -> [size or None, last used (epoch seconds)]
+        self.dirty = False
+        # Entries used or added through this instance, which enforce_budget() keeps
+        self.used = set()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def touch(self, path: str):
+        """ Record that the entry at path was used now """
+        name = os.path.basename(path)
+        with self.lock:
+            self.used.add(name)
+            entry = self.entries.setdefault(name, [None, 0])
+            entry[1] = int(time.time())
+            self.dirty = True
+
+    def add(self, path: str):
+        """ Record a newly published entry """
+        size = entry_size(path)
+        name = os.path.basename(path)
+        with self.lock:
+            self.used.add(name)
+            self.entries[name] = [size, int(time.time())]
+            self.dirty = True
+
+    def refresh(self) -> List[Tuple[str, int, int]]:
+        """ Sync with the entries on disk; returns (name, size, last used) for each, least recently used first """
+        names = list_entries(self.cache_dir)
+        with self.lock:
+            known = {name: self.entries.get(name) for name in names}
+        rows = []
+        for name, entry in known.items():
+            path = os.path.join(self.cache_dir, name)
+            try:
+                # Entries from before the index existed count as last used when written
+                size = entry[0] if entry and entry[0] is not None else entry_size(path)
+                last_used = entry[1] if entry and entry[1] else int(os.path.getmtime(path))
+            except OSError:
+                continue
+            rows.append((name, size, last_used))
+        with self.lock:
+            self.entries = {name: [size, last_used] for name, size, last_used in rows}
+            self.dirty = True
+        rows.sort(key=lambda row: row[2])
+        return rows
+
+    def enforce_budget(self, budget: int) -> Tuple[int, int, int]:
+        """ Evict least recently used entries until the cache fits in budget bytes.
+
+        Entries used through this instance are kept even if that leaves the
+        cache over budget. Returns (entries evicted, bytes freed, bytes
+        still cached).
+        """
+        rows = self.refresh()
+        with self.lock:
+            keep = set(self.used)
+        total = sum(size for _, size, _ in rows)
+        evicted = freed = 0
+        for name, size, _ in rows:
+            if total <= budget:
+                break
+            if name in keep or not remove_entry(os.path.join(self.cache_dir, name)):
+                continue
+            with self.lock:
+                self.entries.pop(name, None)
+            total -= size
+            freed += size
+            evicted += 1
+        return evicted, freed, total
+
+    def save(self):
+        """ Write the index if anything changed since it was loaded """
+        if not self.dirty:
+            return
+        with self.lock:
+            data = json.dumps(self.entries)
+            self.dirty = False
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+
+
+class MaintenanceReport(NamedTuple):
+    """ What maintain() found and did """
+    entries: int
+    bytes: int  # in entries still cached
+    packed: int  # entries stored as packs
+    oldest_use: Optional[int]  # epoch seconds of the least recently used entry
+    broken: List[Tuple[str, str]]  # (entry name, reason), only checked by verify and prune
+    partial: List[str]  # stale partial decompiles and temporary files
+    evicted: int
+    freed: int  # bytes deleted by prune
+
+
+def _stale_partials(cache_dir: str) -> List[str]:
+    """ Partial decompile folders and .tmp files left behind by crashed scans """
+    cutoff = time.time() - STALE_PARTIAL_SECONDS
+    stale = []
+    for directory in [cache_dir] + [os.path.join(cache_dir, name) for name in list_entries(cache_dir)]:
+        if not os.path.isdir(directory):
+            continue
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    if (item.name.startswith(PARTIAL_PREFIX) or item.name.endswith('.tmp')) \
+                            and item.stat(follow_symlinks=False).st_mtime < cutoff:
+                        stale.append(item.path)
+        except OSError:
+            pass
+    return stale
+
+
+def maintain(cache_dir: str, action: str = 'report', budget: int = 0) -> MaintenanceReport:
+    """ Report on, verify ('verify') or clean up ('prune') the cache in cache_dir.
+
+    prune deletes entries that fail verification, stale partial files and,
+    with a budget in bytes, the least recently used entries over it.
+    """
+    if action not in MAINTENANCE_ACTIONS:
+        raise ValueError(f"Unknown cache action: {action} (expected one of {', '.join(MAINTENANCE_ACTIONS)})")
+    index = CacheIndex(cache_dir)
+    broken = []
+    if action != 'report':
+        for name in list_entries(cache_dir):
+            reason = verify_entry(os.path.join(cache_dir, name))
+            if reason:
+                broken.append((name, reason))
+    partial = _stale_partials(cache_dir)
+    evicted = freed = 0
+    if action == 'prune':
+        for name, _ in broken:
+            path = os.path.join(cache_dir, name)
+            size = entry_size(path)
+            if remove_entry(path):
+                freed += size
+        for path in partial:
+            freed += entry_size(path)
+            remove_entry(path)
+        if budget:
+            evicted, budget_freed, _ = index.enforce_budget(budget)
+            freed += budget_freed
+    rows = index.refresh()
+    index.save()
+    return MaintenanceReport(
+        entries=len(rows),
+        bytes=sum(size for _, size, _ in rows),
+        packed=sum(1 for name, _, _ in rows if name.endswith(PACK_SUFFIX)),
+        oldest_use=rows[0][2] if rows else None,
+        broken=broken,
+        partial=partial,
+        evicted=evicted,
+        freed=freed,
+    )
@@ -0,0 +1,250 @@
+"""
+Headless command-line scanning.
+
+Runs the full XML and DLL ScanEngine and streams matches to stdout as
+JSON Lines or CSV while the scan runs. Status goes to stderr. Nothing here
+imports Qt, so it works on machines without a display or PyQt5.
+
+Exit codes: 0 matches found, 1 no matches, 2 bad arguments or search terms,
+3 some files could not be scanned (matches are still written), 130
+interrupted (matches found so far are still written).
+
+--cache report|verify|prune runs cache maintenance (core/cache_store.py)
+instead of a scan; it exits with 3 if verify finds broken entries.
+"""
+
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from core.engine import ScanEngine
+from core.search_pool import BACKENDS
+from core.decomp_pack import CACHE_FORMATS
+from core.cache_store import MAINTENANCE_ACTIONS, maintain
+from core.stats import format_report
+from libs.Settings import Settings
+
+EXIT_MATCHES = 0
+EXIT_NO_MATCHES = 1
+EXIT_USAGE = 2
+EXIT_ERRORS = 3
+EXIT_INTERRUPTED = 130
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ['kind', 'path', 'file', 'occurrences', 'matched_terms', 'matched_line']
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Scan XML files and decompiled DLLs for search terms. "
+                    "With base_dir and search_string the scan runs headless and writes matches to stdout; "
+                    "without them (or with --gui) the GUI starts.",
+        epilog="Exit codes: 0 matches found, 1 no matches, 2 bad arguments or terms, "
+               "3 some files could not be scanned (or, with --cache verify, broken cache entries), 130 interrupted.")
+    parser.add_argument("base_dir", type=str, nargs='?',
+                        help="Base directory to scan (multiple directories separated by ;).")
+    parser.add_argument("search_string", type=str, nargs='?',
+                        help="Terms to search for, separated by ; (supports * wildcards and re: regexes).")
+    parser.add_argument("--gui", action="store_true", help="Launch GUI interface")
+    parser.add_argument("--format", choices=FORMATS, default='jsonl',
+                        help="Output format for matches (default: jsonl)")
+    parser.add_argument("--no-xml", action="store_true", help="Do not scan XML files")
+    parser.add_argument("--no-dll", action="store_true", help="Do not scan DLL files")
+    parser.add_argument("--workers", type=int, help="Search workers (default: search_workers setting, or all CPUs)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Search backend (default: search_backend setting)")
+    parser.add_argument("--decompile-workers", type=int, help="Concurrent decompiles (default: decompile_workers setting)")
+    parser.add_argument("--decompile-timeout", type=float,
+                        help="Seconds before a decompile is killed, 0 for none (default: decompile_timeout setting)")
+    parser.add_argument("--decompile-batch", type=int, metavar="N",
+                        help="Most small DLLs decompiled by one ilspycmd run, 1 for one run per DLL "
+                             "(default: decompile_batch_size setting)")
+    parser.add_argument("--cache-dir", default="decomp_cache", help="Decompilation cache directory (default: decomp_cache)")
+    parser.add_argument("--cache-format", choices=CACHE_FORMATS,
+                        help="How new decompilations are cached: one folder or one packed file per DLL "
+                             "(default: cache_format setting)")
+    parser.add_argument("--cache-max-mb", type=float,
+                        help="Cache size budget; least recently used entries are evicted after each scan, "
+                             "0 for none (default: cache_max_mb setting)")
+    parser.add_argument("--cache", choices=MAINTENANCE_ACTIONS,
+                        help="Instead of scanning, report on the cache, verify every entry, or prune broken and "
+                             "half-written entries and anything over the budget")
+    parser.add_argument("--whitelist", help="DLL file names to skip, separated by ; (default: dll_whitelist setting)")
+    parser.add_argument("--no-whitelist", action="store_true", help="Scan every DLL, ignoring the whitelist")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip native DLLs and those whose metadata mentions no term (default: dll_prefilter setting)")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="Decompile every uncached DLL, even native ones and those whose metadata mentions no term; "
+                             "also turns targeted decompiles off")
+    parser.add_argument("--targeted", action="store_true",
+                        help="Decompile only the types of large assemblies whose metadata can match a term; "
+                             "implies --prefilter (default: targeted_decompile setting)")
+    parser.add_argument("--no-incremental", action="store_true", help="Rescan files even if unchanged since the last scan")
+    parser.add_argument("--settings", default="settings.json", help="Settings file to read defaults from (default: settings.json)")
+    parser.add_argument("--report", metavar="FILE", help="Write the scan's stage timings and counters to FILE as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Print scan status messages, and the timing report at the end, to stderr")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print the summary to stderr")
+    return parser
+
+
+def parse_arguments(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.base_dir and not args.search_string and not args.gui and not args.cache:
+        parser.error("search_string is required to scan from the command line")
+    return args
+
+
+class RecordWriter:
+    """ Writes MatchRecords to a text stream as JSON Lines or CSV, flushing after each.
+
+    If the reader goes away (e.g. piped into head) on_closed is called once
+    and further records are dropped.
+    """
+
+    def __init__(self, stream, output_format, on_closed=None):
+        self.stream = stream
+        self.on_closed = on_closed
+        self.closed = False
+        self.csv = csv.writer(stream, lineterminator="\n") if output_format == 'csv' else None
+        if self.csv:
+            self._guarded(self.csv.writerow, CSV_FIELDS)
+
+    def write(self, record):
+        self._guarded(self._write, record)
+
+    def _guarded(self, write, *args):
+        if self.closed:
+            return
+        try:
+            write(*args)
+            self.stream.flush()
+        except BrokenPipeError:
+            self.closed = True
+            # Python flushes stdout again at exit; point it somewhere harmless
+            os.dup2(os.open(os.devnull, os.O_WRONLY), self.stream.fileno())
+            if self.on_closed:
+                self.on_closed()
+
+    def _write(self, record):
+        kind = 'dll' if record.is_dll else 'xml'
+        if self.csv:
+            self.csv.writerow([kind, record.path, record.file, record.occurrences,
+                               ";".join(record.matched_terms), record.matched_line or ''])
+        else:
+            self.stream.write(json.dumps({
+                'kind': kind,
+                'path': record.path,
+                'file': record.file,
+                'occurrences': record.occurrences,
+                'matched_terms': list(record.matched_terms),
+                'matched_line': record.matched_line or '',
+            }, ensure_ascii=False) + "\n")
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def run_cache_maintenance(args) -> int:
+    """ Run --cache maintenance on --cache-dir and print what it found to stdout """
+    if not os.path.isdir(args.cache_dir):
+        print(f"error: no cache at {args.cache_dir!r}", file=sys.stderr)
+        return EXIT_USAGE
+    budget = args.cache_max_mb
+    if budget is None:
+        budget = Settings(args.settings).get('cache_max_mb', 0)
+    report = maintain(args.cache_dir, args.cache, int((budget or 0) * 1024 * 1024))
+    print(f"{report.entries} entries ({report.packed} packed), {_mb(report.bytes)}"
+          + (f", budget {_mb(budget * 1024 * 1024)}" if budget else ""))
+    if report.oldest_use:
+        print(f"Oldest entry last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(report.oldest_use))}")
+    for name, reason in report.broken:
+        print(f"{'Removed' if args.cache == 'prune' else 'Broken'}: {name}: {reason}")
+    for path in report.partial:
+        print(f"{'Removed leftover' if args.cache == 'prune' else 'Leftover'} from a crashed scan: {path}")
+    if args.cache == 'prune':
+        print(f"Evicted {report.evicted} least recently used entries; freed {_mb(report.freed)}")
+    elif args.cache == 'verify' and not report.broken:
+        print("All entries verified")
+    return EXIT_ERRORS if args.cache == 'verify' and report.broken else EXIT_MATCHES
+
+
+def run_cli(args) -> int:
+    """ Run one headless scan (or cache maintenance) for parsed arguments and return the exit code """
+    def status(message):
+        print(message, file=sys.stderr, flush=True)
+
+    if args.cache:
+        return run_cache_maintenance(args)
+    if args.no_xml and args.no_dll:
+        status("error: nothing to scan with both --no-xml and --no-dll")
+        return EXIT_USAGE
+    base_dirs = [d.strip() for d in args.base_dir.split(';') if d.strip()]
+    if not any(os.path.isdir(d) for d in base_dirs):
+        status(f"error: no existing directory in {args.base_dir!r}")
+        return EXIT_USAGE
+    whitelist = None
+    if args.no_whitelist:
+        whitelist = []
+    elif args.whitelist is not None:
+        whitelist = args.whitelist.split(';')
+    try:
+        engine = ScanEngine(base_dirs, args.search_string, scan_dlls=not args.no_dll, scan_xmls=not args.no_xml,
+                            cache_dir=args.cache_dir, settings=Settings(args.settings), dll_whitelist=whitelist,
+                            search_backend=args.backend, search_workers=args.workers,
+                            decompile_workers=args.decompile_workers, decompile_timeout=args.decompile_timeout,
+                            incremental=False if args.no_incremental else None, cache_format=args.cache_format,
+                            cache_max_mb=args.cache_max_mb, decompile_batch_size=args.decompile_batch,
+                            prefilter=True if args.prefilter else False if args.no_prefilter else None,
+                            targeted=True if args.targeted else None)
+    except ValueError as e:
+        status(f"error: {e}")
+        return EXIT_USAGE
+    if not engine.search_terms:
+        status("error: no search terms given")
+        return EXIT_USAGE
+
+    def on_progress(batch):
+        if args.verbose:
+            if batch.dropped:
+                status(f"... {batch.dropped} messages skipped ...")
+            for message in batch.messages:
+                status(message)
+
+    def interrupted(signum, frame):
+        # cancel() takes locks the interrupted code may hold, so run it elsewhere;
+        # a second Ctrl+C stops at once
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        threading.Thread(target=engine.cancel, daemon=True).start()
+
+    # Nobody is reading any more, so there is no point scanning on
+    writer = RecordWriter(sys.stdout, args.format, on_closed=engine.cancel)
+    previous_handler = signal.signal(signal.SIGINT, interrupted)
+    try:
+        summary = engine.run(on_match=writer.write, on_progress=on_progress)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    if args.report:
+        try:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(summary.report, f, indent=2)
+        except OSError as e:
+            status(f"error: could not write report: {e}")
+    if args.verbose:
+        for line in format_report(summary.report):
+            status(line)
+    if not args.quiet:
+        status(f"{'Cancelled' if summary.cancelled else 'Done'}: {len(summary.records)} matching files, "
+               f"{summary.files_found} files found, {summary.errors} errors")
+    if summary.cancelled and not writer.closed:
+        return EXIT_INTERRUPTED
+    if summary.errors:
+        return EXIT_ERRORS
+    return EXIT_MATCHES if summary.records else EXIT_NO_MATCHES
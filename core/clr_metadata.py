@@ -0,0 +1,634 @@
+"""
+Pure-Python reader for .NET assembly metadata (ECMA-335 partition II).
+
+read_metadata() follows the PE headers to the CLI header and the metadata
+root, then exposes the metadata streams: #Strings (type, namespace and
+member names), #US (string literals), #Blob (signatures, constants and
+attribute arguments) and the #~ tables, decoded a whole table at a time
+on first use. A PE file without a CLI header is a native DLL, for which
+read_metadata() returns None.
+
+Only headers and the metadata block are parsed; nothing is executed and
+.NET does not need to be installed.
+"""
+
+import struct
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Metadata table numbers (ECMA-335 II.22)
+MODULE = 0x00
+TYPE_REF = 0x01
+TYPE_DEF = 0x02
+FIELD_PTR = 0x03
+FIELD = 0x04
+METHOD_PTR = 0x05
+METHOD_DEF = 0x06
+PARAM_PTR = 0x07
+PARAM = 0x08
+INTERFACE_IMPL = 0x09
+MEMBER_REF = 0x0A
+CONSTANT = 0x0B
+CUSTOM_ATTRIBUTE = 0x0C
+FIELD_MARSHAL = 0x0D
+DECL_SECURITY = 0x0E
+CLASS_LAYOUT = 0x0F
+FIELD_LAYOUT = 0x10
+STANDALONE_SIG = 0x11
+EVENT_MAP = 0x12
+EVENT_PTR = 0x13
+EVENT = 0x14
+PROPERTY_MAP = 0x15
+PROPERTY_PTR = 0x16
+PROPERTY = 0x17
+METHOD_IMPL = 0x19
+MODULE_REF = 0x1A
+TYPE_SPEC = 0x1B
+IMPL_MAP = 0x1C
+ASSEMBLY = 0x20
+ASSEMBLY_REF = 0x23
+NESTED_CLASS = 0x29
+GENERIC_PARAM = 0x2A
+METHOD_SPEC = 0x2B
+GENERIC_PARAM_CONSTRAINT = 0x2C
+# Tokens of #US heap entries (ldstr operands) use this in place of a table number
+USER_STRING = 0x70
+
+_CLI_HEADER_DIRECTORY = 14
+_METADATA_SIGNATURE = 0x424A5342
+
+# Coded index kinds: tag bits and the tables the tags select (None = unused tag)
+_CODED = {
+    'TypeDefOrRef': (2, (TYPE_DEF, TYPE_REF, TYPE_SPEC)),
+    'HasConstant': (2, (FIELD, PARAM, 0x17)),
+    'HasCustomAttribute': (5, (METHOD_DEF, FIELD, TYPE_REF, TYPE_DEF, PARAM, 0x09, MEMBER_REF, MODULE, 0x0E,
+                               0x17, 0x14, 0x11, MODULE_REF, TYPE_SPEC, ASSEMBLY, ASSEMBLY_REF, 0x26, 0x27,
+                               0x28, 0x2A, 0x2C, 0x2B)),
+    'HasFieldMarshal': (1, (FIELD, PARAM)),
+    'HasDeclSecurity': (2, (TYPE_DEF, METHOD_DEF, ASSEMBLY)),
+    'MemberRefParent': (3, (TYPE_DEF, TYPE_REF, MODULE_REF, METHOD_DEF, TYPE_SPEC)),
+    'HasSemantics': (1, (0x14, 0x17)),
+    'MethodDefOrRef': (1, (METHOD_DEF, MEMBER_REF)),
+    'MemberForwarded': (1, (FIELD, METHOD_DEF)),
+    'Implementation': (2, (0x26, ASSEMBLY_REF, 0x27)),
+    'CustomAttributeType': (3, (None, None, METHOD_DEF, MEMBER_REF, None)),
+    'ResolutionScope': (2, (MODULE, MODULE_REF, ASSEMBLY_REF, TYPE_REF)),
+    'TypeOrMethodDef': (1, (TYPE_DEF, METHOD_DEF)),
+}
+
+# Columns of every table: 'u2'/'u4' integers, 's'tring, 'g'uid and 'b'lob heap
+# indexes, a table number for a plain row index, or a coded index kind
+_SCHEMA = {
+    0x00: ('u2', 's', 'g', 'g', 'g'),  # Module
+    0x01: ('ResolutionScope', 's', 's'),  # TypeRef: scope, name, namespace
+    0x02: ('u4', 's', 's', 'TypeDefOrRef', FIELD, METHOD_DEF),  # TypeDef: flags, name, namespace, extends, fields, methods
+    0x03: (FIELD,),  # FieldPtr
+    0x04: ('u2', 's', 'b'),  # Field
+    0x05: (METHOD_DEF,),  # MethodPtr
+    0x06: ('u4', 'u2', 'u2', 's', 'b', PARAM),  # MethodDef: RVA, impl flags, flags, name, signature, params
+    0x07: (PARAM,),  # ParamPtr
+    0x08: ('u2', 'u2', 's'),  # Param
+    0x09: (TYPE_DEF, 'TypeDefOrRef'),  # InterfaceImpl
+    0x0A: ('MemberRefParent', 's', 'b'),  # MemberRef: parent, name, signature
+    0x0B: ('u2', 'HasConstant', 'b'),  # Constant (type byte and padding read as one)
+    0x0C: ('HasCustomAttribute', 'CustomAttributeType', 'b'),  # CustomAttribute
+    0x0D: ('HasFieldMarshal', 'b'),  # FieldMarshal
+    0x0E: ('u2', 'HasDeclSecurity', 'b'),  # DeclSecurity
+    0x0F: ('u2', 'u4', TYPE_DEF),  # ClassLayout
+    0x10: ('u4', FIELD),  # FieldLayout
+    0x11: ('b',),  # StandAloneSig
+    0x12: (TYPE_DEF, 0x14),  # EventMap
+    0x13: (0x14,),  # EventPtr
+    0x14: ('u2', 's', 'TypeDefOrRef'),  # Event
+    0x15: (TYPE_DEF, 0x17),  # PropertyMap
+    0x16: (0x17,),  # PropertyPtr
+    0x17: ('u2', 's', 'b'),  # Property
+    0x18: ('u2', METHOD_DEF, 'HasSemantics'),  # MethodSemantics
+    0x19: (TYPE_DEF, 'MethodDefOrRef', 'MethodDefOrRef'),  # MethodImpl
+    0x1A: ('s',),  # ModuleRef
+    0x1B: ('b',),  # TypeSpec
+    0x1C: ('u2', 'MemberForwarded', 's', MODULE_REF),  # ImplMap
+    0x1D: ('u4', FIELD),  # FieldRVA
+    0x1E: ('u4', 'u4'),  # EncLog
+    0x1F: ('u4',),  # EncMap
+    0x20: ('u4', 'u2', 'u2', 'u2', 'u2', 'u4', 'b', 's', 's'),  # Assembly
+    0x21: ('u4',),  # AssemblyProcessor
+    0x22: ('u4', 'u4', 'u4'),  # AssemblyOS
+    0x23: ('u2', 'u2', 'u2', 'u2', 'u4', 'b', 's', 's', 'b'),  # AssemblyRef: version, flags, key, name, culture, hash
+    0x24: ('u4', ASSEMBLY_REF),  # AssemblyRefProcessor
+    0x25: ('u4', 'u4', 'u4', ASSEMBLY_REF),  # AssemblyRefOS
+    0x26: ('u4', 's', 'b'),  # File
+    0x27: ('u4', 'u4', 's', 's', 'Implementation'),  # ExportedType
+    0x28: ('u4', 'u4', 's', 'Implementation'),  # ManifestResource
+    0x29: (TYPE_DEF, TYPE_DEF),  # NestedClass
+    0x2A: ('u2', 'u2', 'TypeOrMethodDef', 's'),  # GenericParam
+    0x2B: ('MethodDefOrRef', 'b'),  # MethodSpec
+    0x2C: (0x2A, 'TypeDefOrRef'),  # GenericParamConstraint
+}
+_FIXED = {'u2': 2, 'u4': 4}
+
+# Operand of each IL opcode (ECMA-335 III): its size in bytes, _TOKEN for a
+# metadata token, _SWITCH for a jump table; opcodes missing here are unused
+_TOKEN = 'token'
+_SWITCH = 'switch'
+_OPERANDS = {}
+for _first, _last, _operand in (
+        (0x00, 0x0D, 0), (0x0E, 0x13, 1), (0x14, 0x1E, 0), (0x1F, 0x1F, 1), (0x20, 0x20, 4), (0x21, 0x21, 8),
+        (0x22, 0x22, 4), (0x23, 0x23, 8), (0x25, 0x26, 0), (0x27, 0x29, _TOKEN), (0x2A, 0x2A, 0), (0x2B, 0x37, 1),
+        (0x38, 0x44, 4), (0x45, 0x45, _SWITCH), (0x46, 0x6E, 0), (0x6F, 0x75, _TOKEN), (0x76, 0x76, 0),
+        (0x79, 0x79, _TOKEN), (0x7A, 0x7A, 0), (0x7B, 0x81, _TOKEN), (0x82, 0x8B, 0), (0x8C, 0x8D, _TOKEN),
+        (0x8E, 0x8E, 0), (0x8F, 0x8F, _TOKEN), (0x90, 0xA2, 0), (0xA3, 0xA5, _TOKEN), (0xB3, 0xBA, 0),
+        (0xC2, 0xC2, _TOKEN), (0xC3, 0xC3, 0), (0xC6, 0xC6, _TOKEN), (0xD0, 0xD0, _TOKEN), (0xD1, 0xDC, 0),
+        (0xDD, 0xDD, 4), (0xDE, 0xDE, 1), (0xDF, 0xE0, 0),
+        # Two-byte opcodes, 0xFE followed by this byte
+        (0xFE00, 0xFE05, 0), (0xFE06, 0xFE07, _TOKEN), (0xFE09, 0xFE0E, 2), (0xFE0F, 0xFE0F, 0),
+        (0xFE11, 0xFE11, 0), (0xFE12, 0xFE12, 1), (0xFE13, 0xFE14, 0), (0xFE15, 0xFE16, _TOKEN),
+        (0xFE17, 0xFE18, 0), (0xFE19, 0xFE19, 1), (0xFE1A, 0xFE1A, 0), (0xFE1C, 0xFE1C, _TOKEN),
+        (0xFE1D, 0xFE1E, 0)):
+    for _opcode in range(_first, _last + 1):
+        _OPERANDS[_opcode] = _operand
+
+# Names C# source uses with each pseudo-custom attribute (ECMA-335 II.21.2.1): its
+# namespace, the attribute, its named arguments and the enums they take. These
+# attributes are stored as flags and table rows rather than CustomAttribute rows
+_INTEROP = "System.Runtime.InteropServices"
+PSEUDO_ATTRIBUTE_NAMES = {
+    'DllImport': (_INTEROP, "DllImport", "EntryPoint", "CharSet", "Ansi", "Unicode", "Auto", "ExactSpelling",
+                  "SetLastError", "PreserveSig", "CallingConvention", "Winapi", "Cdecl", "StdCall", "ThisCall",
+                  "FastCall", "BestFitMapping", "ThrowOnUnmappableChar"),
+    'MarshalAs': (_INTEROP, "MarshalAs", "UnmanagedType", "SizeConst", "SizeParamIndex", "ArraySubType",
+                  "SafeArraySubType", "SafeArrayUserDefinedSubType", "MarshalType", "MarshalTypeRef",
+                  "MarshalCookie", "IidParameterIndex", "VarEnum", "Bool", "I1", "U1", "I2", "U2", "I4", "U4",
+                  "I8", "U8", "R4", "R8", "Currency", "BStr", "LPStr", "LPWStr", "LPTStr", "ByValTStr", "IUnknown",
+                  "IDispatch", "Struct", "Interface", "SafeArray", "ByValArray", "SysInt", "SysUInt", "VBByRefStr",
+                  "AnsiBStr", "TBStr", "VariantBool", "FunctionPtr", "AsAny", "LPArray", "LPStruct",
+                  "CustomMarshaler", "Error", "IInspectable", "HString", "LPUTF8Str"),
+    'StructLayout': (_INTEROP, "StructLayout", "LayoutKind", "Sequential", "Explicit", "Auto", "Pack", "Size",
+                     "CharSet", "Ansi", "Unicode"),
+    'FieldOffset': (_INTEROP, "FieldOffset"),
+    'In': (_INTEROP, "In"),
+    'Out': (_INTEROP, "Out"),
+    'Optional': (_INTEROP, "Optional"),
+    'ComImport': (_INTEROP, "ComImport"),
+    'PreserveSig': (_INTEROP, "PreserveSig"),
+    'Serializable': ("System", "Serializable"),
+    'NonSerialized': ("System", "NonSerialized"),
+    'MethodImpl': ("System.Runtime.CompilerServices", "MethodImpl", "MethodImplOptions", "MethodCodeType",
+                   "NoInlining", "ForwardRef", "Synchronized", "NoOptimization", "PreserveSig", "InternalCall",
+                   "AggressiveInlining", "AggressiveOptimization", "Native", "OPTIL", "Runtime", "Unmanaged"),
+}
+
+# Signature element types (ECMA-335 II.23.1.16) the type walker treats specially
+_PRIMITIVES = frozenset(range(0x01, 0x0F)) | {0x16, 0x18, 0x19, 0x1C}
+_PREFIXES = frozenset((0x10, 0x41, 0x45))  # byref, sentinel, pinned
+
+
+class Section(NamedTuple):
+    rva: int
+    size: int  # the larger of the virtual and raw sizes
+    offset: int  # in the file
+
+
+def _rva_offset(sections: List[Section], rva: int) -> Optional[int]:
+    for section in sections:
+        if section.rva <= rva < section.rva + section.size:
+            return rva - section.rva + section.offset
+    return None
+
+
+def read_compressed(data: bytes, pos: int) -> Tuple[int, int]:
+    """ (value, position after it) of an ECMA-335 compressed unsigned integer at pos.
+
+    Raises ValueError if data ends before the integer does.
+    """
+    if not 0 <= pos < len(data):
+        raise ValueError(f"Compressed integer at {pos} is outside its heap")
+    first = data[pos]
+    if first & 0x80 == 0:
+        return first, pos + 1
+    size = 2 if first & 0xC0 == 0x80 else 4
+    if pos + size > len(data):
+        raise ValueError(f"Truncated compressed integer at {pos}")
+    if size == 2:
+        return (first & 0x3F) << 8 | data[pos + 1], pos + 2
+    return (first & 0x1F) << 24 | data[pos + 1] << 16 | data[pos + 2] << 8 | data[pos + 3], pos + 4
+
+
+def il_tokens(code: bytes) -> List[int]:
+    """ Metadata tokens used by the IL instructions in code (calls, field and type operands, ldstr).
+
+    Raises ValueError on an opcode ECMA-335 does not define.
+    """
+    tokens = []
+    pos = 0
+    while pos < len(code):
+        opcode = code[pos]
+        pos += 1
+        if opcode == 0xFE and pos < len(code):
+            opcode = 0xFE00 | code[pos]
+            pos += 1
+        operand = _OPERANDS.get(opcode)
+        if operand is None:
+            raise ValueError(f"Unknown IL opcode {opcode:#x} at offset {pos - 1}")
+        if operand == _TOKEN:
+            tokens.append(int.from_bytes(code[pos:pos + 4], 'little'))
+            pos += 4
+        elif operand == _SWITCH:
+            pos += 4 + 4 * int.from_bytes(code[pos:pos + 4], 'little')
+        else:
+            pos += operand
+    return tokens
+
+
+def _read_type(blob: bytes, pos: int, found: List[int]) -> int:
+    """ Walk one type in a signature blob, adding the coded TypeDefOrRef indexes in it to found """
+    while True:
+        element = blob[pos]
+        pos += 1
+        if element in (0x1F, 0x20):
+            # Custom modifier
+            coded, pos = read_compressed(blob, pos)
+            found.append(coded)
+        elif element not in _PREFIXES:
+            break
+    if element in _PRIMITIVES:
+        return pos
+    if element in (0x11, 0x12):
+        # Class or value type
+        coded, pos = read_compressed(blob, pos)
+        found.append(coded)
+        return pos
+    if element in (0x0F, 0x1D):
+        # Pointer or single-dimensional array
+        return _read_type(blob, pos, found)
+    if element in (0x13, 0x1E):
+        # Generic parameter of the type or the method
+        return read_compressed(blob, pos)[1]
+    if element == 0x14:
+        # Array: element type, rank, sizes and lower bounds
+        pos = _read_type(blob, pos, found)
+        _, pos = read_compressed(blob, pos)
+        for _ in range(2):
+            count, pos = read_compressed(blob, pos)
+            for _ in range(count):
+                _, pos = read_compressed(blob, pos)
+        return pos
+    if element == 0x15:
+        # Generic instantiation: the generic type, then its arguments
+        pos = _read_type(blob, pos, found)
+        count, pos = read_compressed(blob, pos)
+        for _ in range(count):
+            pos = _read_type(blob, pos, found)
+        return pos
+    if element == 0x1B:
+        # Function pointer
+        return _read_method_signature(blob, pos, found)
+    raise ValueError(f"Unknown signature element {element:#x}")
+
+
+def _read_method_signature(blob: bytes, pos: int, found: List[int]) -> int:
+    convention = blob[pos]
+    pos += 1
+    if convention & 0x10:
+        # Generic parameter count
+        _, pos = read_compressed(blob, pos)
+    count, pos = read_compressed(blob, pos)
+    # The return type, then each parameter
+    for _ in range(count + 1):
+        pos = _read_type(blob, pos, found)
+    return pos
+
+
+def signature_types(blob: bytes, type_spec: bool = False) -> List[int]:
+    """ Coded TypeDefOrRef indexes of the types a signature blob mentions.
+
+    blob is a method, field, property, local variable or method
+    instantiation signature, or with type_spec a TypeSpec's type. Raises
+    ValueError if it cannot be decoded.
+    """
+    found = []
+    try:
+        if type_spec:
+            _read_type(blob, 0, found)
+        elif blob[0] == 0x06:
+            _read_type(blob, 1, found)
+        elif blob[0] in (0x07, 0x0A):
+            # Locals or generic arguments
+            count, pos = read_compressed(blob, 1)
+            for _ in range(count):
+                pos = _read_type(blob, pos, found)
+        elif blob[0] & 0x0F == 0x08:
+            # Property: parameter count, then its type and parameters
+            count, pos = read_compressed(blob, 1)
+            for _ in range(count + 1):
+                pos = _read_type(blob, pos, found)
+        else:
+            _read_method_signature(blob, 0, found)
+    except IndexError:
+        raise ValueError("Truncated signature")
+    return found
+
+
+class MethodBody(NamedTuple):
+    code: bytes  # the IL instructions
+    locals_token: int  # StandAloneSig token of the local variables, 0 for none
+    catch_tokens: List[int]  # types caught by typed exception handlers
+
+
+class Metadata:
+    """ The metadata of one assembly: heaps and tables, with name helpers for the tables scanners need """
+
+    def __init__(self, data: bytes, sections: List[Section], streams: Dict[str, Tuple[int, int]]):
+        self.data = data
+        self.sections = sections
+        self.strings_heap = self._stream(streams, '#Strings')
+        self.user_strings_heap = self._stream(streams, '#US')
+        self.blob_heap = self._stream(streams, '#Blob')
+        tables = streams.get('#~') or streams.get('#-')
+        if tables is None:
+            raise ValueError("Metadata has no tables stream")
+        self._read_table_layout(*tables)
+        self._rows = {}
+
+    def _stream(self, streams, name) -> bytes:
+        offset, size = streams.get(name, (0, 0))
+        return self.data[offset:offset + size]
+
+    def _read_table_layout(self, offset, size):
+        data = self.data
+        if size < 24:
+            raise ValueError("Truncated metadata tables")
+        heap_sizes = data[offset + 6]
+        valid, = struct.unpack_from('<Q', data, offset + 8)
+        pos = offset + 24
+        self.row_counts = {}
+        for table in range(64):
+            if valid >> table & 1:
+                self.row_counts[table], = struct.unpack_from('<I', data, pos)
+                pos += 4
+        if heap_sizes & 0x40:
+            # Extra data in some uncompressed (#-) table streams
+            pos += 4
+        sizes = {'s': 4 if heap_sizes & 1 else 2, 'g': 4 if heap_sizes & 2 else 2, 'b': 4 if heap_sizes & 4 else 2}
+        self._coded_sizes = {}
+        for kind, (bits, targets) in _CODED.items():
+            largest = max(self.row_counts.get(t, 0) for t in targets if t is not None)
+            self._coded_sizes[kind] = 2 if largest < 1 << (16 - bits) else 4
+        # Row layout of each present table, stored one after another in table order
+        self._tables = {}
+        for table in sorted(self.row_counts):
+            schema = _SCHEMA.get(table)
+            if schema is None:
+                # Only tables before the first unknown one can be located
+                break
+            widths = []
+            for column in schema:
+                if isinstance(column, int):
+                    widths.append(2 if self.row_counts.get(column, 0) < 1 << 16 else 4)
+                elif column in _FIXED:
+                    widths.append(_FIXED[column])
+                else:
+                    widths.append(sizes.get(column) or self._coded_sizes[column])
+            row_format = '<' + ''.join('H' if w == 2 else 'I' for w in widths)
+            row_size = struct.calcsize(row_format)
+            self._tables[table] = (pos, row_format, row_size)
+            pos += row_size * self.row_counts[table]
+        if pos > offset + size or pos > len(data):
+            raise ValueError("Truncated metadata tables")
+
+    def rows(self, table: int) -> List[tuple]:
+        """ Every row of table as a tuple of column values (heap offsets, 1-based row numbers, coded indexes) """
+        rows = self._rows.get(table)
+        if rows is None:
+            if table not in self._tables:
+                return []
+            start, row_format, row_size = self._tables[table]
+            end = start + row_size * self.row_counts[table]
+            rows = self._rows[table] = list(struct.iter_unpack(row_format, self.data[start:end]))
+        return rows
+
+    def string(self, index: int) -> str:
+        """ The #Strings heap entry at index """
+        end = self.strings_heap.find(b'\0', index)
+        return self.strings_heap[index:end if end >= 0 else None].decode('utf-8', 'replace')
+
+    def blob(self, index: int) -> bytes:
+        """ The #Blob heap entry at index """
+        length, pos = read_compressed(self.blob_heap, index)
+        return self.blob_heap[pos:pos + length]
+
+    def user_strings(self) -> List[str]:
+        """ Every string literal in the #US heap """
+        heap = self.user_strings_heap
+        strings = []
+        pos = 1
+        while pos < len(heap):
+            length, pos = read_compressed(heap, pos)
+            if length:
+                # UTF-16 text followed by one flag byte
+                strings.append(heap[pos:pos + length - 1].decode('utf-16-le', 'replace'))
+            pos += length
+        return strings
+
+    @staticmethod
+    def decode_coded(kind: str, value: int) -> Tuple[Optional[int], int]:
+        """ (table, 1-based row) a coded index of kind points at; row 0 is a null reference """
+        bits, targets = _CODED[kind]
+        tag = value & ((1 << bits) - 1)
+        return (targets[tag] if tag < len(targets) else None), value >> bits
+
+    def offset_of(self, rva: int) -> Optional[int]:
+        """ File offset of a relative virtual address, or None if no section holds it """
+        return _rva_offset(self.sections, rva)
+
+    def method_body(self, rva: int) -> MethodBody:
+        """ The IL body at rva (a MethodDef's RVA column); raises ValueError if it is not a valid body """
+        offset = self.offset_of(rva)
+        if offset is None:
+            raise ValueError(f"Method body RVA {rva:#x} is outside every section")
+        data = self.data
+        try:
+            header = data[offset]
+            if header & 3 == 2:
+                # Tiny header: the code size in its upper six bits, no locals or handlers
+                return MethodBody(data[offset + 1:offset + 1 + (header >> 2)], 0, [])
+            if header & 3 != 3:
+                raise ValueError(f"Bad method body header at RVA {rva:#x}")
+            flags, _, code_size, locals_token = struct.unpack_from('<HHII', data, offset)
+            start = offset + 4 * (flags >> 12)
+            code = data[start:start + code_size]
+            catch_tokens = []
+            more = flags & 0x08
+            # Exception handling sections follow the code, 4-byte aligned
+            pos = (start + code_size + 3) & ~3
+            while more:
+                kind = data[pos]
+                if kind & 0x40:
+                    size = int.from_bytes(data[pos + 1:pos + 4], 'little')
+                    clauses = [struct.unpack_from('<I16xI', data, clause)
+                               for clause in range(pos + 4, pos + size - 23, 24)]
+                else:
+                    size = data[pos + 1]
+                    clauses = [struct.unpack_from('<H6xI', data, clause) for clause in range(pos + 4, pos + size - 11, 12)]
+                # Flags 0 is a typed catch, whose last field is the caught type's token
+                catch_tokens += [token for clause_flags, token in clauses if clause_flags == 0]
+                more = kind & 0x80
+                pos = (pos + size + 3) & ~3
+        except (struct.error, IndexError):
+            raise ValueError(f"Truncated method body at RVA {rva:#x}")
+        return MethodBody(code, locals_token, catch_tokens)
+
+    def user_string(self, offset: int) -> str:
+        """ The #US heap entry at offset (an ldstr token without its table byte) """
+        length, pos = read_compressed(self.user_strings_heap, offset)
+        return self.user_strings_heap[pos:pos + length - 1].decode('utf-16-le', 'replace') if length else ''
+
+    def string_constants(self) -> List[str]:
+        """ Values of string constants: const fields and default parameter values """
+        values = []
+        for type_and_padding, _, value in self.rows(CONSTANT):
+            # ELEMENT_TYPE_STRING, stored as UTF-16
+            if type_and_padding & 0xFF == 0x0E:
+                values.append(self.blob(value).decode('utf-16-le', 'replace'))
+        return values
+
+    def pseudo_attributes(self) -> List[Tuple[int, int, str]]:
+        """ (table, row, attribute) for every pseudo-custom attribute, keyed like PSEUDO_ATTRIBUTE_NAMES """
+        found = []
+        for row, (flags, _, _, _, _, _) in enumerate(self.rows(TYPE_DEF), 1):
+            if flags & 0x2000:
+                found.append((TYPE_DEF, row, 'Serializable'))
+            if flags & 0x1000:
+                found.append((TYPE_DEF, row, 'ComImport'))
+            # Sequential or explicit layout, or a character set
+            if flags & 0x30018:
+                found.append((TYPE_DEF, row, 'StructLayout'))
+        found += [(TYPE_DEF, parent, 'StructLayout') for _, _, parent in self.rows(CLASS_LAYOUT)]
+        for row, (flags, _, _) in enumerate(self.rows(FIELD), 1):
+            if flags & 0x80:
+                found.append((FIELD, row, 'NonSerialized'))
+        found += [(FIELD, field, 'FieldOffset') for _, field in self.rows(FIELD_LAYOUT)]
+        for row, (_, impl_flags, _, _, _, _) in enumerate(self.rows(METHOD_DEF), 1):
+            if impl_flags & 0x80:
+                found.append((METHOD_DEF, row, 'PreserveSig'))
+            # Anything but managed IL code with no options
+            if impl_flags & ~0x80:
+                found.append((METHOD_DEF, row, 'MethodImpl'))
+        found += [(*self.decode_coded('MemberForwarded', member), 'DllImport')
+                  for _, member, _, _ in self.rows(IMPL_MAP)]
+        for row, (flags, _, _) in enumerate(self.rows(PARAM), 1):
+            for flag, attribute in ((0x1, 'In'), (0x2, 'Out'), (0x10, 'Optional')):
+                if flags & flag:
+                    found.append((PARAM, row, attribute))
+        found += [(*self.decode_coded('HasFieldMarshal', parent), 'MarshalAs')
+                  for parent, _ in self.rows(FIELD_MARSHAL)]
+        return found
+
+    def type_ref_name(self, row: int) -> str:
+        """ Full name of TypeRef row, with its enclosing types for nested types """
+        scope, name, namespace = self.rows(TYPE_REF)[row - 1]
+        table, parent = self.decode_coded('ResolutionScope', scope)
+        if table == TYPE_REF and parent and parent != row:
+            return f"{self.type_ref_name(parent)}.{self.string(name)}"
+        namespace = self.string(namespace)
+        return f"{namespace}.{self.string(name)}" if namespace else self.string(name)
+
+    def type_def_name(self, row: int) -> str:
+        _, name, namespace, _, _, _ = self.rows(TYPE_DEF)[row - 1]
+        namespace = self.string(namespace)
+        return f"{namespace}.{self.string(name)}" if namespace else self.string(name)
+
+    def type_refs(self) -> List[str]:
+        """ Full names of the types the assembly uses from other assemblies """
+        return [self.type_ref_name(row) for row in range(1, len(self.rows(TYPE_REF)) + 1)]
+
+    def type_defs(self) -> List[str]:
+        """ Full names of the types the assembly defines """
+        return [self.type_def_name(row) for row in range(1, len(self.rows(TYPE_DEF)) + 1)]
+
+    def member_ref_name(self, row: int) -> str:
+        """ 'Type.Member' for MemberRef row (just the member for parents other than types) """
+        parent, name, _ = self.rows(MEMBER_REF)[row - 1]
+        table, parent_row = self.decode_coded('MemberRefParent', parent)
+        if parent_row and table == TYPE_REF:
+            return f"{self.type_ref_name(parent_row)}.{self.string(name)}"
+        if parent_row and table == TYPE_DEF:
+            return f"{self.type_def_name(parent_row)}.{self.string(name)}"
+        return self.string(name)
+
+    def member_refs(self) -> List[str]:
+        """ 'Type.Member' names of the fields and methods the assembly references """
+        return [self.member_ref_name(row) for row in range(1, len(self.rows(MEMBER_REF)) + 1)]
+
+    def assembly_refs(self) -> List[str]:
+        """ Names of the assemblies the assembly references """
+        return [self.string(row[6]) for row in self.rows(ASSEMBLY_REF)]
+
+
+def read_metadata(path: str) -> Optional[Metadata]:
+    """ Metadata of the assembly at path, or None for a native (non-.NET) PE file.
+
+    Raises ValueError if the file is not a PE file or its metadata is damaged.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return parse_metadata(data)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Damaged PE file: {path} ({e})")
+
+
+def parse_metadata(data: bytes) -> Optional[Metadata]:
+    """ read_metadata() for the bytes of a PE file """
+    if data[:2] != b'MZ':
+        raise ValueError("Not a PE file")
+    pe, = struct.unpack_from('<I', data, 0x3C)
+    if data[pe:pe + 4] != b'PE\0\0':
+        raise ValueError("Not a PE file")
+    section_count, = struct.unpack_from('<H', data, pe + 6)
+    optional_size, = struct.unpack_from('<H', data, pe + 20)
+    optional = pe + 24
+    magic, = struct.unpack_from('<H', data, optional)
+    if magic == 0x10B:
+        directories = optional + 96
+    elif magic == 0x20B:
+        directories = optional + 112
+    else:
+        raise ValueError("Unknown PE optional header")
+    directory_count, = struct.unpack_from('<I', data, directories - 4)
+    if directory_count <= _CLI_HEADER_DIRECTORY:
+        return None
+    cli_rva, cli_size = struct.unpack_from('<II', data, directories + 8 * _CLI_HEADER_DIRECTORY)
+    if not cli_rva or not cli_size:
+        return None
+
+    sections = []
+    table = optional + optional_size
+    for i in range(section_count):
+        virtual_size, rva, raw_size, raw_offset = struct.unpack_from('<IIII', data, table + 40 * i + 8)
+        sections.append(Section(rva, max(virtual_size, raw_size), raw_offset))
+
+    def offset_of(rva):
+        offset = _rva_offset(sections, rva)
+        if offset is None:
+            raise ValueError(f"RVA {rva:#x} is outside every section")
+        return offset
+
+    cli = offset_of(cli_rva)
+    metadata_rva, metadata_size = struct.unpack_from('<II', data, cli + 8)
+    root = offset_of(metadata_rva)
+    signature, = struct.unpack_from('<I', data, root)
+    if signature != _METADATA_SIGNATURE:
+        raise ValueError("Bad metadata signature")
+    version_length, = struct.unpack_from('<I', data, root + 12)
+    pos = root + 16 + version_length
+    stream_count, = struct.unpack_from('<H', data, pos + 2)
+    pos += 4
+    streams = {}
+    for _ in range(stream_count):
+        offset, size = struct.unpack_from('<II', data, pos)
+        end = data.index(b'\0', pos + 8)
+        name = data[pos + 8:end].decode('ascii', 'replace')
+        # Names are NUL-terminated and padded to 4 bytes
+        pos = (end + 4) & ~3
+        streams[name] = (root + offset, size)
+    return Metadata(data, sections, streams)
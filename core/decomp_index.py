@@ -0,0 +1,200 @@
+"""
+Persistent trigram index over a decompiled cache entry.
+
+Each decomp_cache/<sha1> directory gets an index file mapping every
+(lowercased) byte trigram to a bitmap of the .cs files that contain it. A
+literal search term can only occur in files that contain all of its
+trigrams, so a search loads the index, intersects a few bitmaps and reads
+just the candidate files instead of every file in the entry.
+"""
+
+import array
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+
+from core.matcher import WINDOW_SIZE
+
+INDEX_FILENAME = '.trigram_index'
+_MAGIC = b'XSTI'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIII')  # magic, version, file count, trigram count
+
+
+def index_decompiled_files(directory: str) -> List[str]:
+    """ Return all .cs file paths under directory """
+    cs_files = []
+    for root, _, files in os.walk(directory):
+        for f in files:
+            if f.endswith(".cs"):
+                cs_files.append(os.path.join(root, f))
+    return cs_files
+
+
+def _trigrams(content: bytes):
+    """ Return the set of trigram keys (24-bit ints) in already lowercased content """
+    grams = set()
+    # Decompiled sources repeat many lines verbatim; search terms never span
+    # lines, so only distinct lines need to be broken into trigrams.
+    for line in set(content.split(b'\n')):
+        grams.update(zip(line, line[1:], line[2:]))
+    return {(a << 16) | (b << 8) | c for a, b, c in grams}
+
+
+def _file_trigrams(f, window_size: int = WINDOW_SIZE):
+    """ Return the trigram keys of the binary file f, reading and lowercasing window_size bytes at a time """
+    keys = set()
+    carry = b''
+    while True:
+        chunk = f.read(window_size)
+        if not chunk:
+            break
+        data = carry + chunk.lower()
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            keys |= _trigrams(data[:cut])
+            carry = data[cut:]
+        elif len(data) > window_size:
+            # A line this long is indexed in pieces, keeping the two bytes a trigram can span
+            keys |= _trigrams(data)
+            carry = data[-2:]
+        else:
+            carry = data
+    return keys | _trigrams(carry)
+
+
+def _term_trigrams(term: bytes):
+    return {(term[i] << 16) | (term[i + 1] << 8) | term[i + 2] for i in range(len(term) - 2)}
+
+
+class TrigramIndex:
+    """ Trigram -> file bitmap index for one decompiled cache entry """
+
+    def __init__(self, directory: str, files: List[str], keys, bitmaps: List[bytes]):
+        self.directory = directory
+        self.files = files          # paths relative to directory
+        self.keys = keys            # sorted array('I') of trigram keys
+        self.bitmaps = bitmaps      # little-endian file bitmaps, parallel to keys
+
+    @classmethod
+    def build(cls, directory: str, cs_files: Iterable[str]) -> 'TrigramIndex':
+        """ Read every file in cs_files once, in windows, and index it """
+        files = []
+        postings = {}
+        for path in cs_files:
+            try:
+                with open(path, 'rb') as f:
+                    keys = _file_trigrams(f)
+            except OSError:
+                continue
+            file_id = len(files)
+            files.append(os.path.relpath(path, directory))
+            for key in keys:
+                postings.setdefault(key, []).append(file_id)
+        keys = array.array('I', sorted(postings))
+        bitmaps = []
+        for key in keys:
+            ids = postings[key]
+            bitmap = bytearray(ids[-1] // 8 + 1)
+            for file_id in ids:
+                bitmap[file_id >> 3] |= 1 << (file_id & 7)
+            bitmaps.append(bytes(bitmap))
+        return cls(directory, files, keys, bitmaps)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional['TrigramIndex']:
+        """ Load the index stored in directory, or None if missing or unreadable """
+        try:
+            with open(os.path.join(directory, INDEX_FILENAME), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return cls.from_bytes(directory, data)
+
+    @classmethod
+    def from_bytes(cls, directory: str, data: bytes) -> Optional['TrigramIndex']:
+        """ Parse an index written by to_bytes(), or None if it is unreadable """
+        try:
+            data = zlib.decompress(data)
+            magic, version, file_count, key_count = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC or version != _VERSION:
+                return None
+            pos = _HEADER.size
+            files = []
+            for _ in range(file_count):
+                (length,) = struct.unpack_from('<H', data, pos)
+                pos += 2
+                files.append(data[pos:pos + length].decode('utf-8'))
+                pos += length
+            keys = array.array('I')
+            keys.frombytes(data[pos:pos + 4 * key_count])
+            pos += 4 * key_count
+            offsets = array.array('I')
+            offsets.frombytes(data[pos:pos + 4 * (key_count + 1)])
+            pos += 4 * (key_count + 1)
+            blob = data[pos:]
+            bitmaps = [blob[offsets[i]:offsets[i + 1]] for i in range(key_count)]
+        except (zlib.error, struct.error, UnicodeDecodeError, ValueError):
+            return None
+        return cls(directory, files, keys, bitmaps)
+
+    def to_bytes(self) -> bytes:
+        """ The compressed form save() writes """
+        parts = [_HEADER.pack(_MAGIC, _VERSION, len(self.files), len(self.keys))]
+        for rel in self.files:
+            encoded = rel.encode('utf-8')
+            parts.append(struct.pack('<H', len(encoded)))
+            parts.append(encoded)
+        offsets = array.array('I', [0])
+        for bitmap in self.bitmaps:
+            offsets.append(offsets[-1] + len(bitmap))
+        parts.append(self.keys.tobytes())
+        parts.append(offsets.tobytes())
+        parts.extend(self.bitmaps)
+        return zlib.compress(b''.join(parts), 6)
+
+    def save(self):
+        """ Atomically write the index next to the files it covers """
+        path = os.path.join(self.directory, INDEX_FILENAME)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    def _bitmap(self, key: int) -> int:
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int.from_bytes(self.bitmaps[i], 'little')
+        return 0
+
+    def candidates(self, terms: Iterable[bytes]) -> List[str]:
+        """ Return the files that may contain any of the lowercased terms """
+        everything = (1 << len(self.files)) - 1
+        selected = 0
+        for term in terms:
+            mask = everything
+            for key in _term_trigrams(term):
+                mask &= self._bitmap(key)
+                if not mask:
+                    break
+            selected |= mask
+            if selected == everything:
+                break
+        return [os.path.join(self.directory, rel)
+                for file_id, rel in enumerate(self.files) if selected >> file_id & 1]
+
+
+def load_or_build_index(directory: str, cs_files: Optional[List[str]] = None) -> TrigramIndex:
+    """ Return the stored index for directory, building and saving it first if needed """
+    index = TrigramIndex.load(directory)
+    if index is None:
+        if cs_files is None:
+            cs_files = index_decompiled_files(directory)
+        index = TrigramIndex.build(directory, cs_files)
+        try:
+            index.save()
+        except OSError:
+            pass
+    return index
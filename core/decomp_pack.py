@@ -0,0 +1,264 @@
+"""
+Packed decompilation cache entries.
+
+With the 'packed' cache_format an assembly's decompiled sources are stored
+as one decomp_cache/<sha1>.pack file instead of a project tree of many
+small files:
+
+    header      magic, version, file count, table and index sizes
+    file table  zlib-compressed (path, offset, compressed size, size) per .cs file
+    index       the entry's TrigramIndex (see core/decomp_index.py)
+    blobs       each .cs file compressed on its own, in path order
+
+Opening a pack reads the header, table and index in two reads. Searches
+read the blobs of their candidate files in a few long sequential runs, and
+a single file is only written to disk when the user opens it
+(materialize()).
+
+Files inside a pack are addressed by virtual paths, the pack path followed
+by the file's path inside it ('decomp_cache/<sha1>.pack/Mod/Patches.cs'),
+so result records, manifests and the results window treat them like
+ordinary decompiled files.
+
+A targeted entry, holding only some of an assembly's types, lists them in
+TYPES_FILENAME: a file in the entry's folder, or in a pack a member the
+index leaves out. entry_types() reads it for either format.
+"""
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from core.decomp_index import TrigramIndex, index_decompiled_files
+from core.matcher import WINDOW_SIZE
+
+CACHE_FORMATS = ('directory', 'packed')
+DEFAULT_CACHE_FORMAT = 'directory'
+PACK_SUFFIX = '.pack'
+# Extracted files are written under <temp>/EXTRACT_DIRNAME/<sha1>/
+EXTRACT_DIRNAME = 'xmlscanner-decomp'
+# Candidate blobs closer than this are read in one run, gap included
+READ_GAP = 64 * 1024
+# JSON list of the top-level types a targeted entry holds
+TYPES_FILENAME = '.decompiled_types'
+
+_MAGIC = b'XSDP'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIII')  # magic, version, file count, table bytes, index bytes
+_ENTRY = struct.Struct('<QII')  # blob offset, compressed size, size
+
+
+class PackMember(NamedTuple):
+    path: str  # virtual path
+    offset: int  # from the start of the pack file
+    length: int  # compressed bytes
+    size: int
+
+
+def pack_path(cache_dir: str, file_hash: str) -> str:
+    return os.path.join(cache_dir, file_hash + PACK_SUFFIX)
+
+
+def split_pack_path(path: str) -> Optional[Tuple[str, str]]:
+    """ (pack path, path inside it with / separators) for a virtual path, or None for any other path """
+    normalized = path.replace('\\', '/')
+    i = normalized.find(PACK_SUFFIX + '/')
+    if i < 0:
+        return None
+    end = i + len(PACK_SUFFIX)
+    return path[:end], normalized[end + 1:]
+
+
+def write_pack(path: str, source_dir: str, index: Optional[TrigramIndex] = None):
+    """ Pack the .cs files under source_dir (and their index) into path, replacing it atomically """
+    if index is None:
+        index = TrigramIndex.build(source_dir, index_decompiled_files(source_dir))
+    # Paths inside a pack always use /, whichever system wrote it
+    rels = [rel.replace(os.sep, '/') for rel in index.files]
+    index = TrigramIndex(path, rels, index.keys, index.bitmaps)
+    extras = [name for name in (TYPES_FILENAME,) if os.path.isfile(os.path.join(source_dir, name))]
+    table = []
+    offset = 0
+    # Blobs are compressed a window at a time and spooled to disk until the table before them is known
+    with tempfile.TemporaryFile() as blobs:
+        for rel in rels + extras:
+            compressor = zlib.compressobj(6)
+            length = size = 0
+            with open(os.path.join(source_dir, *rel.split('/')), 'rb') as f:
+                for data in iter(lambda: f.read(WINDOW_SIZE), b''):
+                    size += len(data)
+                    length += blobs.write(compressor.compress(data))
+            length += blobs.write(compressor.flush())
+            encoded = rel.encode('utf-8')
+            table.append(struct.pack('<H', len(encoded)) + encoded + _ENTRY.pack(offset, length, size))
+            offset += length
+        table = zlib.compress(b''.join(table), 6)
+        index_bytes = index.to_bytes()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(rels) + len(extras), len(table), len(index_bytes)))
+            f.write(table)
+            f.write(index_bytes)
+            blobs.seek(0)
+            shutil.copyfileobj(blobs, f, WINDOW_SIZE)
+    os.replace(temp_path, path)
+
+
+class DecompPack:
+    """ File table and index of one pack """
+
+    def __init__(self, path: str, entries: Dict[str, Tuple[int, int, int]], index: TrigramIndex):
+        self.path = path
+        self.entries = entries  # path inside the pack -> (offset, compressed size, size)
+        self.index = index
+
+    @classmethod
+    def open(cls, path: str) -> 'DecompPack':
+        """ Read the table and index of the pack at path; raises ValueError if it is not a valid pack """
+        with open(path, 'rb') as f:
+            count, table_size, index_size = _read_header(f, path)
+            data = f.read(table_size + index_size)
+        entries = _parse_table(data[:table_size], count, _HEADER.size + table_size + index_size, path)
+        index = TrigramIndex.from_bytes(path, data[table_size:])
+        if index is None:
+            raise ValueError(f"Corrupt decompilation pack index: {path}")
+        return cls(path, entries, index)
+
+    def members(self, paths) -> List[PackMember]:
+        """ PackMembers for virtual paths in this pack, in file order """
+        members = []
+        for path in paths:
+            offset, length, size = self.entries[split_pack_path(path)[1]]
+            members.append(PackMember(path, offset, length, size))
+        members.sort(key=lambda m: m.offset)
+        return members
+
+
+def _read_header(f, path: str) -> Tuple[int, int, int]:
+    """ (file count, table bytes, index bytes) from the header of the pack open as f """
+    try:
+        magic, version, count, table_size, index_size = _HEADER.unpack(f.read(_HEADER.size))
+    except struct.error:
+        raise ValueError(f"Not a decompilation pack: {path}")
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"Not a decompilation pack: {path}")
+    return count, table_size, index_size
+
+
+def _parse_table(data: bytes, count: int, data_start: int, path: str) -> Dict[str, Tuple[int, int, int]]:
+    """ path inside the pack -> (offset, compressed size, size) from a compressed file table """
+    try:
+        table = zlib.decompress(data)
+        entries = {}
+        pos = 0
+        for _ in range(count):
+            (length,) = struct.unpack_from('<H', table, pos)
+            rel = table[pos + 2:pos + 2 + length].decode('utf-8')
+            offset, compressed, size = _ENTRY.unpack_from(table, pos + 2 + length)
+            entries[rel] = (data_start + offset, compressed, size)
+            pos += 2 + length + _ENTRY.size
+    except (zlib.error, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupt decompilation pack: {path} ({e})")
+    return entries
+
+
+def read_pack_file(path: str, rel: str) -> Optional[bytes]:
+    """ The file rel inside the pack at path without reading its index, or None if it has no such file """
+    with open(path, 'rb') as f:
+        count, table_size, index_size = _read_header(f, path)
+        entries = _parse_table(f.read(table_size), count, _HEADER.size + table_size + index_size, path)
+        if rel not in entries:
+            return None
+        offset, length, _ = entries[rel]
+        f.seek(offset)
+        try:
+            return zlib.decompress(f.read(length))
+        except zlib.error as e:
+            raise ValueError(f"Corrupt decompilation pack: {path} ({e})")
+
+
+def entry_types(path: str) -> Optional[List[str]]:
+    """ Top-level types the targeted cache entry at path holds, or None if it holds the whole assembly.
+
+    Raises OSError or ValueError if the entry cannot be read.
+    """
+    if path.endswith(PACK_SUFFIX):
+        data = read_pack_file(path, TYPES_FILENAME)
+    else:
+        try:
+            with open(os.path.join(path, TYPES_FILENAME), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+    return None if data is None else json.loads(data)
+
+
+def read_members(pack: str, members: List[PackMember]):
+    """ Yield (member, data) for members sorted by offset, reading nearby blobs in one run """
+    with open(pack, 'rb') as f:
+        i = 0
+        while i < len(members):
+            # Extend the run while the next blob starts within READ_GAP of its end
+            j = i + 1
+            while j < len(members) and members[j].offset - (members[j - 1].offset + members[j - 1].length) <= READ_GAP:
+                j += 1
+            start = members[i].offset
+            f.seek(start)
+            run = f.read(members[j - 1].offset + members[j - 1].length - start)
+            for member in members[i:j]:
+                yield member, zlib.decompress(run[member.offset - start:member.offset - start + member.length])
+            i = j
+
+
+def copy_member(f, member: PackMember, out, window_size: int = WINDOW_SIZE):
+    """ Decompress member from the pack open as f into the binary file out, window_size bytes at a time """
+    f.seek(member.offset)
+    decompressor = zlib.decompressobj()
+    remaining = member.length
+    try:
+        while remaining:
+            chunk = f.read(min(window_size, remaining))
+            if not chunk:
+                raise ValueError(f"Truncated decompilation pack: {member.path}")
+            remaining -= len(chunk)
+            while chunk:
+                out.write(decompressor.decompress(chunk, window_size))
+                chunk = decompressor.unconsumed_tail
+        out.write(decompressor.flush())
+    except zlib.error as e:
+        raise ValueError(f"Corrupt decompilation pack: {member.path} ({e})")
+
+
+def materialize(path: str, whole_pack: bool = False) -> str:
+    """ Return a real file for path, extracting it from its pack first if it is a virtual path.
+
+    With whole_pack every file in the pack is extracted, for browsing the
+    folder. Paths outside packs are returned unchanged.
+    """
+    parts = split_pack_path(path)
+    if parts is None:
+        return path
+    pack, rel = parts
+    target_dir = os.path.join(tempfile.gettempdir(), EXTRACT_DIRNAME,
+                              os.path.basename(pack)[:-len(PACK_SUFFIX)])
+    target = os.path.join(target_dir, *rel.split('/'))
+    if not whole_pack and os.path.exists(target):
+        return target
+    opened = DecompPack.open(pack)
+    wanted = list(opened.entries) if whole_pack else [rel]
+    members = opened.members(pack + '/' + name for name in wanted)
+    for member, data in read_members(pack, members):
+        destination = os.path.join(target_dir, *split_pack_path(member.path)[1].split('/'))
+        if os.path.exists(destination):
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, destination)
+    return target
+
@@ -0,0 +1,182 @@
+"""
+Decompilation scheduling for the scanner.
+
+DecompileScheduler owns a fixed number of decompiler threads fed from a
+priority queue. Jobs are ordered by expected cost, the longest first, so
+large assemblies start early and overlap with the stream of small ones
+instead of trailing at the end of the run. Expected cost comes from
+DecompileHistory, which remembers how long each assembly took before and
+falls back to the file size at the average observed rate. Targeted jobs,
+which decompile only some types of an assembly, are not recorded.
+
+Small whole-assembly jobs mostly pay decompiler startup, so with a batch
+size above one a thread that takes such a job also takes the small ones
+queued behind it and hands them to decompile_batch together. The cost
+order puts them at the end of the queue, next to each other.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import concurrent.futures
+from typing import Callable, List, Optional, Tuple
+
+from core.cancel import ScanCancelled
+
+HISTORY_FILENAME = 'decompile_history.json'
+# Seconds per byte assumed before any decompile has been timed
+_DEFAULT_RATE = 1.0 / (512 * 1024)
+# Jobs expected to take at most this many seconds are batched
+BATCH_MAX_COST = 2.0
+# Most jobs in one batch unless decompile_batch_size says otherwise
+DEFAULT_BATCH_SIZE = 8
+
+
+class DecompileHistory:
+    """ Persistent record of past decompile durations, keyed by DLL hash """
+
+    def __init__(self, cache_dir: str):
+        self.path = os.path.join(cache_dir, HISTORY_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self._update_rate()
+
+    def _update_rate(self):
+        total_bytes = sum(size for size, _ in self.entries.values())
+        total_seconds = sum(seconds for _, seconds in self.entries.values())
+        self.rate = total_seconds / total_bytes if total_bytes and total_seconds else _DEFAULT_RATE
+
+    def expected_cost(self, file_hash: str, size: int) -> float:
+        """ Expected decompile time in seconds """
+        entry = self.entries.get(file_hash)
+        if entry:
+            return entry[1]
+        return size * self.rate
+
+    def record(self, file_hash: str, size: int, seconds: float):
+        with self.lock:
+            self.entries[file_hash] = [size, round(seconds, 3)]
+            self.dirty = True
+            self._update_rate()
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            data = json.dumps(self.entries)
+            self.dirty = False
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+
+
+class DecompileScheduler:
+    """ Bounded pool of decompiler threads that runs the most expensive pending job first """
+
+    def __init__(self, decompile: Callable[[str, str, Optional[List[str]]], str], max_workers: int,
+                 history: DecompileHistory, decompile_batch: Callable[[List[Tuple[str, str]]], list] = None,
+                 batch_size: int = 1):
+        self.decompile = decompile
+        # Takes (dll_path, file_hash) pairs; returns decompile()'s result or the exception for each
+        self.decompile_batch = decompile_batch
+        self.batch_size = batch_size if decompile_batch else 1
+        self.history = history
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f"decompile-{i}", daemon=True)
+                         for i in range(max(1, max_workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, dll_path: str, file_hash: str, size: int, types: List[str] = None) -> concurrent.futures.Future:
+        """ Queue dll_path (or just its types) for decompilation; the future resolves to decompile()'s result """
+        future = concurrent.futures.Future()
+        cost = self.history.expected_cost(file_hash, size)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Decompile scheduler is shut down")
+            heapq.heappush(self._heap, (-cost, next(self._order), dll_path, file_hash, size, types, future))
+            self._cond.notify()
+        return future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _batchable(self, entry) -> bool:
+        return self.batch_size > 1 and entry[5] is None and -entry[0] <= BATCH_MAX_COST
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                batch = [heapq.heappop(self._heap)]
+                if self._batchable(batch[0]):
+                    while self._heap and len(batch) < self.batch_size and self._batchable(self._heap[0]):
+                        batch.append(heapq.heappop(self._heap))
+            batch = [entry for entry in batch if entry[-1].set_running_or_notify_cancel()]
+            if len(batch) > 1:
+                self._run_batch(batch)
+            elif batch:
+                self._run(*batch[0][2:])
+
+    def _run(self, dll_path, file_hash, size, types, future):
+        start = time.monotonic()
+        try:
+            future.set_result(self.decompile(dll_path, file_hash, types))
+        except ScanCancelled as e:
+            # A killed decompile says nothing about how long it takes
+            future.set_exception(e)
+            return
+        except BaseException as e:
+            future.set_exception(e)
+        # Timeouts are recorded too so the assembly is scheduled first next time
+        if types is None:
+            self.history.record(file_hash, size, time.monotonic() - start)
+
+    def _run_batch(self, batch):
+        start = time.monotonic()
+        try:
+            results = self.decompile_batch([(entry[2], entry[3]) for entry in batch])
+        except BaseException as e:
+            for entry in batch:
+                entry[-1].set_exception(e)
+            return
+        elapsed = time.monotonic() - start
+        total = sum(entry[4] for entry in batch) or 1
+        for (_, _, _, file_hash, size, _, future), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+                if isinstance(result, ScanCancelled):
+                    continue
+            else:
+                future.set_result(result)
+            # The run is shared, so each DLL is charged its share by size
+            self.history.record(file_hash, size, elapsed * size / total)
+
+    def shutdown(self, cancel_pending: bool = False):
+        """ Stop accepting work and wait for the decompiler threads to finish """
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for entry in self._heap:
+                    entry[-1].cancel()
+                self._heap.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
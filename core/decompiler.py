@@ -0,0 +1,182 @@
+"""
+Decompiler backends.
+
+A scan creates one backend and shares it between its decompile threads.
+The decompiler is looked up once per scan (decompiler_path, or ilspycmd on
+PATH) instead of once per DLL. ProcessBackend runs ilspycmd with its own
+command line.
+
+Small assemblies are mostly .NET and decompiler startup, so
+decompile_batch() decompiles several DLLs with one run: ilspycmd -p with
+several assemblies writes each project to <output>/<assembly name>/ (and a
+solution file beside them), and each folder is then moved to its DLL's
+output folder. A DLL the run did not produce, or every DLL of a run that
+failed, is decompiled again on its own, so one bad assembly only costs its
+batch a second pass.
+
+Targeted decompiles ask for a list of top-level types instead of the whole
+project. Each type is written to <output>/<type>.decompiled.cs, as
+ilspycmd -t does; the process backend runs ilspycmd once per type, so it
+takes at most PROCESS_MAX_TYPES.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from core.cancel import CancelToken, ScanCancelled
+
+DEFAULT_TOOL = 'ilspycmd'
+ILSPY_OPTIONS = ["--no-dead-code", "--no-dead-stores"]
+# Types the process backend decompiles one run at a time; beyond this a whole decompile is cheaper
+PROCESS_MAX_TYPES = 4
+
+
+def resolve_tool(tool: str = None) -> str:
+    """ Full path of the decompiler: tool (a path or a name on PATH), or ilspycmd """
+    resolved = shutil.which(tool or DEFAULT_TOOL)
+    if resolved is None:
+        if tool:
+            raise RuntimeError(f"Decompiler not found: {tool}")
+        raise RuntimeError("ilspycmd not found. Install with: dotnet tool install -g ilspycmd")
+    # A relative PATH entry would break once the decompiler runs elsewhere
+    return os.path.abspath(resolved)
+
+
+def _check_paths(dll_path: str, output_dir: str):
+    if not os.path.exists(dll_path):
+        raise FileNotFoundError(f"DLL not found at: {dll_path}")
+    os.makedirs(output_dir, exist_ok=True)
+
+
+class DecompilerBackend:
+    """ Turns a DLL into a folder of C# sources; safe to call from several threads """
+    name = None
+    max_types = None  # most types decompile() takes at once, None for no limit
+
+    def decompile(self, dll_path: str, output_dir: str, timeout: float = None, cancel_token: CancelToken = None,
+                  types: List[str] = None):
+        """ Decompile dll_path into output_dir, as a project or, with types, just those top-level types.
+
+        Raises RuntimeError if decompiling fails or takes longer than timeout
+        seconds, and ScanCancelled if cancel_token is cancelled meanwhile.
+        """
+        raise NotImplementedError
+
+    def decompile_batch(self, dll_paths: List[str], output_dirs: List[str], timeout: float = None,
+                        cancel_token: CancelToken = None) -> List[Optional[Exception]]:
+        """ Decompile each of dll_paths as a project into the matching output_dirs entry.
+
+        Returns, per DLL, None or the exception that stopped it; only
+        ScanCancelled is raised. timeout applies to each DLL on its own.
+        """
+        errors = []
+        for dll_path, output_dir in zip(dll_paths, output_dirs):
+            try:
+                self.decompile(dll_path, output_dir, timeout, cancel_token)
+                errors.append(None)
+            except ScanCancelled:
+                raise
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def close(self):
+        """ Stop any decompiler processes the backend keeps running """
+
+
+class ProcessBackend(DecompilerBackend):
+    """ One decompiler process per DLL, or per batch of small DLLs """
+    name = 'process'
+    max_types = PROCESS_MAX_TYPES
+
+    def __init__(self, tool: str = None):
+        self.tool = tool
+        self.resolved = None
+        self.lock = threading.Lock()
+
+    def command(self) -> str:
+        # Resolved on first use, so scans that decompile nothing never need the tool
+        with self.lock:
+            if self.resolved is None:
+                self.resolved = resolve_tool(self.tool)
+            return self.resolved
+
+    def decompile(self, dll_path, output_dir, timeout=None, cancel_token=None, types=None):
+        _check_paths(dll_path, output_dir)
+        command = self.command()
+        # The decompiler is killed if the scan is cancelled while it runs
+        cancel_token = cancel_token or CancelToken()
+        runs = [["-p"]] if types is None else [["-t", name] for name in types]
+        # One timeout for the whole DLL, however many runs it takes
+        deadline = time.monotonic() + timeout if timeout else None
+        for options in runs:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                returncode = cancel_token.run([command, dll_path, "-o", output_dir] + options + ILSPY_OPTIONS,
+                                              timeout=remaining)
+            except subprocess.TimeoutExpired:
+                raise RuntimeError(f"Decompilation timed out after {timeout:.0f} seconds")
+            if returncode != 0:
+                raise RuntimeError(f"Decompilation failed with code {returncode}")
+
+    def decompile_batch(self, dll_paths, output_dirs, timeout=None, cancel_token=None):
+        # ilspycmd names each project folder after its assembly, so a run takes one DLL per name
+        batch, names = [], set()
+        for i, dll_path in enumerate(dll_paths):
+            name = os.path.normcase(os.path.splitext(os.path.basename(dll_path))[0])
+            if name not in names and os.path.exists(dll_path):
+                names.add(name)
+                batch.append(i)
+        done = set()
+        if len(batch) > 1:
+            done = {batch[i] for i in self._run_batch([dll_paths[i] for i in batch], [output_dirs[i] for i in batch],
+                                                      timeout, cancel_token or CancelToken())}
+        errors = [None] * len(dll_paths)
+        rest = [i for i in range(len(dll_paths)) if i not in done]
+        for i, error in zip(rest, super().decompile_batch([dll_paths[i] for i in rest],
+                                                          [output_dirs[i] for i in rest], timeout, cancel_token)):
+            errors[i] = error
+        return errors
+
+    def _run_batch(self, dll_paths, output_dirs, timeout, cancel_token) -> List[int]:
+        """ One ilspycmd run over dll_paths; returns the positions of those whose project it wrote """
+        command = self.command()
+        for output_dir in output_dirs:
+            os.makedirs(output_dir, exist_ok=True)
+        # Inside the first output folder, so moving the projects out is a rename
+        batch_dir = tempfile.mkdtemp(prefix='batch-', dir=output_dirs[0])
+        try:
+            try:
+                # Batches hold small assemblies only, so one DLL's timeout covers the run
+                returncode = cancel_token.run([command] + dll_paths + ["-o", batch_dir, "-p"] + ILSPY_OPTIONS,
+                                              timeout=timeout)
+            except subprocess.TimeoutExpired:
+                return []
+            if returncode != 0:
+                return []
+            done = []
+            for i, (dll_path, output_dir) in enumerate(zip(dll_paths, output_dirs)):
+                project = os.path.join(batch_dir, os.path.splitext(os.path.basename(dll_path))[0])
+                if not os.path.isdir(project):
+                    continue
+                try:
+                    for entry in os.listdir(project):
+                        os.replace(os.path.join(project, entry), os.path.join(output_dir, entry))
+                except OSError:
+                    # Decompiled again on its own, over whatever was moved
+                    continue
+                done.append(i)
+            return done
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+def decompile_assembly(dll_path: str, output_dir: str, timeout: float = None, cancel_token: CancelToken = None) -> str:
+    """ Decompile one DLL with a fresh ilspycmd run and return output_dir """
+    ProcessBackend().decompile(dll_path, output_dir, timeout, cancel_token)
+    return output_dir
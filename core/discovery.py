@@ -0,0 +1,54 @@
+"""
+Single-pass file discovery for the scanner.
+
+walk_files() walks a directory tree once with os.scandir, classifies every
+file by extension and yields matches as soon as they are seen, so scanning
+can start while the rest of the tree is still being enumerated.
+"""
+
+import os
+from typing import Iterable, Iterator, Tuple
+
+
+def walk_files(directory: str, extensions: Iterable[str]) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """ Yield (path, extension, stat result) for every file under directory with one of extensions.
+
+    Mirrors glob's '**' behaviour: hidden entries are skipped, symlinked
+    directories are followed and extensions compare case-insensitively only
+    where the filesystem does (os.path.normcase).
+    """
+    extensions = tuple(os.path.normcase(ext) for ext in extensions)
+    if not extensions:
+        return
+    stack = [directory]
+    # Real paths of the root and of every symlinked directory followed, so a
+    # link back up the tree is walked at most once more
+    visited = {os.path.realpath(directory)}
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if entry.is_symlink():
+                                real = os.path.realpath(entry.path)
+                                if real in visited:
+                                    continue
+                                visited.add(real)
+                            subdirs.append(entry.path)
+                            continue
+                        name = os.path.normcase(entry.name)
+                        for ext in extensions:
+                            if name.endswith(ext):
+                                yield entry.path, ext, entry.stat()
+                                break
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        # Reversed so directories are visited in the order scandir listed them
+        stack.extend(reversed(subdirs))
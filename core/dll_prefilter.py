@@ -0,0 +1,194 @@
+"""
+Metadata prefilter for DLLs that are not in the decompilation cache yet.
+
+ILSpy builds C# from the assembly's metadata: its type, namespace and
+member names (#Strings), string literals (#US), attribute values and
+constants (#Blob), and the attributes stored as flags and table rows
+([DllImport], [StructLayout], [MarshalAs], [Serializable]...), which it
+writes by name. Everything else it writes is C# keywords, numbers, and
+names and comments of its own. So before queueing a decompile, DllPrefilter
+reads the metadata (core/clr_metadata.py) and decompiles only assemblies
+whose vocabulary holds every word of at least one search term, compared
+case-insensitively like the matcher does. Native DLLs, with no .NET
+metadata at all, are never decompiled.
+
+The check is deliberately loose: the words of a term may come from
+different names, and digits are ignored. The one thing metadata cannot
+show is the name of an enum member or constant defined in another
+assembly (ILSpy looks those up in the referenced assembly), so the word
+after a referenced type's name is not required: 'BindingFlags.NonPublic'
+passes if the assembly uses BindingFlags. A lone enum member name is not
+seen. Regex terms without a required literal let every assembly through.
+Files that are not valid PE files are left to the decompiler, which
+reports them as before.
+
+With targeted decompilation the same check runs once per top-level type,
+against what that type's own source file can contain (see
+core/type_vocabulary.py), and only the types that pass are decompiled.
+Small assemblies, assemblies where most types pass, and assemblies whose
+AssemblyInfo.cs could match are still decompiled whole.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+from core.clr_metadata import PSEUDO_ATTRIBUTE_NAMES, TYPE_REF, read_metadata
+from core.type_vocabulary import TypeVocabulary, type_vocabularies
+
+PREFILTER_DECOMPILE = 'decompile'
+PREFILTER_NATIVE = 'native'
+PREFILTER_NO_MATCH = 'no_match'
+# Targeted decompilation is only worth it for assemblies with at least this
+# many types, when at most this share of them needs decompiling
+TARGETED_MIN_TYPES = 20
+TARGETED_MAX_SHARE = 0.25
+
+# Words that show up in decompiled code without being in the assembly's
+# metadata: C# keywords, names ILSpy gives locals and generated members,
+# and its comments
+GENERATED_WORDS = (
+    "abstract as base bool break byte case catch char checked class const continue decimal default delegate do "
+    "double else enum event explicit extern false finally fixed float for foreach goto if implicit in int interface "
+    "internal is lock long namespace new null object operator out override params private protected public readonly "
+    "ref return sbyte sealed short sizeof stackalloc static string struct switch this throw true try typeof uint "
+    "ulong unchecked unsafe ushort using virtual void volatile while add alias and ascending async await by "
+    "descending dynamic equals from get global group init into join let managed nameof nint not notnull nuint "
+    "on or orderby partial record remove required scoped select set unmanaged value var when where with yield "
+    "assembly module field method param property type typevar return "
+    "num flag text obj array list item val result current enumerator ex ptr intptr handle awaiter state statemachine "
+    "instance handler action func task source selector predicate key element collection disposable locals cs "
+    "displayclass b__ c__ d__ il_ unknown might be due to invalid il missing references expected o but got "
+    "could not decode attribute arguments warning error decompiled with icsharpcode decompiler unresolved "
+    "auto generated version"
+).split()
+
+# Runs of letters (and underscores and UTF-8 bytes); digits are never checked
+_WORD = re.compile(rb'[a-z_\x80-\xff]+')
+
+# Type names the decompiler's type option, or a file name, cannot take as they are
+_AWKWARD_TYPE_NAME = re.compile(r'[\s,\[\]+*&\\/<>:"|?]')
+
+_ESCAPES = {'\0': '\\0', '\a': '\\a', '\b': '\\b', '\f': '\\f', '\n': '\\n', '\r': '\\r', '\t': '\\t',
+            '\v': '\\v', '\\': '\\\\', '"': '\\"'}
+
+
+def _lowered(text: str) -> bytes:
+    # bytes.lower() like the matcher, which only folds ASCII
+    return text.encode('utf-8', 'replace').lower()
+
+
+def _escaped(literal: str) -> str:
+    """ literal the way ILSpy writes it inside a C# string """
+    return ''.join(_ESCAPES.get(c) or (f'\\u{ord(c):04x}' if c < ' ' or '\x7f' <= c < '\xa0'
+                                       or '\ud800' <= c <= '\udfff' else c) for c in literal)
+
+
+class TermWords(NamedTuple):
+    words: List[bytes]  # lowercased words of one search literal
+    member: bool  # the last word follows a '.', so it may be an enum member or constant of another assembly
+
+
+def term_words(literal: bytes) -> TermWords:
+    """ The words of a lowercased search literal that an assembly's vocabulary must contain """
+    matches = list(_WORD.finditer(literal))
+    member = len(matches) > 1 and literal[matches[-1].start() - 1:matches[-1].start()] == b'.'
+    return TermWords([m.group() for m in matches], member)
+
+
+class PrefilterResult(NamedTuple):
+    verdict: str  # PREFILTER_NATIVE, PREFILTER_NO_MATCH or PREFILTER_DECOMPILE
+    types: Optional[List[str]] = None  # with targeted decompilation, the only types to decompile; None for all
+
+
+class DllPrefilter:
+    """ Decides from its metadata whether decompiling an assembly (or which of its types) can find matcher's terms """
+
+    def __init__(self, matcher, targeted: bool = False):
+        self.targeted = targeted
+        literals = matcher.index_terms()
+        # None for a term that can match anything, so every assembly is decompiled
+        self.terms = None if any(not literal for literal in literals) else [term_words(t) for t in literals]
+        if self.terms is not None and any(not term.words for term in self.terms):
+            self.terms = None
+        self.generated = b'\0'.join(w.encode('ascii') for w in GENERATED_WORDS)
+
+    def vocabulary(self, metadata) -> bytes:
+        """ Lowercased text every word of the assembly's decompiled source comes from """
+        # String constants are UTF-16 in the #Blob heap
+        literals = metadata.user_strings() + metadata.string_constants()
+        # Attributes kept in flags and tables, which ILSpy writes out by name
+        attributes = {name for _, _, attribute in metadata.pseudo_attributes()
+                      for name in PSEUDO_ATTRIBUTE_NAMES[attribute]}
+        return b'\0'.join([
+            metadata.strings_heap.lower(),
+            _lowered('\0'.join(attributes)),
+            metadata.blob_heap.lower(),
+            _lowered('\0'.join(literals)),
+            _lowered('\0'.join(_escaped(s) for s in literals)),
+            self.generated,
+        ])
+
+    def type_vocabulary(self, vocabulary: TypeVocabulary) -> bytes:
+        """ vocabulary() for the source file of one type """
+        return b'\0'.join([
+            _lowered('\0'.join(vocabulary.names)),
+            b'\0'.join(vocabulary.blobs).lower(),
+            _lowered('\0'.join(vocabulary.literals)),
+            _lowered('\0'.join(_escaped(s) for s in vocabulary.literals)),
+            self.generated,
+        ])
+
+    @staticmethod
+    def _has(vocabulary: bytes, word: bytes) -> bool:
+        # ILSpy singularizes collection names for loop variables ('entries' -> 'entry')
+        return word in vocabulary or (word.endswith(b'y') and word[:-1] + b'ies' in vocabulary)
+
+    def matches(self, vocabulary: bytes, type_names) -> bool:
+        """ Whether some term can be made from vocabulary; type_names() lists the types used, for member words """
+        names = None
+        for words, member in self.terms:
+            if not all(self._has(vocabulary, word) for word in words[:-1]):
+                continue
+            if self._has(vocabulary, words[-1]):
+                return True
+            if member:
+                if names is None:
+                    names = [_lowered(name).split(b'`')[0] for name in type_names()]
+                # A term cut off mid-name may start part way into the type name
+                if any(name.endswith(words[-2]) for name in names):
+                    return True
+        return False
+
+    def select_types(self, metadata) -> Optional[List[str]]:
+        """ Full names of the top-level types whose source can contain a term, or None to decompile them all """
+        try:
+            types, assembly = type_vocabularies(metadata)
+        except ValueError:
+            return None
+        names = [vocabulary.name for vocabulary in types]
+        if len(types) < TARGETED_MIN_TYPES or len(set(names)) < len(names) \
+                or self.matches(self.type_vocabulary(assembly), lambda: assembly.type_names):
+            return None
+        selected = [vocabulary.name for vocabulary in types
+                    if self.matches(self.type_vocabulary(vocabulary), lambda: vocabulary.type_names)]
+        if len(selected) > TARGETED_MAX_SHARE * len(types) or any(_AWKWARD_TYPE_NAME.search(n) for n in selected):
+            return None
+        return selected
+
+    def check(self, dll_path: str) -> PrefilterResult:
+        """ The verdict on the DLL at dll_path and, with targeted decompilation, the types worth decompiling.
+
+        Raises OSError if the file cannot be read and ValueError if it is not
+        a valid PE file.
+        """
+        metadata = read_metadata(dll_path)
+        if metadata is None:
+            return PrefilterResult(PREFILTER_NATIVE)
+        if self.terms is None:
+            return PrefilterResult(PREFILTER_DECOMPILE)
+        if not self.matches(self.vocabulary(metadata), lambda: [metadata.string(row[1]) for row in metadata.rows(TYPE_REF)]):
+            return PrefilterResult(PREFILTER_NO_MATCH)
+        types = self.select_types(metadata) if self.targeted else None
+        if types == []:
+            return PrefilterResult(PREFILTER_NO_MATCH)
+        return PrefilterResult(PREFILTER_DECOMPILE, types)
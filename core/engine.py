@@ -0,0 +1,839 @@
+"""
+Qt-free scanning engine.
+
+ScanEngine walks the base directories, searches XML files and the cached
+decompilations of DLLs, and reports every matching file as a MatchRecord.
+Records can be taken all at once from run(), streamed to an on_match
+callback, or consumed with the iter_matches() generator. Status messages,
+progress and counts arrive through an on_progress callback as
+rate-limited ProgressBatches (see core/progress.py). Every run also
+times its stages and counts skipped, reused and searched files in a
+ScanStats (see core/stats.py), returned as ScanSummary.report.
+
+Nothing here imports Qt; core/scanner.py adapts the engine to Qt signals
+for the GUI.
+"""
+
+import os
+import contextlib
+import json
+import queue
+import threading
+import tempfile
+import shutil
+import time
+import concurrent.futures
+from typing import Callable, Iterator, List, NamedTuple, Optional, Set
+
+from libs.util import shorten_path, get_cpu_count
+from libs.Settings import Settings
+from core.matcher import TermMatcher, extract_matches, parse_terms, LARGE_FILE_THRESHOLD
+from core.decomp_index import INDEX_FILENAME, TrigramIndex, index_decompiled_files, load_or_build_index
+from core.decomp_pack import (DecompPack, CACHE_FORMATS, DEFAULT_CACHE_FORMAT, PACK_SUFFIX, TYPES_FILENAME, entry_types,
+                              pack_path, read_members, split_pack_path, write_pack)
+from core.cache_store import CacheIndex, PARTIAL_PREFIX
+from core.cache_lock import EntryLock
+from core.decompiler import ProcessBackend
+from core.dll_prefilter import DllPrefilter, PrefilterResult, PREFILTER_DECOMPILE, PREFILTER_NATIVE, PREFILTER_NO_MATCH
+from core.search_pool import SearchPool, BatchBuffer, DEFAULT_BACKEND
+from core.discovery import walk_files
+from core.manifest import ScanManifest
+from core.identity import HashCache
+from core.decompile_scheduler import DecompileScheduler, DecompileHistory, DEFAULT_BATCH_SIZE
+from core.cancel import CancelToken
+from core.progress import ProgressBatch, ProgressThrottle, PROGRESS_INTERVAL
+from core.stats import ScanStats
+
+
+class MatchRecord(NamedTuple):
+    """ One matching file; a plain 5-tuple to everything that predates it """
+    path: str  # the XML file, or the DLL the decompiled file came from
+    file: str  # the XML file again, or the decompiled source file that matched
+    occurrences: int
+    matched_terms: List[str]
+    matched_line: str
+
+    @property
+    def is_dll(self) -> bool:
+        return self.path != self.file
+
+
+class ScanSummary(NamedTuple):
+    """ What run() returns """
+    records: List[MatchRecord]
+    files_found: int  # XML and DLL files discovered by the walk
+    cancelled: bool
+    errors: int  # files (or DLLs) that could not be scanned, and failures to save scan state
+    report: dict  # per-stage timings and counters, see ScanStats.report()
+
+
+class PendingDecompile(NamedTuple):
+    """ Returned by process_dll_file for a DLL that is not in the cache yet, or only partly """
+    dll_path: str
+    file_hash: str
+    st: os.stat_result
+    types: Optional[List[str]] = None  # the only types to decompile; None for the whole assembly
+
+
+class ScanEngine:
+    """ One scan of base_dirs for search_string.
+
+    Unset options fall back to settings.json: dll_whitelist, search_backend,
+    search_workers, decompile_workers, decompile_timeout, incremental_scan,
+    cache_format, cache_max_mb, decompiler_path, decompile_batch_size,
+    dll_prefilter, targeted_decompile and large_file_threshold_mb. An engine
+    runs once.
+
+    The 'process' search backend, the default, spawns its workers, which
+    import the main module again: a script must start the scan under
+    if __name__ == '__main__', or use search_backend='thread'.
+    """
+
+    def __init__(self, base_dirs, search_string: str, scan_dlls: bool = True, scan_xmls: bool = True,
+                 cache_dir: str = "decomp_cache", settings: Settings = None, dll_whitelist: List[str] = None,
+                 search_backend: str = None, search_workers: int = None, decompile_workers: int = None,
+                 decompile_timeout: float = None, incremental: bool = None, cache_format: str = None,
+                 cache_max_mb: float = None, decompile_batch_size: int = None,
+                 prefilter: bool = None, targeted: bool = None):
+        if isinstance(base_dirs, str):
+            base_dirs = base_dirs.split(';')
+        self.base_dirs = [d.strip() for d in base_dirs if d.strip()]
+        self.search_terms = parse_terms(search_string)
+        self.scan_dlls = scan_dlls
+        self.scan_xmls = scan_xmls
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.settings = settings if settings is not None else Settings()
+        # Built once per scan; finds all terms in a bounded number of passes per buffer.
+        # Files of large_file_threshold_mb or more are scanned in windows (0 = never)
+        large_file_threshold = int(self.settings.get('large_file_threshold_mb', LARGE_FILE_THRESHOLD // (1024 * 1024)) * 1024 * 1024)
+        self.matcher = TermMatcher(self.search_terms, large_file_threshold)
+        if dll_whitelist is None:
+            dll_whitelist = self.settings.get('dll_whitelist', [])
+        self.dll_whitelist = set([x.strip().lower() for x in dll_whitelist if x.strip()])
+        # Where file searches run: 'process' (all cores), 'thread' or 'inline'
+        self.search_backend = search_backend or self.settings.get('search_backend', DEFAULT_BACKEND)
+        self.search_workers = search_workers or self.settings.get('search_workers', 0) or get_cpu_count()
+        self.search_pool = None
+        # Reuse stored results for files unchanged since the last scan with these terms
+        self.incremental = self.settings.get('incremental_scan', True) if incremental is None else incremental
+        self.manifest = None
+        # SHA-1 of each DLL keyed by path/size/mtime/inode, so unchanged DLLs are not re-read
+        self.hash_cache = HashCache(self.cache_dir)
+        # Decompiles run on their own bounded pool, longest expected first
+        self.decompile_workers = (decompile_workers or self.settings.get('decompile_workers', 0)
+                                  or max(1, int(get_cpu_count() // 2)))
+        if decompile_timeout is None:
+            decompile_timeout = self.settings.get('decompile_timeout', 600)
+        self.decompile_timeout = decompile_timeout or None
+        self.decompile_history = DecompileHistory(self.cache_dir)
+        # The decompiler is looked up once per scan
+        self.decompiler = ProcessBackend(self.settings.get('decompiler_path') or None)
+        # Small DLLs decompiled together by one decompiler run (1 = one run per DLL)
+        if decompile_batch_size is None:
+            decompile_batch_size = self.settings.get('decompile_batch_size', DEFAULT_BATCH_SIZE)
+        self.decompile_batch_size = max(1, decompile_batch_size or 1)
+        # How new decompilations are stored; entries in either format are read
+        self.cache_format = cache_format or self.settings.get('cache_format', DEFAULT_CACHE_FORMAT)
+        if self.cache_format not in CACHE_FORMATS:
+            raise ValueError(f"Unknown cache format: {self.cache_format} (expected one of {', '.join(CACHE_FORMATS)})")
+        # Entry sizes and last use; with a budget, least recently used entries are evicted after the scan
+        self.cache_index = CacheIndex(self.cache_dir)
+        if cache_max_mb is None:
+            cache_max_mb = self.settings.get('cache_max_mb', 0)
+        self.cache_budget = int((cache_max_mb or 0) * 1024 * 1024)
+        # Large assemblies get only the types that can match decompiled, as partial cache entries
+        if prefilter is False and targeted:
+            raise ValueError("Targeted decompiles need the DLL prefilter")
+        if targeted is None:
+            targeted = self.settings.get('targeted_decompile', False)
+        # Skips decompiling native DLLs and assemblies whose metadata cannot produce any term;
+        # targeted decompiles pick their types with it, so they turn it on
+        if prefilter is None:
+            prefilter = self.settings.get('dll_prefilter', False) or targeted
+        self.prefilter = DllPrefilter(self.matcher, targeted) if prefilter else None
+        self.scheduler = None
+        # DLL hashes already searched in this scan, so copies of one DLL are searched once
+        self.scanned_hashes = set()
+        self.hashes_lock = threading.Lock()
+        # Set by cancel(); queued work is dropped, ilspycmd is killed and the
+        # results found so far are still returned
+        self.cancel_token = CancelToken()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.cancel_token.on_cancel(self.cancel_pending)
+        self.throttle = ProgressThrottle()
+        self.errors = 0
+        self.errors_lock = threading.Lock()
+        self.stats = ScanStats()
+        self.on_match = None
+        self.on_progress = None
+
+    def log(self, message):
+        """ Queue a status message for the next batch; safe to call from any thread """
+        self.throttle.message(message)
+
+    def error(self, message):
+        """ Log a failure to scan something and count it in the summary; safe to call from any thread """
+        with self.errors_lock:
+            self.errors += 1
+        self.log(message)
+
+    def flush_progress(self, force=False):
+        """ Hand everything queued since the last batch to on_progress if PROGRESS_INTERVAL has passed """
+        batch = self.throttle.take(force)
+        if batch is not None and self.on_progress:
+            with self.stats.stage('emit'):
+                self.on_progress(batch)
+
+    def cancel(self):
+        """ Stop the scan as soon as possible; safe to call from any thread """
+        self.cancel_token.cancel()
+
+    def cancel_pending(self):
+        """ Cancel every tracked future that has not started yet """
+        with self.pending_lock:
+            futures = list(self.pending)
+        for future in futures:
+            future.cancel()
+
+    def first_sighting(self, file_hash):
+        """ True the first time a DLL hash is seen in this scan """
+        with self.hashes_lock:
+            if file_hash in self.scanned_hashes:
+                return False
+            self.scanned_hashes.add(file_hash)
+            return True
+
+    def cached_entry(self, file_hash):
+        """ Path of the cache entry for file_hash in either format, or None """
+        directory, pack = os.path.join(self.cache_dir, file_hash), pack_path(self.cache_dir, file_hash)
+        for path in ((pack, directory) if self.cache_format == 'packed' else (directory, pack)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def process_dll_file(self, dll_path, matcher):
+        """ Settle one DLL without decompiling it.
+
+        Returns the matched files (or None) for whitelisted, duplicate, unchanged
+        and cached DLLs, or a PendingDecompile for DLLs that still need one.
+        """
+        self.hash_cache.mark_seen(dll_path)
+        # Whitelist check
+        dll_name = os.path.basename(dll_path).lower()
+        if any(whitelisted.lower() == dll_name.lower() for whitelisted in self.dll_whitelist):
+            self.log(f"Skipping whitelisted DLL: {dll_name}")
+            self.stats.count('skipped_whitelist')
+            return None
+        try:
+            with self.stats.stage('hash', dll_path):
+                st = os.stat(dll_path)
+        except OSError as e:
+            self.error(f"Error hashing DLL: {dll_path} - {e}")
+            return None
+        with self.stats.stage('cache_lookup', dll_path):
+            entry = self.manifest.lookup(dll_path, st) if self.manifest else None
+            # A stored result is only usable while its decompilation is still cached
+            reused_path = self.cached_entry(entry['sha1']) if entry else None
+        if reused_path:
+            if not self.first_sighting(entry['sha1']):
+                self.log(f"Skipping duplicate DLL (already scanned): {shorten_path(dll_path)})")
+                self.stats.count('skipped_duplicate')
+                return None
+            self.log(f"Unchanged since last scan: {shorten_path(dll_path)}")
+            self.stats.count('unchanged_dlls')
+            self.cache_index.touch(reused_path)
+            return [MatchRecord(dll_path, decomp_file, occ, matched_terms, matched_line)
+                    for decomp_file, occ, matched_terms, matched_line in entry['result'] or []] or None
+        # SHA-1 of the DLL file, only re-hashed when its metadata changed
+        try:
+            with self.stats.stage('hash', dll_path):
+                file_hash = self.hash_cache.sha1(dll_path, st)
+        except Exception as e:
+            self.error(f"Error hashing DLL: {dll_path} - {e}")
+            return None
+        if not self.first_sighting(file_hash):
+            self.log(f"Skipping duplicate DLL (already scanned): {shorten_path(dll_path)})")
+            self.stats.count('skipped_duplicate')
+            return None
+        with self.stats.stage('cache_lookup', dll_path):
+            cache_path = self.cached_entry(file_hash)
+            covered = self.covered_types(cache_path) if cache_path else None
+        if cache_path is None:
+            plan = self.plan_decompile(dll_path)
+            if self.prefiltered(dll_path, plan.verdict):
+                return None
+            return PendingDecompile(dll_path, file_hash, st, plan.types)
+        if covered is not None:
+            # A targeted entry serves these terms only if it holds every type that can match them
+            plan = self.plan_decompile(dll_path)
+            if plan.verdict == PREFILTER_DECOMPILE and (plan.types is None or not covered.issuperset(plan.types)):
+                self.log(f"Cached decompilation lacks types that can match, decompiling more: {shorten_path(dll_path)}")
+                self.stats.count('cache_partial_misses')
+                return PendingDecompile(dll_path, file_hash, st, plan.types)
+        self.log(f"Using cached decompilation for {shorten_path(dll_path)}")
+        self.stats.count('cache_hits')
+        return self.search_dll(dll_path, file_hash, st, cache_path, matcher)
+
+    def covered_types(self, cache_path) -> Optional[Set[str]]:
+        """ Types the targeted cache entry at cache_path holds, or None if it holds the whole assembly """
+        try:
+            types = entry_types(cache_path)
+        except (OSError, ValueError):
+            # Searching the entry reports what is wrong with it
+            return None
+        return None if types is None else set(types)
+
+    def plan_decompile(self, dll_path) -> PrefilterResult:
+        """ The metadata prefilter's verdict on decompiling dll_path and the types worth decompiling """
+        if self.prefilter is None:
+            return PrefilterResult(PREFILTER_DECOMPILE)
+        try:
+            with self.stats.stage('prefilter', dll_path):
+                return self.prefilter.check(dll_path)
+        except Exception:
+            # Not a readable PE file, or metadata the reader cannot follow; the decompiler decides
+            return PrefilterResult(PREFILTER_DECOMPILE)
+
+    def prefiltered(self, dll_path, verdict) -> bool:
+        """ Whether the prefilter's verdict rules out finding anything by decompiling dll_path """
+        if verdict == PREFILTER_NATIVE:
+            self.log(f"Skipping native DLL (no .NET metadata): {shorten_path(dll_path)}")
+            self.stats.count('skipped_native')
+            return True
+        if verdict == PREFILTER_NO_MATCH:
+            self.log(f"Skipping DLL whose metadata mentions no search term: {shorten_path(dll_path)}")
+            self.stats.count('skipped_prefilter')
+            return True
+        return False
+
+    @contextlib.contextmanager
+    def locked_entry(self, file_hash, dll_path, shared=False):
+        """ Hold the cross-process lock on file_hash's cache entry, waiting for other scans if needed """
+        lock = EntryLock(self.cache_dir, file_hash, shared)
+        if not lock.try_acquire():
+            self.log(f"Waiting for another scan using the cached decompilation of {shorten_path(dll_path)}...")
+            self.stats.count('cache_lock_waits')
+            lock.acquire(timeout=self.decompile_timeout, cancel_token=self.cancel_token)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def decompile_to_cache(self, dll_path, file_hash, types=None):
+        """ Decompile dll_path (or just types of it) into the cache entry for file_hash, unless another scan just did """
+        with self.locked_entry(file_hash, dll_path):
+            cache_path = self.cached_entry(file_hash)
+            covered = self.covered_types(cache_path) if cache_path else None
+            if cache_path is not None and (covered is None or types is not None and covered.issuperset(types)):
+                self.log(f"Decompiled by another scan meanwhile: {shorten_path(dll_path)}")
+                self.stats.count('decompiled_elsewhere')
+                return cache_path
+            return self.build_cache_entry(dll_path, file_hash, types, cache_path, covered)
+
+    def decompile_batch_to_cache(self, jobs):
+        """ Decompile the whole DLLs of jobs, (dll_path, file_hash) pairs, with as few decompiler runs as possible.
+
+        Returns each one's cache path, or the exception that stopped it.
+        Entries another scan is working on are left out of the run and
+        handled one at a time afterwards, waiting for that scan.
+        """
+        results = [None] * len(jobs)
+        locks, batch = {}, []
+        try:
+            for i, (dll_path, file_hash) in enumerate(jobs):
+                # Never wait on a lock while holding others: another scan may be batching the same DLLs
+                lock = EntryLock(self.cache_dir, file_hash)
+                if not lock.try_acquire():
+                    lock.release()
+                    continue
+                locks[i] = lock
+                cache_path = self.cached_entry(file_hash)
+                if cache_path is not None and self.covered_types(cache_path) is None:
+                    self.log(f"Decompiled by another scan meanwhile: {shorten_path(dll_path)}")
+                    self.stats.count('decompiled_elsewhere')
+                    results[i] = cache_path
+                else:
+                    batch.append(i)
+            if batch:
+                self.build_batch_entries(jobs, batch, results)
+        finally:
+            for lock in locks.values():
+                lock.release()
+        for i, (dll_path, file_hash) in enumerate(jobs):
+            if i not in locks:
+                try:
+                    results[i] = self.decompile_to_cache(dll_path, file_hash)
+                except Exception as e:
+                    results[i] = e
+        return results
+
+    def build_batch_entries(self, jobs, batch, results):
+        """ Decompile jobs[i] for each i in batch with one run and publish their entries into results.
+
+        The caller holds the entries' locks.
+        """
+        temp_dirs = {i: tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=self.cache_dir) for i in batch}
+        try:
+            dll_paths = [jobs[i][0] for i in batch]
+            self.log(f"Decompiling {len(batch)} DLLs together: {', '.join(shorten_path(p) for p in dll_paths)}")
+            start_time = time.time()
+            with self.stats.stage('decompile'):
+                errors = self.decompiler.decompile_batch(dll_paths, [temp_dirs[i] for i in batch],
+                                                         timeout=self.decompile_timeout, cancel_token=self.cancel_token)
+            elapsed = time.time() - start_time
+            self.log(f"Decompilation complete: {len(batch)} DLLs Took: {elapsed:.2f} seconds")
+            sizes = {i: os.path.getsize(jobs[i][0]) if os.path.exists(jobs[i][0]) else 0 for i in batch}
+            total = sum(sizes.values()) or 1
+            for i, error in zip(batch, errors):
+                dll_path, file_hash = jobs[i]
+                # The run's time is shared out by size for the slowest DLLs list
+                self.stats.add_dll(dll_path, 'decompile', elapsed * sizes[i] / total)
+                if error is not None:
+                    results[i] = error
+                    continue
+                # A targeted entry the whole project replaces
+                base = self.cached_entry(file_hash)
+                covered = self.covered_types(base) if base else None
+                try:
+                    results[i] = self.build_cache_entry(dll_path, file_hash, base=base, covered=covered,
+                                                        decompiled=temp_dirs.pop(i))
+                except Exception as e:
+                    results[i] = e
+        finally:
+            for temp_dir in temp_dirs.values():
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def build_cache_entry(self, dll_path, file_hash, types=None, base=None, covered=None, decompiled=None):
+        """ Decompile dll_path, index it and publish it as the cache entry for file_hash.
+
+        With types only those types are decompiled, added to the types
+        covered by base, the targeted entry being extended, unless the
+        backend takes fewer. decompiled is a PARTIAL_PREFIX folder in the
+        cache that already holds the whole project, from a batch. Any
+        existing entry is replaced; the caller holds its lock.
+        """
+        if types is not None:
+            types = sorted(set(types) - (covered or set()))
+            if self.decompiler.max_types is not None and len(types) > self.decompiler.max_types:
+                # Cheaper as one whole decompile than a run per type
+                types = covered = None
+        # Written inside the cache so publishing is a rename; a crash leaves a partial folder for maintenance
+        temp_dir = decompiled or tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=self.cache_dir)
+        try:
+            if decompiled is None:
+                if types is not None and base is not None:
+                    self.copy_entry_files(base, temp_dir)
+                self.log(f"Decompiling {shorten_path(dll_path)}..." if types is None else
+                         f"Decompiling {len(types)} types of {shorten_path(dll_path)}...")
+                start_time = time.time()
+                with self.stats.stage('decompile', dll_path):
+                    self.decompiler.decompile(dll_path, temp_dir, timeout=self.decompile_timeout,
+                                              cancel_token=self.cancel_token, types=types)
+                self.log(f"Decompilation complete: {shorten_path(dll_path)} "
+                         f"Took: {time.time() - start_time:.2f} seconds")
+            self.stats.count('decompiled')
+            if types is not None:
+                self.stats.count('decompiled_targeted')
+                self.stats.count('decompiled_types', len(types))
+                with open(os.path.join(temp_dir, TYPES_FILENAME), 'w', encoding='utf-8') as f:
+                    json.dump(sorted(set(types) | (covered or set())), f)
+            # Index before publishing so every cache entry carries its index
+            with self.stats.stage('index', dll_path):
+                index = TrigramIndex.build(temp_dir, index_decompiled_files(temp_dir))
+                if self.cache_format == 'packed':
+                    cache_path = pack_path(self.cache_dir, file_hash)
+                    write_pack(cache_path, temp_dir, index)
+                else:
+                    cache_path = os.path.join(self.cache_dir, file_hash)
+                    index.save()
+                    self.publish_directory(temp_dir, cache_path)
+        finally:
+            # Gone already once renamed into the cache
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if base is not None and base != cache_path:
+            # Replaced by an entry in the other format
+            self.remove_replaced(base)
+        self.cache_index.add(cache_path)
+        return cache_path
+
+    def copy_entry_files(self, path, target_dir):
+        """ Copy the decompiled files of the cache entry at path into target_dir """
+        if not path.endswith(PACK_SUFFIX):
+            for root, _, files in os.walk(path):
+                target = os.path.join(target_dir, os.path.relpath(root, path))
+                os.makedirs(target, exist_ok=True)
+                for name in files:
+                    if name not in (INDEX_FILENAME, TYPES_FILENAME):
+                        shutil.copy2(os.path.join(root, name), os.path.join(target, name))
+            return
+        pack = DecompPack.open(path)
+        members = pack.members(f"{path}/{rel}" for rel in pack.entries if rel != TYPES_FILENAME)
+        for member, data in read_members(path, members):
+            target = os.path.join(target_dir, *split_pack_path(member.path)[1].split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+    def publish_directory(self, temp_dir, cache_path):
+        """ Rename temp_dir to cache_path, replacing the targeted entry there if there is one """
+        if not os.path.exists(cache_path):
+            os.rename(temp_dir, cache_path)
+            return
+        # Directories cannot be swapped in one rename; readers wait on the entry lock meanwhile
+        trash = tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=self.cache_dir)
+        os.rename(cache_path, os.path.join(trash, 'entry'))
+        os.rename(temp_dir, cache_path)
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def remove_replaced(self, path):
+        """ Delete a cache entry superseded by a new one, with its lock already held """
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def search_dll(self, dll_path, file_hash, st, decomp_dir, matcher):
+        """ Search a DLL's cached decompilation (a directory or a pack) and record the outcome in the manifest """
+        # Keeps other scans from evicting the entry while it is read
+        with self.locked_entry(file_hash, dll_path, shared=True):
+            if not os.path.exists(decomp_dir):
+                # Another scan may have rebuilt it in the other format, with more types
+                replacement = self.cached_entry(file_hash)
+                if replacement is None:
+                    raise RuntimeError(f"Cached decompilation was removed by another scan: {decomp_dir}")
+                decomp_dir = replacement
+            return self.search_entry(dll_path, file_hash, st, decomp_dir, matcher)
+
+    def search_entry(self, dll_path, file_hash, st, decomp_dir, matcher):
+        """ search_dll() with the entry's shared lock held """
+        occurrences_total = 0
+        total_scanned = 0
+        had_error = False
+        start_time = time.time()
+        matched_files = []
+        # Entries cached before indexing existed get their index built on first use
+        with self.stats.stage('index', dll_path):
+            if decomp_dir.endswith(PACK_SUFFIX):
+                pack = DecompPack.open(decomp_dir)
+                index = pack.index
+            else:
+                pack = None
+                index = load_or_build_index(decomp_dir)
+            candidates = index.candidates(matcher.index_terms())
+        self.cache_index.touch(decomp_dir)
+        self.stats.count('decompiled_files', len(index.files))
+        self.stats.count('decompiled_files_searched', len(candidates))
+        search_start = time.perf_counter()
+        if pack is not None:
+            results = self.search_pool.search_pack_iter(pack, candidates)
+        else:
+            results = self.search_pool.search_iter(candidates)
+        for file_path, match, error in results:
+            # Never record a partly searched DLL in the manifest
+            self.cancel_token.check()
+            total_scanned += 1
+            if error:
+                self.error(f"Error reading decompiled file: {error}")
+                had_error = True
+            elif match:
+                occurrences_total += match.occurrences
+                matched_files.append(MatchRecord(dll_path, file_path, match.occurrences, match.matched_terms, match.matched_line))
+        # The search stage itself is timed by the pool's workers
+        self.stats.add_dll(dll_path, 'search', time.perf_counter() - search_start)
+        if not had_error:
+            self.log(f"Scanned {total_scanned} of {len(index.files)} files, found {occurrences_total} occurrences. Took: {time.time() - start_time:.2f} seconds")
+            if self.manifest:
+                self.manifest.record(dll_path, st, [list(m[1:]) for m in matched_files] or None, sha1=file_hash)
+        # Return all matched files for this DLL
+        return matched_files if matched_files else None
+
+    def run(self, on_match: Callable[[MatchRecord], None] = None,
+            on_progress: Callable[[ProgressBatch], None] = None) -> ScanSummary:
+        """ Run the scan on this thread.
+
+        on_match is called with each MatchRecord as it is found and
+        on_progress with a ProgressBatch at most every PROGRESS_INTERVAL
+        seconds, both on this thread. The batch's found list repeats the
+        records passed to on_match.
+        """
+        self.on_match = on_match
+        self.on_progress = on_progress
+        found_files = []
+        self.manifest = ScanManifest(self.cache_dir, self.matcher.terms, self.base_dirs) if self.incremental else None
+        try:
+            self.search_pool = SearchPool(self.matcher, self.search_backend, self.search_workers, stats=self.stats)
+        except Exception as e:
+            self.log(f"Search backend '{self.search_backend}' unavailable ({e}), searching inline")
+            self.search_pool = SearchPool(self.matcher, 'inline', stats=self.stats)
+        try:
+            total_files = self.scan_files(found_files)
+        finally:
+            self.search_pool.shutdown()
+            self.decompiler.close()
+        cancelled = self.cancel_token.cancelled
+        try:
+            if self.manifest:
+                self.manifest.save(partial=cancelled)
+            # Only a scan that walked the DLLs knows which of them are gone
+            self.hash_cache.save(self.base_dirs if self.scan_dlls else (), partial=cancelled)
+            self.decompile_history.save()
+            if self.cache_budget and not cancelled:
+                self.enforce_cache_budget()
+            self.cache_index.save()
+        except OSError as e:
+            self.error(f"Could not save scan state: {e}")
+
+        if cancelled:
+            self.log(f"Scan cancelled. Keeping {len(found_files)} matching files found so far.")
+        elif total_files == 0:
+            self.log("No XML or DLL files found.")
+        else:
+            self.log(f"Scan completed. Found {len(found_files)} matching files.")
+        self.flush_progress(force=True)
+        self.stats.count('bytes_hashed', self.hash_cache.bytes_hashed)
+        self.stats.count('matches', len(found_files))
+        self.stats.count('errors', self.errors)
+        return ScanSummary(found_files, total_files, cancelled, self.errors, self.stats.report())
+
+    def enforce_cache_budget(self):
+        """ Evict least recently used cache entries this scan did not use until the cache fits its budget """
+        evicted, freed, total = self.cache_index.enforce_budget(self.cache_budget)
+        self.stats.count('cache_evicted', evicted)
+        if evicted:
+            self.log(f"Evicted {evicted} cache entries ({freed / (1024 * 1024):.1f} MB) to stay within the cache budget")
+        if total > self.cache_budget:
+            self.log(f"Decompilation cache is {total / (1024 * 1024):.1f} MB, over its "
+                     f"{self.cache_budget / (1024 * 1024):.0f} MB budget, with entries this scan used")
+
+    def iter_matches(self) -> Iterator[MatchRecord]:
+        """ Run the scan on a background thread and yield MatchRecords as they are found.
+
+        Closing the generator early cancels the scan. Progress is not
+        reported; use run() with callbacks for that.
+        """
+        records = queue.Queue()
+        done = object()
+        errors = []
+
+        def work():
+            try:
+                self.run(on_match=records.put)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                records.put(done)
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+        try:
+            while True:
+                record = records.get()
+                if record is done:
+                    break
+                yield record
+        finally:
+            if thread.is_alive():
+                self.cancel()
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def scan_files(self, found_files):
+        """ Walk every base directory once, scanning files while the walk is still running.
+
+        XML files are cut into batches for the search pool and DLLs go to the
+        DLL thread pool as soon as they are discovered; cached DLLs are searched
+        right away and the rest are handed to the decompile scheduler. Completed
+        work is reported through a queue fed by future callbacks. Returns the
+        number of files discovered.
+        """
+        extensions = (['.xml'] if self.scan_xmls else []) + (['.dll'] if self.scan_dlls else [])
+        self.completed = queue.Queue()
+        self.outstanding = 0
+        self.processed = 0
+        self.discovered = 0
+        self.file_stats = {}
+        counts = {'.xml': 0, '.dll': 0}
+        xml_batch = BatchBuffer()
+
+        self.log("Collecting XML and DLL files...")
+        max_workers = max(1, int(get_cpu_count() // 2))
+        # Hashing, cache lookups and searches that are not waiting on a decompile;
+        # the walk pauses while this many are in flight
+        self.max_in_flight = 4 * (max_workers + self.search_pool.max_workers)
+        # DLLs queued for or in a decompile have a bound of their own, deep enough for the scheduler
+        # to order a few rounds of jobs by cost, so slow decompiles never stop cached DLLs from being searched
+        self.max_decompiling = max(self.max_in_flight, 4 * self.decompile_workers * self.decompile_batch_size)
+        self.decompiling = 0
+        self.scheduler = DecompileScheduler(self.decompile_to_cache, self.decompile_workers, self.decompile_history,
+                                            self.decompile_batch_to_cache, self.decompile_batch_size)
+        # Settle DLLs in a thread pool; their decompiled sources go to the search pool
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as dll_executor:
+            self.dll_executor = dll_executor
+            try:
+                for directory in self.base_dirs:
+                    if self.cancel_token.cancelled:
+                        break
+                    if not os.path.exists(directory):
+                        self.log(f"Warning: Directory does not exist: {directory}")
+                        continue
+                    self.log(f"Scanning directory: {directory}")
+                    dir_files = 0
+                    for path, ext, st in self.stats.timed('enumerate', walk_files(directory, extensions)):
+                        if self.cancel_token.cancelled:
+                            break
+                        dir_files += 1
+                        self.discovered += 1
+                        counts[ext] += 1
+                        if ext == '.xml':
+                            with self.stats.stage('cache_lookup'):
+                                entry = self.manifest.lookup(path, st) if self.manifest else None
+                            if entry:
+                                self.stats.count('unchanged_xmls')
+                                if entry['result']:
+                                    self.report_xml(found_files, path, *entry['result'])
+                                self.advance()
+                                continue
+                            self.file_stats[path] = st
+                            batch = xml_batch.add(path, st.st_size)
+                            if batch:
+                                self.track(self.search_pool.submit(batch), 'xml', batch)
+                        else:
+                            self.track(self.dll_executor.submit(self.process_dll_file, path, self.matcher), 'dll', path)
+                        self.throttle.set_counts(counts['.xml'], counts['.dll'])
+                        self.drain(found_files, block=False)
+                        while (self.outstanding - self.decompiling >= self.max_in_flight
+                               or self.decompiling >= self.max_decompiling):
+                            self.drain(found_files, block=True)
+                    self.log(f"Found {dir_files} total files in {directory}")
+                if xml_batch.paths and not self.cancel_token.cancelled:
+                    batch = xml_batch.take()
+                    self.track(self.search_pool.submit(batch), 'xml', batch)
+
+                self.throttle.set_counts(counts['.xml'], counts['.dll'])
+                self.stats.count('xml_files', counts['.xml'])
+                self.stats.count('dll_files', counts['.dll'])
+                while self.outstanding:
+                    self.drain(found_files, block=True)
+            finally:
+                self.scheduler.shutdown()
+        return self.discovered
+
+    def track(self, future, kind, payload):
+        """ Queue future's outcome for drain() once it finishes """
+        self.outstanding += 1
+        with self.pending_lock:
+            self.pending.add(future)
+        future.add_done_callback(lambda f: self.finished(kind, payload, f))
+        if self.cancel_token.cancelled:
+            future.cancel()
+
+    def finished(self, kind, payload, future):
+        with self.pending_lock:
+            self.pending.discard(future)
+        self.completed.put((kind, payload, future))
+
+    def drain(self, found_files, block):
+        """ Report finished XML batches and DLLs; waits for one if block is set """
+        while self.outstanding:
+            self.flush_progress()
+            try:
+                # Wake up regularly while waiting so batches keep flowing
+                kind, payload, future = self.completed.get(block=block, timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                if block:
+                    continue
+                return
+            block = False
+            self.outstanding -= 1
+            if kind == 'xml':
+                try:
+                    results = future.result().results
+                except Exception as e:
+                    results = [(filename, None, str(e)) for filename in payload]
+                for filename, match, error in results:
+                    st = self.file_stats.pop(filename, None)
+                    if self.cancel_token.cancelled and (error or future.cancelled()):
+                        self.advance()
+                        continue
+                    self.log(f"Scanning: {shorten_path(filename)}")
+                    if error:
+                        self.error(f"Error processing {filename}: {error}")
+                    else:
+                        self.stats.count('xmls_searched')
+                        result = [match.occurrences, match.matched_terms, match.matched_line] if match else None
+                        if result:
+                            self.report_xml(found_files, filename, *result)
+                        if self.manifest and st:
+                            self.manifest.record(filename, st, result)
+                    self.advance()
+            elif kind == 'decompile':
+                self.decompiling -= 1
+                try:
+                    cache_path = future.result()
+                    self.cancel_token.check()
+                except Exception as e:
+                    if not self.cancel_token.cancelled:
+                        self.error(f"Decompilation failed: {payload.dll_path}\n{e}")
+                        self.stats.count('decompile_failed')
+                    self.advance()
+                    continue
+                self.track(self.dll_executor.submit(self.search_dll, payload.dll_path, payload.file_hash,
+                                                    payload.st, cache_path, self.matcher), 'dll', payload.dll_path)
+            else:
+                try:
+                    if not self.cancel_token.cancelled:
+                        self.log(f"Scanning: {shorten_path(payload)}")
+                    result = future.result()
+                    if isinstance(result, PendingDecompile):
+                        self.cancel_token.check()
+                        self.decompiling += 1
+                        self.track(self.scheduler.submit(result.dll_path, result.file_hash, result.st.st_size,
+                                                         result.types), 'decompile', result)
+                        continue
+                    if result:
+                        for record in result:
+                            self.report(found_files, record)
+                except Exception as e:
+                    if not self.cancel_token.cancelled:
+                        self.error(f"Error processing {payload}: {e}")
+                self.advance()
+
+    def report_xml(self, found_files, filename, occurrences, matched_terms, matched_line):
+        # XML records repeat the file path: (filepath, filepath, occurrences, matched_terms, matched_line)
+        self.report(found_files, MatchRecord(filename, filename, occurrences, matched_terms, matched_line))
+
+    def report(self, found_files, record):
+        found_files.append(record)
+        self.throttle.file_found(record)
+        if self.on_match:
+            with self.stats.stage('emit'):
+                self.on_match(record)
+
+    def advance(self):
+        # The total keeps growing while the walk is running
+        self.processed += 1
+        self.throttle.set_progress(int(self.processed / max(1, self.discovered) * 100))
+
+
+# -- Optional: Console-based utility call --
+def scan_for_string(base_dir, search_string):
+    found_files = []
+    base_dirs = [d.strip() for d in base_dir.split(';') if d.strip()]
+    matcher = TermMatcher(parse_terms(search_string))
+
+    for directory in base_dirs:
+        if os.path.exists(directory):
+            for xml_file, _, _ in walk_files(directory, ['.xml']):
+                try:
+                    match = extract_matches(xml_file, matcher)
+                    if match:
+                        found_files.append((xml_file, match.occurrences))
+                except Exception as e:
+                    print(f"Error reading {xml_file}: {e}")
+
+    return found_files
@@ -0,0 +1,93 @@
+"""
+DLL identity: content hashes cached by file metadata.
+
+The decompilation cache is keyed by the SHA-1 of each DLL. HashCache keeps
+the hash of every DLL seen before together with its path, size, mtime_ns and
+inode, so unchanged assemblies are identified from a stat() alone. When a
+hash does have to be computed the file is streamed in chunks instead of being
+read into memory whole. Entries for DLLs that have since been deleted or
+moved are dropped when a complete scan of their directory saves the cache.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+HASH_CACHE_FILENAME = 'dll_hashes.json'
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def file_sha1(path: str) -> str:
+    """ SHA-1 of path, read in fixed-size chunks """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """ Persistent (path, size, mtime_ns, inode) -> SHA-1 map """
+
+    def __init__(self, cache_dir: str):
+        self.path = os.path.join(cache_dir, HASH_CACHE_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        # Keys of the DLLs this scan came across, hashed or not
+        self.seen = set()
+        # Bytes read by sha1() since the cache was loaded
+        self.bytes_hashed = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def sha1(self, path: str, st: os.stat_result = None) -> str:
+        """ Return the SHA-1 of path, hashing it only if it changed since last seen """
+        st = st or os.stat(path)
+        key = _key(path)
+        self.seen.add(key)
+        identity = [st.st_size, st.st_mtime_ns, st.st_ino]
+        entry = self.entries.get(key)
+        if entry and entry[:3] == identity:
+            return entry[3]
+        file_hash = file_sha1(path)
+        with self.lock:
+            self.entries[key] = identity + [file_hash]
+            self.dirty = True
+            self.bytes_hashed += st.st_size
+        return file_hash
+
+    def mark_seen(self, path: str):
+        """ Keep path's entry on save() even if this scan never needed its hash """
+        self.seen.add(_key(path))
+
+    def save(self, scan_dirs=(), partial: bool = False):
+        """ Write the cache if it changed since it was loaded.
+
+        Entries under scan_dirs for DLLs this scan did not see are dropped,
+        unless the scan was partial (cancelled), like ScanManifest.save().
+        """
+        dirs = [_key(d).rstrip(os.sep) for d in scan_dirs]
+        with self.lock:
+            if not partial and dirs:
+                stale = [key for key in self.entries if key not in self.seen
+                         and any(key == d or key.startswith(d + os.sep) for d in dirs)]
+                for key in stale:
+                    del self.entries[key]
+                self.dirty = self.dirty or bool(stale)
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries)
+            self.dirty = False
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
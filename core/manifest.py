@@ -0,0 +1,80 @@
+"""
+Per-file result manifest for incremental re-scans.
+
+The manifest remembers, for one set of search terms, what every scanned file
+produced together with the size and mtime it had at the time. When a later
+scan finds a file with the same size and mtime its stored result is reused
+without opening the file.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Iterable, List, Optional
+
+# Bump when matching semantics change so old results are not reused
+MANIFEST_VERSION = 2
+MANIFEST_DIRNAME = 'manifests'
+
+
+def terms_key(terms: Iterable[str]) -> str:
+    """ Stable hash of a search term set """
+    joined = '\n'.join(sorted(set(terms)))
+    return hashlib.sha1(f"{MANIFEST_VERSION}\n{joined}".encode('utf-8')).hexdigest()
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ScanManifest:
+    """ Stored scan results keyed by path, size and mtime for one term set """
+
+    def __init__(self, cache_dir: str, terms: Iterable[str], scan_dirs: List[str]):
+        self.path = os.path.join(cache_dir, MANIFEST_DIRNAME, terms_key(terms) + '.json')
+        self.scan_dirs = [_norm(d) for d in scan_dirs]
+        self.lock = threading.Lock()
+        self.previous = {}
+        self.current = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.previous = data.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, path: str, st: os.stat_result) -> Optional[dict]:
+        """ Return the stored entry for path if the file is unchanged, else None """
+        entry = self.previous.get(path)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            with self.lock:
+                self.current[path] = entry
+            return entry
+        return None
+
+    def record(self, path: str, st: os.stat_result, result, **extra):
+        """ Remember result (JSON-serialisable, or None for no matches) for path """
+        entry = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'result': result}
+        entry.update(extra)
+        with self.lock:
+            self.current[path] = entry
+
+    def _in_scope(self, path: str) -> bool:
+        norm = _norm(path)
+        return any(norm == d or norm.startswith(d.rstrip(os.sep) + os.sep) for d in self.scan_dirs)
+
+    def save(self, partial: bool = False):
+        """ Write entries seen this scan plus those outside the scanned directories.
+
+        A partial (cancelled) scan also keeps every entry it did not get to.
+        """
+        files = {p: e for p, e in self.previous.items()
+                 if p not in self.current and (partial or not self._in_scope(p))}
+        files.update(self.current)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': files}, f)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,471 @@
+"""
+Multi-term matching used by the scanner.
+
+A TermMatcher is built once per scan from the search terms. Terms are folded
+into a prefix trie and compiled into a handful of regular expressions (one per
+leading character, or a single combined one when the terms start with many
+different characters), so a buffer is walked a bounded number of times no
+matter how many terms are configured.
+
+Terms may also be wildcards ('System.Reflection.Emit.*', where '*' stands for
+any run of identifier characters and dots, and a trailing '.*' also matches the
+bare namespace) or regular expressions written as 're:<pattern>'. Each
+pattern's required literal joins the literal trie, so a pattern only runs on
+buffers where that literal was seen.
+
+Files above a size threshold are never read whole: they are scanned in
+fixed-size windows, each lowercased on its own, so memory per search stays
+bounded however large the file is.
+"""
+
+import codecs
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# Longest matched line kept for display in results
+MATCHED_LINE_LENGTH = 50
+# Files at least this large are scanned in windows instead of read whole
+LARGE_FILE_THRESHOLD = 8 * 1024 * 1024
+# Bytes read per window when scanning a large file
+WINDOW_SIZE = 1024 * 1024
+# Terms starting with this are regular expressions
+PATTERN_PREFIX = 're:'
+# In any other term this matches a run of identifier characters and dots
+WILDCARD = '*'
+_WILDCARD_SOURCE = r'[\w.]*'
+# A trailing '.*' also matches the end of a name, so 'Namespace.*' finds 'using Namespace;'
+_NAMESPACE_WILDCARD_SOURCE = r'(?:\.[\w.]*|(?!\w))'
+
+
+def parse_terms(search_string: str) -> List[str]:
+    """ Split a ';'-separated search string into terms, lowercasing all but regex terms """
+    terms = []
+    for term in search_string.split(';'):
+        term = term.strip()
+        if term:
+            terms.append(term if term.startswith(PATTERN_PREFIX) else term.lower())
+    return terms
+
+
+def _ascii_lower(text: str) -> str:
+    """ Lowercase like bytes.lower(): ASCII letters only """
+    return ''.join(c.lower() if c.isascii() else c for c in text)
+
+
+def _required_literal(source: str) -> str:
+    """ Longest run of plain characters that every match of the regex source contains """
+    best = run = ''
+    for op, av in sre_parse.parse(source):
+        if op == sre_parse.LITERAL:
+            run += chr(av)
+            if len(run) > len(best):
+                best = run
+        else:
+            run = ''
+    return best
+
+
+def _compile_pattern(term: str):
+    """ Return (compiled bytes regex, required lowercase literal) for a wildcard or regex term """
+    if term.startswith(PATTERN_PREFIX):
+        source = term[len(PATTERN_PREFIX):]
+        try:
+            regex = re.compile(source.encode('utf-8'), re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression '{source}': {e}") from None
+        literal = _ascii_lower(_required_literal(source))
+    else:
+        parts = term.split(WILDCARD)
+        suffix = b''
+        if len(parts) > 1 and not parts[-1] and parts[-2].endswith('.'):
+            # 'Namespace.*' also matches the namespace itself, as in 'using Namespace;'
+            parts = parts[:-2] + [parts[-2][:-1]]
+            suffix = _NAMESPACE_WILDCARD_SOURCE.encode('ascii')
+        source = _WILDCARD_SOURCE.encode('ascii').join(re.escape(p.encode('utf-8')) for p in parts)
+        regex = re.compile(source + suffix)
+        literal = max(parts, key=len)
+    return regex, literal.encode('utf-8')
+
+
+def _count_matches(regex, buffer, pos=0, limit=None):
+    """ Return (non-empty non-overlapping matches of regex in buffer from pos, offset of the first or -1, resume).
+
+    With a limit, matches ending after it are left uncounted and resume is
+    where the first of them starts; otherwise resume is None.
+    """
+    count, first = 0, -1
+    for match in regex.finditer(buffer, pos):
+        if match.end() > match.start():
+            if limit is not None and match.end() > limit:
+                return count, first, match.start()
+            if not count:
+                first = match.start()
+            count += 1
+    return count, first, None
+
+
+def _trie_pattern(terms):
+    """ Compile a list of literal terms (all str or all bytes) into a prefix-factored regex source """
+    root = {}
+    for term in terms:
+        node = root
+        for i in range(len(term)):
+            node = node.setdefault(term[i:i + 1], {})
+        node[None] = None
+
+    if isinstance(terms[0], bytes):
+        lit = lambda s: s.encode('ascii')
+    else:
+        lit = lambda s: s
+
+    def build(node):
+        alts = [re.escape(k) + build(node[k]) for k in sorted(k for k in node if k is not None)]
+        if not alts:
+            return lit('')
+        body = alts[0] if len(alts) == 1 else lit('(?:') + lit('|').join(alts) + lit(')')
+        if None in node:
+            # A term ends here but longer terms continue; the greedy group
+            # still prefers the longest term at any given position.
+            body = lit('(?:') + body + lit(')?')
+        return body
+
+    return build(root)
+
+
+# Hits in a row on terms already found before present() stops running the
+# group pattern and finds the group's missing terms one by one instead
+REPEAT_LIMIT = 32
+
+
+class _CompiledTerms:
+    """ Literal terms compiled for one buffer type (bytes or str).
+
+    hidden terms are pattern prefilter literals: they are reported as present
+    but do not count towards the earliest match offset.
+    """
+
+    def __init__(self, terms, max_groups, hidden=()):
+        self.terms = terms
+        # Terms that are a prefix of another term never win the longest match
+        # at a position, so remember them to report alongside the longer one.
+        self.prefixes = {t: [u for u in terms if u != t and t.startswith(u)] for t in terms}
+        self.visible = {t: t not in hidden or any(u not in hidden for u in self.prefixes[t]) for t in terms}
+        # Terms whose occurrences can overlap, e.g. 'aa'; counting them across
+        # window boundaries needs the exact end of the last counted match
+        self.overlapping = {t for t in terms if any(t[:k] == t[-k:] for k in range(1, len(t)))}
+        groups = {}
+        for term in terms:
+            groups.setdefault(term[:1], []).append(term)
+        if len(groups) > max_groups:
+            self.groups = [list(terms)]
+        else:
+            self.groups = list(groups.values())
+        self.patterns = [re.compile(_trie_pattern(group)) for group in self.groups]
+
+    def present(self, buffer):
+        """ Return (terms occurring at least once in buffer, offset of the earliest match) """
+        found = set()
+        first = -1
+        for group, pattern in zip(self.groups, self.patterns):
+            missing = len(group)
+            repeats = 0
+            match = pattern.search(buffer)
+            while match:
+                term = match.group()
+                if term in found:
+                    repeats += 1
+                    if repeats > REPEAT_LIMIT:
+                        # A term keeps coming back; look for the rest directly.
+                        # Nothing missing occurs before here, or the pattern
+                        # would have found it, so find() gives first occurrences.
+                        for other in group:
+                            if other not in found:
+                                pos = buffer.find(other, match.start())
+                                if pos >= 0:
+                                    found.add(other)
+                                    if self.visible[other] and (first < 0 or pos < first):
+                                        first = pos
+                        break
+                else:
+                    repeats = 0
+                    if self.visible[term] and (first < 0 or match.start() < first):
+                        first = match.start()
+                    for name in [term] + self.prefixes[term]:
+                        if name not in found:
+                            found.add(name)
+                            missing -= 1
+                    if not missing:
+                        break
+                match = pattern.search(buffer, match.start() + 1)
+        return found, first
+
+
+class TermMatcher:
+    """ Finds every search term in a buffer in a bounded number of passes """
+
+    # Above this many distinct leading characters a single combined pattern
+    # is cheaper than one pass per group.
+    MAX_GROUPS = 8
+
+    def __init__(self, terms: List[str], large_file_threshold: int = LARGE_FILE_THRESHOLD):
+        """ terms are lowercased search terms, see parse_terms(); raises ValueError for a bad regex """
+        # Keep the caller's order so matched_terms come out as they did before
+        self.terms = list(dict.fromkeys(t for t in terms if t))
+        self.large_file_threshold = large_file_threshold
+        # name -> (regex, required literal) for wildcard and regex terms
+        self._patterns = {t: _compile_pattern(t) for t in self.terms
+                          if t.startswith(PATTERN_PREFIX) or WILDCARD in t}
+        self._names = {t.encode('utf-8'): t for t in self.terms if t not in self._patterns}
+        hidden = [lit for _, lit in self._patterns.values() if lit and lit not in self._names]
+        literals = list(self._names) + list(dict.fromkeys(hidden))
+        self._bytes = _CompiledTerms(literals, self.MAX_GROUPS, hidden) if literals else None
+
+    def _literals_present(self, buffer):
+        if self._bytes is None:
+            return set(), -1
+        return self._bytes.present(buffer)
+
+    def _scan_patterns(self, buffer, found, counts, starts=None, keep=None):
+        """ Add pattern matches in buffer to counts; returns the offset of the first or -1.
+
+        starts maps a pattern to the offset its next match may begin at. With
+        keep, buffer is the front of a line that goes on: only matches ending
+        at least keep bytes before its end are counted, and starts is updated
+        to where each pattern resumes once more of the line has been read.
+        """
+        first = -1
+        limit = None if keep is None else len(buffer) - keep
+        for name, (regex, literal) in self._patterns.items():
+            start = starts.get(name, 0) if starts else 0
+            if literal and literal not in found:
+                n, pattern_first, resume = 0, -1, limit
+            else:
+                n, pattern_first, resume = _count_matches(regex, buffer, start, limit)
+            if n:
+                counts[name] = counts.get(name, 0) + n
+                if first < 0 or pattern_first < first:
+                    first = pattern_first
+            if limit is not None:
+                # Matches up to keep bytes long that are still open start after
+                # limit - keep; anything before that is given up
+                starts[name] = max(start, limit if resume is None else resume, limit - keep)
+        return first
+
+    def _in_term_order(self, counts):
+        return {t: counts[t] for t in self.terms if counts.get(t)}
+
+    def scan(self, buffer: bytes):
+        """ Return ({term: occurrences} in term order, offset of the earliest match or -1) """
+        if not self.terms:
+            return {}, -1
+        found, first = self._literals_present(buffer)
+        counts = {self._names[t]: buffer.count(t) for t in found if t in self._names}
+        if self._patterns:
+            pattern_first = self._scan_patterns(buffer, found, counts)
+            if pattern_first >= 0 and (first < 0 or pattern_first < first):
+                first = pattern_first
+        return self._in_term_order(counts), first
+
+    def scan_file(self, f, window_size: int = WINDOW_SIZE):
+        """ Like scan(f.read().lower()) for a binary file, reading window_size bytes at a time.
+
+        Pattern terms are matched line by line here, so a pattern that spans a
+        newline is only found in files small enough to be read whole. A line
+        longer than four windows is matched in pieces, where only matches up
+        to window_size bytes long are found exactly.
+        """
+        if not self.terms:
+            return {}, -1
+        compiled = self._bytes
+        literals = compiled.terms if compiled else []
+        counts = dict.fromkeys(literals, 0)
+        # Stream offset where each term's next non-overlapping match may start
+        resume = dict.fromkeys(literals, 0)
+        keep = max((len(t) for t in literals), default=1) - 1
+        pattern_counts = {}
+        first = pattern_first = -1
+        tail = pending = b''
+        # Offset in pending where each pattern's next match may start, after a long line was cut
+        starts = {}
+        offset = 0
+        while True:
+            chunk = f.read(window_size)
+            lowered = chunk.lower()
+            if self._patterns:
+                # Patterns see whole lines: everything up to the last newline read so far
+                data = pending + lowered
+                data_start = offset - len(pending)
+                cut = data.rfind(b'\n') + 1 if chunk else len(data)
+                segment_first = -1
+                if cut:
+                    segment = data[:cut]
+                    segment_first = self._scan_patterns(segment, {lit for _, lit in self._patterns.values()
+                                                                  if lit in segment}, pattern_counts, starts)
+                    starts = {}
+                    pending = data[cut:]
+                elif len(data) > 4 * window_size:
+                    # A line this long is cut short, keeping the matches that may
+                    # still run on into the next read and a window before them
+                    segment_first = self._scan_patterns(data, {lit for _, lit in self._patterns.values()
+                                                               if lit in data}, pattern_counts, starts, window_size)
+                    cut = max(0, min(starts.values()) - window_size)
+                    starts = {name: start - cut for name, start in starts.items()}
+                    pending = data[cut:]
+                else:
+                    pending = data
+                # A match held back at a cut can start before one counted with it
+                if segment_first >= 0 and (pattern_first < 0 or data_start + segment_first < pattern_first):
+                    pattern_first = data_start + segment_first
+            if not chunk:
+                break
+            if not compiled:
+                offset += len(chunk)
+                continue
+            # Carry the last keep bytes over so matches across the boundary are seen
+            window = tail + lowered
+            window_start = offset - len(tail)
+            offset += len(chunk)
+            found, window_first = compiled.present(window)
+            if first < 0 and window_first >= 0:
+                first = window_start + window_first
+            for term in found:
+                start = max(0, resume[term] - window_start)
+                if term in compiled.overlapping:
+                    n, end = 0, -1
+                    pos = window.find(term, start)
+                    while pos >= 0:
+                        n, end = n + 1, pos + len(term)
+                        pos = window.find(term, end)
+                else:
+                    n = window.count(term, start)
+                    end = window.rfind(term, start) + len(term) if n else -1
+                if n:
+                    counts[term] += n
+                    resume[term] = window_start + end
+            tail = window[max(0, len(window) - keep):] if keep else b''
+        pattern_counts.update((self._names[t], n) for t, n in counts.items() if n and t in self._names)
+        if pattern_first >= 0 and (first < 0 or pattern_first < first):
+            first = pattern_first
+        return self._in_term_order(pattern_counts), first
+
+    def index_terms(self) -> List[bytes]:
+        """ Return the lowercased byte strings an index lookup has to cover """
+        terms = list(self._bytes.terms) if self._bytes else []
+        if any(not literal for _, literal in self._patterns.values()):
+            # A pattern without a required literal can match anywhere
+            terms.append(b'')
+        return terms
+
+    def counts(self, buffer) -> Dict[str, int]:
+        """ Return {term: occurrences} for every term found in buffer, in term order.
+
+        Occurrences are counted exactly like buffer.count(term) on the same
+        (already lowercased) buffer.
+        """
+        return self.scan(buffer)[0]
+
+
+class MatchResult(NamedTuple):
+    """ Everything the scanner reports about one matching file """
+    occurrences: int
+    term_counts: Dict[str, int]
+    matched_terms: List[str]
+    matched_line: str
+    line_number: int
+
+
+def _display_line(line: str) -> str:
+    line = line.strip()
+    if len(line) > MATCHED_LINE_LENGTH:
+        line = line[:MATCHED_LINE_LENGTH] + '...'
+    return line
+
+
+def _line_at(f, offset: int, window_size: int = WINDOW_SIZE):
+    """ Return (display text, line number) of the line containing offset, reading f in windows """
+    line_number = 1
+    f.seek(0)
+    pos = 0
+    while pos < offset:
+        chunk = f.read(min(window_size, offset - pos))
+        if not chunk:
+            break
+        line_number += chunk.count(b'\n')
+        pos += len(chunk)
+
+    # Step back to the start of the line
+    line_start = 0
+    pos = offset
+    while pos > 0:
+        low = max(0, pos - window_size)
+        f.seek(low)
+        newline = f.read(pos - low).rfind(b'\n')
+        if newline >= 0:
+            line_start = low + newline + 1
+            break
+        pos = low
+
+    # Decode forward only until the displayed text is settled
+    f.seek(line_start)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    text = ''
+    while True:
+        chunk = f.read(window_size)
+        newline = chunk.find(b'\n')
+        last = not chunk or newline >= 0
+        if newline >= 0:
+            chunk = chunk[:newline]
+        text = (text + decoder.decode(chunk, final=last)).lstrip()
+        if last or len(text.rstrip()) > MATCHED_LINE_LENGTH:
+            break
+        # Trailing whitespace past the display length cannot change the result
+        text = text[:MATCHED_LINE_LENGTH + 1]
+    return _display_line(text), line_number
+
+
+def match_buffer(raw: bytes, matcher: TermMatcher) -> Optional[MatchResult]:
+    """ Return the MatchResult for a whole file already in memory, or None if no term matches """
+    # bytes.lower() only folds ASCII, so offsets in content line up with raw
+    term_counts, first = matcher.scan(raw.lower())
+    if not term_counts:
+        return None
+    line_start = raw.rfind(b'\n', 0, first) + 1
+    line_end = raw.find(b'\n', first)
+    if line_end < 0:
+        line_end = len(raw)
+    return MatchResult(
+        occurrences=sum(term_counts.values()),
+        term_counts=term_counts,
+        matched_terms=list(term_counts),
+        matched_line=_display_line(raw[line_start:line_end].decode('utf-8', errors='ignore')),
+        line_number=raw.count(b'\n', 0, first) + 1,
+    )
+
+
+def match_file(f, matcher: TermMatcher) -> Optional[MatchResult]:
+    """ Return the MatchResult for the binary file f, read whole or, from large_file_threshold up, in windows """
+    if not matcher.large_file_threshold or os.fstat(f.fileno()).st_size < matcher.large_file_threshold:
+        return match_buffer(f.read(), matcher)
+    term_counts, first = matcher.scan_file(f)
+    if not term_counts:
+        return None
+    matched_line, line_number = _line_at(f, first)
+    return MatchResult(
+        occurrences=sum(term_counts.values()),
+        term_counts=term_counts,
+        matched_terms=list(term_counts),
+        matched_line=matched_line,
+        line_number=line_number,
+    )
+
+
+def extract_matches(file_path: str, matcher: TermMatcher) -> Optional[MatchResult]:
+    """ Read file_path once and return its MatchResult, or None if no term matches """
+    with open(file_path, 'rb') as f:
+        return match_file(f, matcher)
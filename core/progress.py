@@ -0,0 +1,77 @@
+"""
+Rate-limited progress reporting for the scanner.
+
+Scan threads record status messages, found files, progress and file counts
+into a ProgressThrottle as fast as they like; the scan thread takes a
+ProgressBatch out of it at most every PROGRESS_INTERVAL seconds and emits
+that as one set of signals. The GUI therefore sees a fixed 10 Hz trickle
+of events however many files per second the scan gets through.
+"""
+
+import collections
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+# Seconds between batches handed to the GUI
+PROGRESS_INTERVAL = 0.1
+# Messages kept per batch; older ones would scroll out of the log anyway
+MAX_BATCH_MESSAGES = 1000
+
+
+class ProgressBatch(NamedTuple):
+    """ Everything that happened since the previous batch """
+    messages: List[str]
+    dropped: int  # messages discarded because the batch was full
+    found: List[tuple]  # result records, as added to the scan's results
+    progress: Optional[int]  # None if unchanged
+    counts: Optional[Tuple[int, int]]  # (xml_count, dll_count), None if unchanged
+
+
+class ProgressThrottle:
+    """ Thread-safe accumulator for progress events, drained in rate-limited batches """
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL, max_messages: int = MAX_BATCH_MESSAGES):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.messages = collections.deque(maxlen=max_messages)
+        self.dropped = 0
+        self.found = []
+        self.progress = None
+        self.counts = None
+        self.last_take = 0.0
+
+    def message(self, text: str):
+        with self.lock:
+            if len(self.messages) == self.messages.maxlen:
+                self.dropped += 1
+            self.messages.append(text)
+
+    def file_found(self, result: tuple):
+        with self.lock:
+            self.found.append(result)
+
+    def set_progress(self, value: int):
+        with self.lock:
+            self.progress = value
+
+    def set_counts(self, xml_count: int, dll_count: int):
+        with self.lock:
+            self.counts = (xml_count, dll_count)
+
+    def take(self, force: bool = False) -> Optional[ProgressBatch]:
+        """ Return the pending batch if the interval has passed (or force is set) and anything happened """
+        now = time.monotonic()
+        if not force and now - self.last_take < self.interval:
+            return None
+        with self.lock:
+            if not (self.messages or self.found or self.progress is not None or self.counts):
+                return None
+            batch = ProgressBatch(list(self.messages), self.dropped, self.found, self.progress, self.counts)
+            self.messages.clear()
+            self.dropped = 0
+            self.found = []
+            self.progress = None
+            self.counts = None
+        self.last_take = now
+        return batch
@@ -0,0 +1,250 @@
+"""
+Search backends for the scanner.
+
+SearchPool fans files out to an inline, thread or process executor in
+size-balanced batches and streams (path, MatchResult, error) tuples back as
+batches finish. Packed cache entries (core/decomp_pack.py) are searched in
+batches of neighbouring blobs, so each worker reads its part of the pack
+sequentially. Each batch also reports the wall and CPU time it took and the
+bytes it read, which go into the scan's ScanStats when one is given. The
+process backend sidesteps the GIL for the CPU-bound lower()/match work; this
+module must stay free of Qt imports so it loads quickly in spawned worker
+processes.
+"""
+
+import os
+import tempfile
+import time
+import concurrent.futures
+import multiprocessing
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from core.matcher import MatchResult, TermMatcher, extract_matches, match_buffer, match_file
+from core.decomp_pack import DecompPack, PackMember, copy_member, read_members
+from libs.util import get_cpu_count
+
+BACKENDS = ('inline', 'thread', 'process')
+DEFAULT_BACKEND = 'process'
+
+# Batches are cut around this many bytes so a worker round trip is worth it,
+# but never grow past MAX_BATCH_FILES so results keep streaming back.
+MIN_BATCH_BYTES = 256 * 1024
+MAX_BATCH_FILES = 64
+
+# Matcher installed once per worker process by the pool initializer
+_worker_matcher = None
+
+
+def _init_worker(matcher: TermMatcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+class SearchBatch(NamedTuple):
+    """ What a submitted batch resolves to """
+    results: List[Tuple[str, Optional[MatchResult], Optional[str]]]  # (path, match, error) per file
+    wall: float  # seconds the worker spent on the batch
+    cpu: float
+    bytes_read: int
+
+
+def _search_batch(paths: List[str], matcher: Optional[TermMatcher] = None) -> SearchBatch:
+    """ Search one batch of files; errors are returned rather than raised """
+    matcher = matcher or _worker_matcher
+    wall, cpu = time.perf_counter(), time.thread_time()
+    results = []
+    bytes_read = 0
+    for path in paths:
+        try:
+            results.append((path, extract_matches(path, matcher), None))
+            bytes_read += os.path.getsize(path)
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return SearchBatch(results, time.perf_counter() - wall, time.thread_time() - cpu, bytes_read)
+
+
+def _match_large_member(pack: str, member: PackMember, matcher: TermMatcher) -> Optional[MatchResult]:
+    """ Search a pack member too large to hold in memory by decompressing it to a temporary file """
+    with open(pack, 'rb') as f, tempfile.TemporaryFile() as temp:
+        copy_member(f, member, temp)
+        temp.seek(0)
+        return match_file(temp, matcher)
+
+
+def _search_pack_batch(pack: str, members: List[PackMember], matcher: Optional[TermMatcher] = None) -> SearchBatch:
+    """ Search neighbouring files of one pack, reading their blobs in offset order """
+    matcher = matcher or _worker_matcher
+    wall, cpu = time.perf_counter(), time.thread_time()
+    threshold = matcher.large_file_threshold
+    large = [member for member in members if threshold and member.size >= threshold]
+    small = [member for member in members if not (threshold and member.size >= threshold)]
+    results = []
+    bytes_read = 0
+    try:
+        for member, data in read_members(pack, small):
+            results.append((member.path, match_buffer(data, matcher), None))
+            bytes_read += member.length
+        # Scanned in windows like large files on disk
+        for member in large:
+            results.append((member.path, _match_large_member(pack, member, matcher), None))
+            bytes_read += member.length
+    except Exception as e:
+        # The rest of the batch could not be read
+        done = {path for path, _, _ in results}
+        results.extend((member.path, None, str(e)) for member in members if member.path not in done)
+    return SearchBatch(results, time.perf_counter() - wall, time.thread_time() - cpu, bytes_read)
+
+
+class _InlineExecutor(concurrent.futures.Executor):
+    """ Executor that runs work immediately in the calling thread """
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def _batch_target(total: int, workers: int) -> int:
+    # A few batches per worker keeps every core busy until the end of the run
+    return max(MIN_BATCH_BYTES, total // max(1, workers * 4))
+
+
+def make_batches(files: Iterable[Tuple[str, int]], workers: int) -> List[List[str]]:
+    """ Group (path, size) pairs into batches of roughly equal byte size, largest files first """
+    files = sorted(files, key=lambda item: item[1], reverse=True)
+    target = _batch_target(sum(size for _, size in files), workers)
+    batches = []
+    batch, batch_bytes = [], 0
+    for path, size in files:
+        batch.append(path)
+        batch_bytes += size
+        if batch_bytes >= target or len(batch) >= MAX_BATCH_FILES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def make_pack_batches(members: List[PackMember], workers: int) -> List[List[PackMember]]:
+    """ Cut members, sorted by offset, into runs of neighbouring files of roughly equal size """
+    target = _batch_target(sum(m.size for m in members), workers)
+    batches = []
+    batch, batch_bytes = [], 0
+    for member in members:
+        batch.append(member)
+        batch_bytes += member.size
+        if batch_bytes >= target or len(batch) >= MAX_BATCH_FILES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class BatchBuffer:
+    """ Collects files as they are discovered and cuts them into bounded batches """
+
+    def __init__(self):
+        self.paths = []
+        self.size = 0
+
+    def add(self, path: str, size: int) -> Optional[List[str]]:
+        """ Add a file; return a full batch when one is ready """
+        self.paths.append(path)
+        self.size += size
+        if self.size >= MIN_BATCH_BYTES or len(self.paths) >= MAX_BATCH_FILES:
+            return self.take()
+        return None
+
+    def take(self) -> List[str]:
+        batch, self.paths, self.size = self.paths, [], 0
+        return batch
+
+
+def _with_sizes(paths: Iterable[str]):
+    for path in paths:
+        try:
+            yield path, os.path.getsize(path)
+        except OSError:
+            yield path, 0
+
+
+class SearchPool:
+    """ Runs extract_matches over files on the configured backend.
+
+    With stats set, the time and bytes of every completed batch are added
+    to its 'search' stage and bytes_searched counter.
+    """
+
+    def __init__(self, matcher: TermMatcher, backend: str = DEFAULT_BACKEND, max_workers: Optional[int] = None,
+                 stats=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown search backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.matcher = matcher
+        self.stats = stats
+        self.backend = backend
+        self.max_workers = max(1, max_workers or get_cpu_count())
+        if backend == 'process':
+            # Always spawn: forking while decompiler threads are starting
+            # subprocesses can leak their pipes into the workers and hang them
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(matcher,))
+        elif backend == 'thread':
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        else:
+            self.executor = _InlineExecutor()
+
+    def submit(self, batch: List[str], pack: str = None) -> concurrent.futures.Future:
+        """ Submit one batch of paths, or of PackMembers of pack; the future resolves to a SearchBatch """
+        fn, args = (_search_batch, (batch,)) if pack is None else (_search_pack_batch, (pack, batch))
+        if self.backend == 'process':
+            future = self.executor.submit(fn, *args)
+        else:
+            future = self.executor.submit(fn, *args, self.matcher)
+        if self.stats is not None:
+            future.add_done_callback(self._record)
+        return future
+
+    def _record(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        batch = future.result()
+        self.stats.add('search', batch.wall, batch.cpu)
+        self.stats.count('bytes_searched', batch.bytes_read)
+
+    def search_iter(self, files) -> Iterator[Tuple[str, Optional[MatchResult], Optional[str]]]:
+        """ Yield (path, match or None, error or None) for every file as its batch completes.
+
+        files may hold plain paths or (path, size) pairs.
+        """
+        files = [f if isinstance(f, tuple) else (f, None) for f in files]
+        if any(size is None for _, size in files):
+            files = list(_with_sizes(path for path, _ in files))
+        return self._results(self.submit(batch) for batch in make_batches(files, self.max_workers))
+
+    def search_pack_iter(self, pack: DecompPack, paths) -> Iterator[Tuple[str, Optional[MatchResult], Optional[str]]]:
+        """ search_iter for virtual paths inside pack """
+        batches = make_pack_batches(pack.members(paths), self.max_workers)
+        return self._results(self.submit(batch, pack.path) for batch in batches)
+
+    def _results(self, futures):
+        futures = list(futures)
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield from future.result().results
+        finally:
+            # The caller stopped early (e.g. the scan was cancelled): drop batches not yet started
+            for future in futures:
+                future.cancel()
+
+    def search(self, files) -> List[Tuple[str, Optional[MatchResult], Optional[str]]]:
+        """ Blocking form of search_iter """
+        return list(self.search_iter(files))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,118 @@
+"""
+Per-stage timing and counters for one scan.
+
+The engine wraps each pipeline stage (enumerate, hash, cache_lookup,
+prefilter, decompile, index, search, emit) in ScanStats.stage() or adds worker-side
+timings with ScanStats.add(), and bumps named counters as files are
+skipped, reused or searched. report() turns all of it into a JSON-ready
+dict at the end of the scan.
+
+Stage times are summed over every thread and search process that did the
+work, so on a multi-core scan they can add up to more than the scan's wall
+time. CPU time is per thread (time.thread_time), which leaves out the
+decompiler; child_cpu_s in the report covers child processes instead.
+"""
+
+import collections
+import contextlib
+import os
+import threading
+import time
+from typing import List
+
+STAGES = ('enumerate', 'hash', 'cache_lookup', 'prefilter', 'decompile', 'index', 'search', 'emit')
+# DLLs listed in the report's slowest_dlls
+SLOWEST_DLLS = 10
+REPORT_VERSION = 1
+
+
+class ScanStats:
+    """ Thread-safe stage timers and counters for one scan """
+
+    def __init__(self, slowest: int = SLOWEST_DLLS):
+        self.slowest = slowest
+        self.lock = threading.Lock()
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.counters = collections.Counter()
+        # DLL path -> {stage: seconds} for the slowest DLLs list
+        self.dlls = {}
+        self.started = time.perf_counter()
+        self.start_times = os.times()
+
+    def add(self, stage: str, wall: float, cpu: float = 0.0, dll: str = None):
+        """ Add time spent in stage, also charging it to dll if given """
+        with self.lock:
+            self.wall[stage] += wall
+            self.cpu[stage] += cpu
+            if dll:
+                self._charge(dll, stage, wall)
+
+    def add_dll(self, dll: str, stage: str, wall: float):
+        """ Charge time to one DLL only, for work whose stage time is counted elsewhere """
+        with self.lock:
+            self._charge(dll, stage, wall)
+
+    def _charge(self, dll, stage, wall):
+        times = self.dlls.setdefault(dll, {})
+        times[stage] = times.get(stage, 0.0) + wall
+
+    @contextlib.contextmanager
+    def stage(self, stage: str, dll: str = None):
+        """ Time the body of a with block as stage """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - wall, time.thread_time() - cpu, dll)
+
+    def timed(self, stage: str, iterable):
+        """ Iterate over iterable, timing only the time spent producing items """
+        iterator = iter(iterable)
+        while True:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - wall, time.thread_time() - cpu)
+                return
+            self.add(stage, time.perf_counter() - wall, time.thread_time() - cpu)
+            yield item
+
+    def count(self, counter: str, amount: int = 1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def report(self) -> dict:
+        """ Everything measured so far, as a JSON-ready dict """
+        end_times = os.times()
+        with self.lock:
+            slowest = sorted(self.dlls.items(), key=lambda item: sum(item[1].values()), reverse=True)[:self.slowest]
+            return {
+                'version': REPORT_VERSION,
+                'wall_s': round(time.perf_counter() - self.started, 3),
+                'cpu_s': round(sum(end_times[:2]) - sum(self.start_times[:2]), 3),
+                'child_cpu_s': round(sum(end_times[2:4]) - sum(self.start_times[2:4]), 3),
+                'stages': {stage: {'wall_s': round(self.wall[stage], 3), 'cpu_s': round(self.cpu[stage], 3)}
+                           for stage in STAGES},
+                'counters': dict(sorted(self.counters.items())),
+                'slowest_dlls': [dict({'path': path, 'total_s': round(sum(times.values()), 3)},
+                                      **{f'{stage}_s': round(seconds, 3) for stage, seconds in times.items()})
+                                 for path, times in slowest],
+            }
+
+
+def format_report(report: dict) -> List[str]:
+    """ Human-readable lines for a report() dict """
+    lines = [f"Scan took {report['wall_s']:.2f} s (CPU {report['cpu_s']:.2f} s, child processes {report['child_cpu_s']:.2f} s)",
+             f"{'Stage':<14}{'Wall s':>10}{'CPU s':>10}"]
+    for stage, times in report['stages'].items():
+        lines.append(f"{stage:<14}{times['wall_s']:>10.2f}{times['cpu_s']:>10.2f}")
+    if report['counters']:
+        lines.append(", ".join(f"{name}: {value}" for name, value in report['counters'].items()))
+    if report['slowest_dlls']:
+        lines.append("Slowest DLLs:")
+        for dll in report['slowest_dlls']:
+            breakdown = ", ".join(f"{key[:-2]} {value:.2f}" for key, value in dll.items() if key not in ('path', 'total_s'))
+            lines.append(f"  {dll['total_s']:.2f} s  {dll['path']}  ({breakdown})")
+    return lines
@@ -0,0 +1,301 @@
+"""
+Per-type vocabulary of an assembly, for targeted decompilation.
+
+ILSpy writes each top-level type, nested types included, to one source
+file, and every name or literal in that file comes from metadata the type
+uses: its own name, members, parameters, generic parameters, attributes
+(pseudo-custom ones such as [DllImport] included) and constants, the types in their signatures, and whatever its method
+bodies reference (called methods and their types, fields, types, string
+literals, caught exceptions, local variable types). type_vocabularies()
+collects that for every top-level type, so DllPrefilter can pick the
+types worth decompiling for a search, and separately for the assembly's
+own attributes, which ILSpy writes to AssemblyInfo.cs.
+
+Compiler-generated top-level types ('<Module>', '<PrivateImplementationDetails>',
+anonymous types) never get a file of their own; what they contain is
+added to the types that use them.
+"""
+
+from typing import List, NamedTuple, Set, Tuple
+
+from core.clr_metadata import (
+    CONSTANT, CUSTOM_ATTRIBUTE, DECL_SECURITY, EVENT, EVENT_MAP, EVENT_PTR, FIELD, FIELD_PTR, GENERIC_PARAM,
+    GENERIC_PARAM_CONSTRAINT, IMPL_MAP, INTERFACE_IMPL, MEMBER_REF, METHOD_DEF, METHOD_IMPL, METHOD_PTR, METHOD_SPEC,
+    MODULE_REF, NESTED_CLASS, PARAM, PARAM_PTR, PROPERTY, PROPERTY_MAP, PROPERTY_PTR, PSEUDO_ATTRIBUTE_NAMES,
+    STANDALONE_SIG, TYPE_DEF, TYPE_REF, TYPE_SPEC, USER_STRING, Metadata, il_tokens, signature_types,
+)
+
+_EXPORTED_TYPE = 0x27
+
+
+class TypeVocabulary(NamedTuple):
+    """ What one top-level type's decompiled source can be made of """
+    name: str  # full name, as the decompiler's type option takes it ('' for the assembly's attributes)
+    names: Set[str]  # identifiers and full names of everything it declares or uses
+    literals: Set[str]  # string literals and string constants
+    blobs: List[bytes]  # raw attribute arguments and security declarations
+    type_names: Set[str]  # simple names of the types it uses
+
+
+def _vocabulary(name: str = '') -> TypeVocabulary:
+    return TypeVocabulary(name, set(), set(), [], set())
+
+
+def _merge(into: TypeVocabulary, other: TypeVocabulary):
+    into.names.update(other.names)
+    into.literals.update(other.literals)
+    into.blobs.extend(other.blobs)
+    into.type_names.update(other.type_names)
+
+
+def _owners(starts: List[int], count: int) -> List[int]:
+    """ Owner (1-based) of rows 1..count of a table whose rows are listed in runs, given each owner's first row """
+    owners = [0] * (count + 1)
+    for owner, start in enumerate(starts, 1):
+        end = starts[owner] if owner < len(starts) else count + 1
+        for row in range(start, min(end, count + 1)):
+            owners[row] = owner
+    return owners
+
+
+class _Builder:
+    """ Walks an assembly's tables once, filing everything under the top-level type it belongs to """
+
+    def __init__(self, metadata: Metadata):
+        self.md = metadata
+        self.type_defs = metadata.rows(TYPE_DEF)
+        type_count = len(self.type_defs)
+        self.field_owner = _owners([row[4] for row in self.type_defs], len(metadata.rows(FIELD)))
+        self.method_owner = _owners([row[5] for row in self.type_defs], len(metadata.rows(METHOD_DEF)))
+        self.param_owner = _owners([row[5] for row in metadata.rows(METHOD_DEF)], len(metadata.rows(PARAM)))
+        self.property_owner = [0] * (len(metadata.rows(PROPERTY)) + 1)
+        for (parent, start), end in self._runs(metadata.rows(PROPERTY_MAP), len(metadata.rows(PROPERTY))):
+            for row in range(start, end):
+                self.property_owner[row] = parent
+        self.event_owner = [0] * (len(metadata.rows(EVENT)) + 1)
+        for (parent, start), end in self._runs(metadata.rows(EVENT_MAP), len(metadata.rows(EVENT))):
+            for row in range(start, end):
+                self.event_owner[row] = parent
+        self.enclosing = {nested: outer for nested, outer in metadata.rows(NESTED_CLASS)}
+        # Top-level type of every type, following enclosing types
+        self.top = [0] * (type_count + 1)
+        for row in range(1, type_count + 1):
+            top, seen = row, set()
+            while top in self.enclosing and top not in seen:
+                seen.add(top)
+                top = self.enclosing[top]
+            self.top[row] = top
+        self.generated = {row for row in range(1, type_count + 1)
+                          if self.top[row] == row and metadata.string(self.type_defs[row - 1][1]).startswith('<')}
+        self.vocabularies = {row: _vocabulary(metadata.type_def_name(row))
+                             for row in range(1, type_count + 1) if self.top[row] == row}
+        self.assembly = _vocabulary()
+        self.resolved = {}
+
+    @staticmethod
+    def _runs(rows, count):
+        """ ((owner, first row), end) for map tables such as PropertyMap, whose runs end where the next begins """
+        ordered = sorted(rows, key=lambda row: row[1])
+        for i, row in enumerate(ordered):
+            end = ordered[i + 1][1] if i + 1 < len(ordered) else count + 1
+            yield row, min(end, count + 1)
+
+    def owner_vocabulary(self, type_row: int) -> TypeVocabulary:
+        return self.vocabularies[self.top[type_row]]
+
+    def type_token(self, table: int, row: int) -> TypeVocabulary:
+        """ Vocabulary a reference to a TypeDef, TypeRef or TypeSpec row brings into a file """
+        key = (table, row)
+        found = self.resolved.get(key)
+        if found is not None:
+            return found
+        found = self.resolved[key] = _vocabulary()
+        md = self.md
+        if table == TYPE_REF and 0 < row <= len(md.rows(TYPE_REF)):
+            found.names.add(md.type_ref_name(row))
+            found.type_names.add(md.string(md.rows(TYPE_REF)[row - 1][1]))
+        elif table == TYPE_DEF and 0 < row <= len(self.type_defs):
+            # Nested types are written with their enclosing types' names
+            current, seen = row, set()
+            while current and current not in seen:
+                seen.add(current)
+                found.names.add(md.type_def_name(current))
+                found.type_names.add(md.string(self.type_defs[current - 1][1]))
+                current = self.enclosing.get(current)
+        elif table == TYPE_SPEC and 0 < row <= len(md.rows(TYPE_SPEC)):
+            for coded in signature_types(md.blob(md.rows(TYPE_SPEC)[row - 1][0]), type_spec=True):
+                _merge(found, self.type_token(*md.decode_coded('TypeDefOrRef', coded)))
+        return found
+
+    def signature(self, blob_index: int, into: TypeVocabulary):
+        for coded in signature_types(self.md.blob(blob_index)):
+            _merge(into, self.type_token(*self.md.decode_coded('TypeDefOrRef', coded)))
+
+    def token(self, token: int, into: TypeVocabulary):
+        """ Add what an IL or attribute reference to token brings into a file """
+        table, row = token >> 24, token & 0xFFFFFF
+        if table == USER_STRING:
+            into.literals.add(self.md.user_string(row))
+            return
+        if table in (TYPE_DEF, TYPE_REF, TYPE_SPEC):
+            _merge(into, self.type_token(table, row))
+            return
+        key = (table, row)
+        found = self.resolved.get(key)
+        if found is None:
+            found = self.resolved[key] = _vocabulary()
+            self.member(table, row, found)
+        _merge(into, found)
+
+    def member(self, table: int, row: int, found: TypeVocabulary):
+        """ Vocabulary of a referenced method, field, method instantiation or standalone signature """
+        md = self.md
+        if table == MEMBER_REF and 0 < row <= len(md.rows(MEMBER_REF)):
+            parent, name, signature = md.rows(MEMBER_REF)[row - 1]
+            found.names.add(md.string(name))
+            parent_table, parent_row = md.decode_coded('MemberRefParent', parent)
+            if parent_table in (TYPE_DEF, TYPE_REF, TYPE_SPEC):
+                _merge(found, self.type_token(parent_table, parent_row))
+            elif parent_table == METHOD_DEF:
+                self.member(METHOD_DEF, parent_row, found)
+            elif parent_table == MODULE_REF and 0 < parent_row <= len(md.rows(MODULE_REF)):
+                found.names.add(md.string(md.rows(MODULE_REF)[parent_row - 1][0]))
+            self.signature(signature, found)
+        elif table == METHOD_DEF and 0 < row < len(self.method_owner):
+            _, _, _, name, signature, _ = md.rows(METHOD_DEF)[row - 1]
+            found.names.add(md.string(name))
+            _merge(found, self.type_token(TYPE_DEF, self.method_owner[row]))
+            self.signature(signature, found)
+            # Anonymous type properties are written with their constructor's parameter names
+            methods, params = md.rows(METHOD_DEF), md.rows(PARAM)
+            end = methods[row][5] if row < len(methods) else len(params) + 1
+            found.names.update(md.string(params[param - 1][2]) for param in range(methods[row - 1][5], min(end, len(params) + 1)))
+        elif table == FIELD and 0 < row < len(self.field_owner):
+            _, name, signature = md.rows(FIELD)[row - 1]
+            found.names.add(md.string(name))
+            _merge(found, self.type_token(TYPE_DEF, self.field_owner[row]))
+            self.signature(signature, found)
+        elif table == METHOD_SPEC and 0 < row <= len(md.rows(METHOD_SPEC)):
+            method, instantiation = md.rows(METHOD_SPEC)[row - 1]
+            method_table, method_row = md.decode_coded('MethodDefOrRef', method)
+            self.member(method_table, method_row, found)
+            self.signature(instantiation, found)
+        elif table == STANDALONE_SIG and 0 < row <= len(md.rows(STANDALONE_SIG)):
+            self.signature(md.rows(STANDALONE_SIG)[row - 1][0], found)
+
+    def has_owner(self, table: int, row: int) -> int:
+        """ The TypeDef row that declares a metadata row of table, or 0 """
+        if table == TYPE_DEF:
+            return row
+        if table == METHOD_DEF and 0 < row < len(self.method_owner):
+            return self.method_owner[row]
+        if table == FIELD and 0 < row < len(self.field_owner):
+            return self.field_owner[row]
+        if table == PARAM and 0 < row < len(self.param_owner):
+            return self.has_owner(METHOD_DEF, self.param_owner[row])
+        if table == PROPERTY and 0 < row < len(self.property_owner):
+            return self.property_owner[row]
+        if table == EVENT and 0 < row < len(self.event_owner):
+            return self.event_owner[row]
+        if table == INTERFACE_IMPL and 0 < row <= len(self.md.rows(INTERFACE_IMPL)):
+            return self.md.rows(INTERFACE_IMPL)[row - 1][0]
+        if table == GENERIC_PARAM and 0 < row <= len(self.md.rows(GENERIC_PARAM)):
+            owner_table, owner_row = self.md.decode_coded('TypeOrMethodDef', self.md.rows(GENERIC_PARAM)[row - 1][2])
+            return self.has_owner(owner_table, owner_row)
+        return 0
+
+    def vocabulary_of(self, table: int, row: int) -> TypeVocabulary:
+        """ Vocabulary of the top-level type a metadata row belongs to; the assembly's own for others """
+        owner = self.has_owner(table, row)
+        if 0 < owner < len(self.top):
+            return self.owner_vocabulary(owner)
+        return self.assembly
+
+    def build(self) -> Tuple[List[TypeVocabulary], TypeVocabulary]:
+        md = self.md
+        for row, (_, name, namespace, extends, _, _) in enumerate(self.type_defs, 1):
+            vocabulary = self.owner_vocabulary(row)
+            vocabulary.names.update((md.string(name), md.string(namespace)))
+            if extends:
+                _merge(vocabulary, self.type_token(*md.decode_coded('TypeDefOrRef', extends)))
+        for owner, interface in md.rows(INTERFACE_IMPL):
+            _merge(self.owner_vocabulary(owner), self.type_token(*md.decode_coded('TypeDefOrRef', interface)))
+        for row, (_, _, owner, name) in enumerate(md.rows(GENERIC_PARAM), 1):
+            self.vocabulary_of(GENERIC_PARAM, row).names.add(md.string(name))
+        for owner, constraint in md.rows(GENERIC_PARAM_CONSTRAINT):
+            _merge(self.vocabulary_of(GENERIC_PARAM, owner),
+                   self.type_token(*md.decode_coded('TypeDefOrRef', constraint)))
+        for row, (_, name, signature) in enumerate(md.rows(FIELD), 1):
+            vocabulary = self.vocabulary_of(FIELD, row)
+            vocabulary.names.add(md.string(name))
+            self.signature(signature, vocabulary)
+        for row, (_, name, _) in enumerate(md.rows(PARAM), 1):
+            self.vocabulary_of(PARAM, row).names.add(md.string(name))
+        for row, (_, name, signature) in enumerate(md.rows(PROPERTY), 1):
+            vocabulary = self.vocabulary_of(PROPERTY, row)
+            vocabulary.names.add(md.string(name))
+            self.signature(signature, vocabulary)
+        for row, (_, name, event_type) in enumerate(md.rows(EVENT), 1):
+            vocabulary = self.vocabulary_of(EVENT, row)
+            vocabulary.names.add(md.string(name))
+            if event_type:
+                _merge(vocabulary, self.type_token(*md.decode_coded('TypeDefOrRef', event_type)))
+        for row, (rva, _, _, name, signature, _) in enumerate(md.rows(METHOD_DEF), 1):
+            vocabulary = self.vocabulary_of(METHOD_DEF, row)
+            vocabulary.names.add(md.string(name))
+            self.signature(signature, vocabulary)
+            if not rva:
+                continue
+            body = md.method_body(rva)
+            tokens = il_tokens(body.code) + body.catch_tokens
+            if body.locals_token:
+                tokens.append(body.locals_token)
+            for token in tokens:
+                self.token(token, vocabulary)
+        for owner, _, declaration in md.rows(METHOD_IMPL):
+            if 0 < owner < len(self.top):
+                table, row = md.decode_coded('MethodDefOrRef', declaration)
+                self.token(table << 24 | row, self.owner_vocabulary(owner))
+        for _, member, import_name, scope in md.rows(IMPL_MAP):
+            vocabulary = self.vocabulary_of(*md.decode_coded('MemberForwarded', member))
+            vocabulary.names.add(md.string(import_name))
+            if 0 < scope <= len(md.rows(MODULE_REF)):
+                vocabulary.names.add(md.string(md.rows(MODULE_REF)[scope - 1][0]))
+        for type_and_padding, parent, value in md.rows(CONSTANT):
+            if type_and_padding & 0xFF == 0x0E:
+                self.vocabulary_of(*md.decode_coded('HasConstant', parent)).literals.add(
+                    md.blob(value).decode('utf-16-le', 'replace'))
+        for parent, constructor, value in md.rows(CUSTOM_ATTRIBUTE):
+            vocabulary = self.vocabulary_of(*md.decode_coded('HasCustomAttribute', parent))
+            table, row = md.decode_coded('CustomAttributeType', constructor)
+            if table is not None:
+                self.token(table << 24 | row, vocabulary)
+            vocabulary.blobs.append(md.blob(value))
+        for table, row, attribute in md.pseudo_attributes():
+            self.vocabulary_of(table, row).names.update(PSEUDO_ATTRIBUTE_NAMES[attribute])
+        for _, parent, permissions in md.rows(DECL_SECURITY):
+            self.vocabulary_of(*md.decode_coded('HasDeclSecurity', parent)).blobs.append(md.blob(permissions))
+        # Forwarded types are listed in AssemblyInfo.cs
+        for row in md.rows(_EXPORTED_TYPE):
+            self.assembly.names.update((md.string(row[2]), md.string(row[3])))
+        # Every reference to a type adds its name, so the generated types a type uses are named in it
+        generated = {self.vocabularies[row].name: self.vocabularies[row] for row in self.generated}
+        types = [vocabulary for row, vocabulary in sorted(self.vocabularies.items()) if row not in self.generated]
+        for vocabulary in types + [self.assembly]:
+            for name in vocabulary.names & generated.keys():
+                _merge(vocabulary, generated[name])
+        return types, self.assembly
+
+
+def type_vocabularies(metadata: Metadata) -> Tuple[List[TypeVocabulary], TypeVocabulary]:
+    """ (vocabulary of every top-level type that gets its own file, vocabulary of the assembly's attributes).
+
+    Raises ValueError if the metadata cannot be split by type: indirection
+    tables, or a method body or signature that cannot be decoded.
+    """
+    if any(metadata.row_counts.get(table) for table in (FIELD_PTR, METHOD_PTR, PARAM_PTR, EVENT_PTR, PROPERTY_PTR)):
+        raise ValueError("Metadata uses indirection tables")
+    try:
+        return _Builder(metadata).build()
+    except (IndexError, KeyError) as e:
+        raise ValueError(f"Damaged metadata ({e})")
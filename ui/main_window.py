@@ -71,6 +71,10 @@ class XMLScannerMainWindow(QMainWindow):
         
         # Connect total files signal to track scan progress
         scan_worker.total_files_found.connect(self.on_total_files_found)
+        # Matches go to the results windows as they are found
+        self.results_manager.begin_scan(search_string)
+        scan_worker.files_found_batch.connect(self.results_manager.add_results)
+        scan_worker.scan_report.connect(self.results_manager.set_scan_report)
         
         # Show progress window and start scan
         self.progress_window.show()
@@ -83,6 +87,7 @@ class XMLScannerMainWindow(QMainWindow):
         
     def on_scan_cancelled(self):
         """Handle scan cancellation"""
+        self.results_manager.finish_scan([], [])
         # Don't automatically hide progress window - let user close it manually  
         # if self.progress_window:
         #     self.progress_window.hide()
@@ -97,7 +102,7 @@ class XMLScannerMainWindow(QMainWindow):
             # and (dll_path, decomp_file, occ, matched_terms, matched_line) for DLL
             xml_results = [r for r in results if len(r) == 5 and r[0] == r[1]]
             dll_results = [r for r in results if len(r) == 5 and r[0] != r[1]]
-            self.results_manager.show_results(xml_results, dll_results, self.current_search_string)
+            self.results_manager.finish_scan(xml_results, dll_results)
         else:
             self.show_no_results_dialog()
     def show_no_results_dialog(self):
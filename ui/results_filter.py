@@ -0,0 +1,129 @@
+"""
+Query filter over scan result records
+
+A query is a list of whitespace-separated clauses that must all match:
+
+    process.start            text anywhere in path, matched terms or matched line
+    term:Process.Start       a matched term contains the text
+    dir:294100               the directory contains the text
+    name:Foo.cs              the file name contains the text (also file:)
+    path:Plugins/            the full path contains the text
+    line:"new Process"       the matched line contains the text
+    occ>5                    occurrence count compared with >, >=, <, <=, = or !=
+
+Matching is case-insensitive and treats \\ and / alike. SearchColumns keeps
+the lowercase text of each field for every record, built the first time a
+query uses that field, so re-filtering is one substring test per record
+for the first clause and fewer for each clause after it.
+"""
+
+import operator
+import posixpath
+import re
+import shlex
+from typing import List
+
+FIELDS = {
+    'path': 'path',
+    'dir': 'directory',
+    'directory': 'directory',
+    'name': 'name',
+    'file': 'name',
+    'term': 'terms',
+    'terms': 'terms',
+    'line': 'line',
+}
+COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+OCCURRENCE_CLAUSE = re.compile(r'^occ(?:urrences)?(>=|<=|==|!=|>|<|=)(\d+)$')
+
+
+def _paths(record):
+    # DLL records also carry the decompiled file, which is searchable too
+    path, file = record[0], record[1]
+    return [path.replace('\\', '/').lower()] + ([file.replace('\\', '/').lower()] if file != path else [])
+
+
+def _key(field, record):
+    """ Lowercase searchable text of one field of a (path, file, occurrences, matched_terms, matched_line) record """
+    if field == 'occurrences':
+        return record[2]
+    if field == 'path':
+        return "\n".join(_paths(record))
+    if field == 'directory':
+        return posixpath.dirname(_paths(record)[0])
+    if field == 'name':
+        return "\n".join(posixpath.basename(p) for p in _paths(record))
+    if field == 'terms':
+        return "\n".join(record[3]).lower()
+    if field == 'line':
+        return (record[4] or '').lower()
+    return "\n".join(_paths(record) + [t.lower() for t in record[3]] + [(record[4] or '').lower()])
+
+
+class SearchColumns:
+    """ Per-field lowercase keys for a list of records, built on first use and extended as records are added """
+
+    def __init__(self, records: list):
+        self.records = records
+        self.columns = {}
+
+    def column(self, field: str) -> list:
+        column = self.columns.setdefault(field, [])
+        if len(column) < len(self.records):
+            column.extend(_key(field, r) for r in self.records[len(column):])
+        return column
+
+
+def split_query(query: str) -> List[str]:
+    """ Split on whitespace, keeping "quoted text" together; backslashes are literal """
+    lexer = shlex.shlex(query, posix=True)
+    lexer.whitespace_split = True
+    lexer.escape = ''
+    lexer.commenters = ''
+    try:
+        return list(lexer)
+    except ValueError:
+        # Unclosed quote while the user is still typing
+        return split_query(query + '"')
+
+
+class ResultFilter:
+    """ A parsed query, evaluated against SearchColumns """
+
+    def __init__(self, query: str):
+        self.query = query
+        # (field, comparison, value); comparison None means "value is a substring"
+        self.clauses = [self._parse_clause(c) for c in split_query(query)]
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    @staticmethod
+    def _parse_clause(clause: str):
+        occ = OCCURRENCE_CLAUSE.match(clause.lower())
+        if occ:
+            return 'occurrences', COMPARISONS[occ.group(1)], int(occ.group(2))
+        field, sep, text = clause.partition(':')
+        if sep and field.lower() in FIELDS:
+            return FIELDS[field.lower()], None, text.replace('\\', '/').lower()
+        # Unknown prefixes (e.g. a drive letter) are plain text
+        return 'everything', None, clause.replace('\\', '/').lower()
+
+    def select(self, columns: SearchColumns, start: int = 0) -> List[int]:
+        """ Indexes of the records from start on that match every clause """
+        candidates = range(start, len(columns.records))
+        for field, compare, value in self.clauses:
+            column = columns.column(field)
+            if compare is None:
+                candidates = [i for i in candidates if value in column[i]]
+            else:
+                candidates = [i for i in candidates if compare(column[i], value)]
+        return list(candidates)
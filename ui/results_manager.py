@@ -1,4 +1,5 @@
 from PyQt5.QtWidgets import QWidget
+from ui.results_model import is_dll_result
 
 class ResultsManager:
     def __init__(self, xml_results_window_class, dll_results_window_class):
@@ -6,6 +7,11 @@ class ResultsManager:
         self.dll_results_window = None
         self.xml_results_window_class = xml_results_window_class
         self.dll_results_window_class = dll_results_window_class
+        # Windows receiving the running scan's results, by 'xml' / 'dll'
+        self.live_windows = {}
+        self.search_string = ""
+        # Timing report of the running scan, handed to its windows for export
+        self.scan_report = None
 
     def show_results(self, xml_results, dll_results, search_string):
         if xml_results:
@@ -16,3 +22,49 @@ class ResultsManager:
             self.dll_results_window = self.dll_results_window_class()
             self.dll_results_window.display_results(dll_results, search_string)
             self.dll_results_window.show()
+
+    def begin_scan(self, search_string):
+        """Route the next scan's streamed results to new windows, opened when their first result arrives"""
+        self.live_windows = {}
+        self.search_string = search_string
+        self.scan_report = None
+
+    def set_scan_report(self, report):
+        """Keep the scan's timing report for the windows finish_scan completes"""
+        self.scan_report = report
+
+    def add_results(self, results):
+        """Append a batch of results from the running scan to the XML and DLL windows"""
+        dll_results = [r for r in results if is_dll_result(r)]
+        xml_results = [r for r in results if not is_dll_result(r)]
+        if xml_results:
+            self.live_window('xml').append_results(xml_results)
+        if dll_results:
+            self.live_window('dll').append_results(dll_results)
+
+    def live_window(self, kind):
+        window = self.live_windows.get(kind)
+        if window is None:
+            if kind == 'xml':
+                window = self.xml_results_window = self.xml_results_window_class()
+            else:
+                window = self.dll_results_window = self.dll_results_window_class()
+            window.display_results([], self.search_string, scanning=True)
+            window.show()
+            self.live_windows[kind] = window
+        return window
+
+    def finish_scan(self, xml_results, dll_results):
+        """Mark the live windows complete; results that were not streamed are shown as before"""
+        for kind, results in (('xml', xml_results), ('dll', dll_results)):
+            window = self.live_windows.get(kind)
+            if window is None:
+                if results:
+                    self.live_window(kind).display_results(results, self.search_string)
+            elif len(window.scan_results) != len(results):
+                window.display_results(results, self.search_string)
+            else:
+                window.set_scanning(False)
+        for window in self.live_windows.values():
+            window.scan_report = self.scan_report
+        self.live_windows = {}
@@ -0,0 +1,219 @@
+"""
+Table model over raw scan result records
+"""
+
+import os
+from datetime import datetime
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from core.decomp_pack import split_pack_path
+from libs.util import shorten_path
+from ui.results_filter import ResultFilter, SearchColumns
+
+XML_HEADERS = ["File Path", "Filename", "Directory", "Last Modified", "Occurrences", "Matched Terms", "Matched Line"]
+DLL_HEADERS = ["DLL Path", "Decompiled File", "Directory", "Last Modified", "Occurrences", "Matched Terms", "Matched Line"]
+COL_MODIFIED = 3
+COL_OCCURRENCES = 4
+COL_TERMS = 5
+
+
+def normalize_result(result):
+    """ Return result as (path, file, occurrences, matched_terms, matched_line) """
+    if len(result) == 5:
+        return result
+    if len(result) == 4:
+        # DLL: (dll_path, decomp_file, occurrence_count, matched_terms)
+        return result + ('',)
+    if len(result) == 3:
+        # XML: (filepath, occurrence_count, matched_terms)
+        return (result[0], result[0], result[1], result[2], '')
+    # XML: (filepath, occurrence_count)
+    return (result[0], result[0], result[1], [], '')
+
+
+def is_dll_result(record):
+    """ XML records repeat the file path where DLL records hold the decompiled file """
+    return record[0] != record[1]
+
+
+class ResultsTableModel(QAbstractTableModel):
+    """Read-only model over result records; cell text is built only for rows the view asks for"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+        self.dll_mode = False
+        # Record indexes in current sort order, and the subset that passes the filter
+        self.sorted_rows = []
+        self.rows = []
+        self.sort_column = COL_OCCURRENCES
+        self.sort_order = Qt.DescendingOrder
+        self.filter = ResultFilter('')
+        # Lowercase search keys per field, and per record whether it passes the filter (None: no filter)
+        self.search_columns = SearchColumns(self.records)
+        self.matching = None
+        self.sort_keys = {}
+        self.mtimes = {}
+
+    def set_results(self, results):
+        """Replace all records and re-apply the current sort and filter"""
+        self.beginResetModel()
+        self.records = [normalize_result(r) for r in results]
+        self.dll_mode = any(is_dll_result(r) for r in self.records)
+        self.sort_keys = {}
+        self.mtimes = {}
+        self.search_columns = SearchColumns(self.records)
+        self.matching = self._matching()
+        self.sorted_rows = self._sorted(self.sort_column, self.sort_order)
+        self.rows = self._filtered(self.sorted_rows)
+        self.endResetModel()
+
+    def record(self, row):
+        """The normalized record shown at view row"""
+        return self.records[self.rows[row]]
+
+    # -- Qt model interface --
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(XML_HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return (DLL_HEADERS if self.dll_mode else XML_HEADERS)[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return self.display(self.rows[index.row()], index.column())
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        def resort():
+            self.sort_column, self.sort_order = column, order
+            self.sorted_rows = self._sorted(column, order)
+        self._relayout(resort)
+
+    def _relayout(self, update):
+        """Run update(), which reorders sorted_rows, keeping selections and the current row on their records"""
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_records = [self.rows[i.row()] for i in old_indexes]
+        update()
+        self.rows = self._filtered(self.sorted_rows)
+        if old_indexes:
+            position = {record: row for row, record in enumerate(self.rows)}
+            self.changePersistentIndexList(
+                old_indexes, [self.index(position[r], i.column()) if r in position else QModelIndex()
+                              for r, i in zip(old_records, old_indexes)])
+        self.layoutChanged.emit()
+
+    # -- Streaming --
+    def append_results(self, results):
+        """Add records while a scan is running, merging them into the current sort order and filter"""
+        if not results:
+            return
+        start = len(self.records)
+        new_records = [normalize_result(r) for r in results]
+        mode_changed = not self.dll_mode and any(is_dll_result(r) for r in new_records)
+        if mode_changed:
+            self.dll_mode = True
+            # Path column text (and so its sort keys) differs between the modes
+            self.sort_keys = {c: k for c, k in self.sort_keys.items() if c in (COL_MODIFIED, COL_OCCURRENCES, COL_TERMS)}
+            self.headerDataChanged.emit(Qt.Horizontal, 0, len(DLL_HEADERS) - 1)
+
+        def merge():
+            # records is extended in place; search_columns holds the same list
+            self.records.extend(new_records)
+            if self.matching is not None:
+                self.matching.extend(bytearray(len(new_records)))
+                for i in self.filter.select(self.search_columns, start):
+                    self.matching[i] = 1
+            if mode_changed:
+                self.sorted_rows = self._sorted(self.sort_column, self.sort_order)
+                return
+            keys = self._sort_keys(self.sort_column)
+            # Both runs are already in order, so this sort is a linear merge
+            new_rows = sorted(range(start, len(self.records)), key=keys.__getitem__,
+                              reverse=self.sort_order == Qt.DescendingOrder)
+            self.sorted_rows = sorted(self.sorted_rows + new_rows, key=keys.__getitem__,
+                                      reverse=self.sort_order == Qt.DescendingOrder)
+        self._relayout(merge)
+
+    # -- Filtering --
+    def set_filter(self, query):
+        """Show only records matching query (see ui/results_filter.py for the syntax)"""
+        self.beginResetModel()
+        self.filter = ResultFilter(query)
+        self.matching = self._matching()
+        self.rows = self._filtered(self.sorted_rows)
+        self.endResetModel()
+
+    def _matching(self):
+        if not self.filter:
+            return None
+        matching = bytearray(len(self.records))
+        for i in self.filter.select(self.search_columns):
+            matching[i] = 1
+        return matching
+
+    def _filtered(self, rows):
+        if self.matching is None:
+            return rows
+        matching = self.matching
+        return [r for r in rows if matching[r]]
+
+    # -- Cell values and sort keys --
+    def modified_time(self, record_index):
+        """mtime of the file behind a record, looked up once and cached (-1 if unavailable)
+
+        A file inside a packed cache entry has no mtime of its own; the pack's is used.
+        """
+        mtime = self.mtimes.get(record_index)
+        if mtime is None:
+            path = self.records[record_index][1]
+            pack = split_pack_path(path)
+            try:
+                mtime = os.path.getmtime(pack[0] if pack else path)
+            except OSError:
+                mtime = -1
+            self.mtimes[record_index] = mtime
+        return mtime
+
+    def display(self, record_index, column):
+        path, file, occurrences, matched_terms, matched_line = self.records[record_index]
+        if column == 0:
+            return shorten_path(path)
+        if column == 1:
+            return shorten_path(file) if self.dll_mode else os.path.basename(path)
+        if column == 2:
+            return shorten_path(path) if self.dll_mode else os.path.dirname(path)
+        if column == COL_MODIFIED:
+            mtime = self.modified_time(record_index)
+            return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S') if mtime >= 0 else "Unknown"
+        if column == COL_OCCURRENCES:
+            return occurrences
+        if column == COL_TERMS:
+            return ", ".join(matched_terms)
+        return matched_line or ''
+
+    def _sort_key(self, record_index, column):
+        if column == COL_MODIFIED:
+            return self.modified_time(record_index)
+        if column == COL_OCCURRENCES:
+            return self.records[record_index][2]
+        if column == COL_TERMS:
+            # Matched Terms sorts by how many terms matched
+            return len(self.records[record_index][3])
+        return self.display(record_index, column)
+
+    def _sort_keys(self, column):
+        # Computed once per column and record, and reused for both directions
+        keys = self.sort_keys.setdefault(column, [])
+        if len(keys) < len(self.records):
+            keys.extend(self._sort_key(i, column) for i in range(len(keys), len(self.records)))
+        return keys
+
+    def _sorted(self, column, order):
+        keys = self._sort_keys(column)
+        return sorted(range(len(self.records)), key=keys.__getitem__, reverse=order == Qt.DescendingOrder)
@@ -3,14 +3,20 @@ Results window displaying scan results in a table
 """
 
 import os
+import json
 from datetime import datetime
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                            QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                            QLabel, QTableView, QHeaderView, QAbstractItemView,
                             QMessageBox, QFileDialog, QGroupBox, QLineEdit, QDialog, QDialogButtonBox, QRadioButton)
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont
-from libs.util import shorten_path
 from ui.dll_dialogs import OpenDllDialog, OpenDllFolderDialog
+from ui.results_model import ResultsTableModel, is_dll_result, COL_OCCURRENCES
+from libs.Settings import Settings
+from core.decomp_pack import materialize
+
+# Milliseconds of typing pause before the filter is applied
+FILTER_DELAY_MS = 250
 
 class ResultsWindow(QWidget):
     """Window displaying scan results in a table format"""
@@ -19,6 +25,9 @@ class ResultsWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.scan_results = []
+        self.search_string = ""
+        # Timing report of the scan that produced the results, if known
+        self.scan_report = None
         self.initUI()
         
     def initUI(self):
@@ -45,10 +54,25 @@ class ResultsWindow(QWidget):
         filter_group = QGroupBox("Filter Results")
         filter_layout = QHBoxLayout()
         
-        filter_label = QLabel("Filter by filename:")
+        filter_label = QLabel("Filter:")
         self.filter_input = QLineEdit()
-        self.filter_input.setPlaceholderText("Enter filename filter...")
-        self.filter_input.textChanged.connect(self.filter_results)
+        self.filter_input.setPlaceholderText("Text, term:Process.Start, dir:294100, name:Foo.cs, line:\"new Foo\", occ>5 ...")
+        self.filter_input.setToolTip(
+            "All clauses must match (case-insensitive):\n"
+            "  text            anywhere in path, matched terms or matched line\n"
+            "  term:text       a matched term\n"
+            "  dir:text        the directory\n"
+            "  name:text       the file name\n"
+            "  path:text       the full path\n"
+            "  line:text       the matched line\n"
+            "  occ>5           occurrences (>, >=, <, <=, =, !=)\n"
+            "Use quotes for text with spaces.")
+        # Re-filter once typing pauses rather than on every keystroke
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.filter_results)
+        self.filter_input.textChanged.connect(self.filter_timer.start)
         
         self.clear_filter_button = QPushButton("Clear Filter")
         self.clear_filter_button.clicked.connect(self.clear_filter)
@@ -61,22 +85,22 @@ class ResultsWindow(QWidget):
         filter_group.setLayout(filter_layout)
         layout.addWidget(filter_group)
         
-        # Results table
-        self.results_table = QTableWidget()
-        self.results_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.results_table.setColumnCount(7)
-        self.results_table.setHorizontalHeaderLabels([
-            "File Path", "Filename", "Directory", "Last Modified", "Occurrences", "Matched Terms", "Matched Line"
-        ])
+        # Results table; the model builds cell text only for rows on screen
+        self.results_model = ResultsTableModel(self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         # Make all columns user-resizeable
         header = self.results_table.horizontalHeader()
-        for i in range(self.results_table.columnCount()):
-            header.setSectionResizeMode(i, QHeaderView.Interactive)
-        # Enable sorting
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        # Fixed row heights so the view never measures rows it does not show
+        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # Sorting is done by the model; most occurrences first by default
+        header.setSortIndicator(COL_OCCURRENCES, Qt.DescendingOrder)
         self.results_table.setSortingEnabled(True)
         
         # Enable row selection
-        self.results_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         
         layout.addWidget(self.results_table)
         
@@ -124,230 +148,133 @@ class ResultsWindow(QWidget):
         # Connect table selection change
         self.results_table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
-    def display_results(self, results, search_string=""):
-        """Display scan results in the table"""
-        self.scan_results = results
+    def display_results(self, results, search_string="", scanning=False):
+        """Display scan results in the table; with scanning set, more arrive through append_results"""
+        self.scan_results = list(results)
+        self.search_string = search_string
         self.populate_table(results)
         
         # Update summary
-        if results:
-            self.summary_label.setText(f"Found {len(results)} files")
-            self.export_button.setEnabled(True)
-        else:
-            self.summary_label.setText("No results found")
-            self.export_button.setEnabled(False)
-            
-        # Update window title with search string
-        if search_string:
-            self.setWindowTitle(f"XML Scanner - Results for '{search_string}'")
-        else:
-            self.setWindowTitle("XML Scanner - Results")
+        self.update_summary()
+        self.export_button.setEnabled(bool(results))
+        self.set_scanning(scanning)
+
+    def append_results(self, results):
+        """Add results streamed in while the scan is still running"""
+        first = not self.scan_results
+        self.scan_results.extend(results)
+        self.results_model.append_results(results)
+        if first:
+            self.results_table.resizeColumnsToContents()
+        self.update_summary()
+        self.export_button.setEnabled(bool(self.scan_results))
+
+    def set_scanning(self, scanning):
+        """Show in the title whether the scan is still adding results"""
+        title = f"XML Scanner - Results for '{self.search_string}'" if self.search_string else "XML Scanner - Results"
+        self.setWindowTitle(f"{title} (scanning...)" if scanning else title)
             
     def populate_table(self, results):
         """Populate the table with results"""
-        # Determine if any DLL results (tuple of 4 or 5)
-        has_dll = any(isinstance(r, tuple) and (len(r) == 4 or len(r) == 5) for r in results)
-        if has_dll:
-            self.results_table.setColumnCount(7)
-            self.results_table.setHorizontalHeaderLabels([
-                "DLL Path", "Decompiled File", "Directory", "Last Modified", "Occurrences", "Matched Terms", "Matched Line"
-            ])
-        else:
-            self.results_table.setColumnCount(7)
-            self.results_table.setHorizontalHeaderLabels([
-                "File Path", "Filename", "Directory", "Last Modified", "Occurrences", "Matched Terms", "Matched Line"
-            ])
-        self.results_table.setRowCount(len(results))
-        for row, result in enumerate(results):
-            if has_dll and isinstance(result, tuple) and (len(result) == 4 or len(result) == 5):
-                # DLL: (dll_path, decomp_file, occ, matched_terms, matched_line) or (dll_path, decomp_file, occ, matched_terms)
-                if len(result) == 5:
-                    dll_path, decomp_file, occurrence_count, matched_terms, matched_line = result
-                else:
-                    dll_path, decomp_file, occurrence_count, matched_terms = result
-                    matched_line = ''
-                self.results_table.setItem(row, 0, QTableWidgetItem(shorten_path(dll_path)))
-                decomp_item = QTableWidgetItem(shorten_path(decomp_file))
-                decomp_item.setData(Qt.UserRole, (dll_path, decomp_file))
-                self.results_table.setItem(row, 1, decomp_item)
-                self.results_table.setItem(row, 2, QTableWidgetItem(shorten_path(dll_path)))
-                try:
-                    mtime = os.path.getmtime(decomp_file)
-                    modified_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    modified_time = "Unknown"
-                self.results_table.setItem(row, 3, QTableWidgetItem(modified_time))
-                occurrence_item = QTableWidgetItem()
-                occurrence_item.setData(Qt.DisplayRole, occurrence_count)
-                self.results_table.setItem(row, 4, occurrence_item)
-                matched_terms_item = QTableWidgetItem(", ".join(matched_terms))
-                matched_terms_item.setData(Qt.UserRole, len(matched_terms))
-                self.results_table.setItem(row, 5, matched_terms_item)
-                self.results_table.setItem(row, 6, QTableWidgetItem(matched_line or ''))
-            else:
-                # XML: (filepath, filepath, occ, matched_terms, matched_line) or (filepath, occ, matched_terms)
-                if len(result) == 5:
-                    filepath, _, occurrence_count, matched_terms, matched_line = result
-                elif len(result) == 3:
-                    filepath, occurrence_count, matched_terms = result
-                    matched_line = ''
-                else:
-                    filepath, occurrence_count = result
-                    matched_terms = []
-                    matched_line = ''
-                item = QTableWidgetItem(shorten_path(filepath))
-                item.setData(Qt.UserRole, filepath)
-                self.results_table.setItem(row, 0, item)
-                filename = os.path.basename(filepath)
-                self.results_table.setItem(row, 1, QTableWidgetItem(filename))
-                self.results_table.setItem(row, 2, QTableWidgetItem(os.path.dirname(filepath)))
-                try:
-                    mtime = os.path.getmtime(filepath)
-                    modified_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    modified_time = "Unknown"      
-                self.results_table.setItem(row, 3, QTableWidgetItem(modified_time))
-                occurrence_item = QTableWidgetItem()
-                occurrence_item.setData(Qt.DisplayRole, occurrence_count)
-                self.results_table.setItem(row, 4, occurrence_item)
-                matched_terms_item = QTableWidgetItem(", ".join(matched_terms))
-                matched_terms_item.setData(Qt.UserRole, len(matched_terms))
-                self.results_table.setItem(row, 5, matched_terms_item)
-                self.results_table.setItem(row, 6, QTableWidgetItem(matched_line or ''))
-        # Sort by occurrences (column 4) in descending order so items with more matches are at the top
-        self.results_table.sortItems(4, Qt.DescendingOrder)
+        self.results_model.set_results(results)
         self.results_table.resizeColumnsToContents()
 
-        # Enable custom sorting for Matched Terms column (by number of terms)
-        self.results_table.horizontalHeader().sectionClicked.connect(self.handle_section_clicked)
-
-    def handle_section_clicked(self, logicalIndex):
-        # Custom sort for Matched Terms column (index 5)
-        if logicalIndex == 5:
-            self.results_table.setSortingEnabled(False)
-            # Extract (row, count) pairs
-            row_counts = []
-            for row in range(self.results_table.rowCount()):
-                item = self.results_table.item(row, 5)
-                count = item.data(Qt.UserRole) if item else 0
-                row_counts.append((row, count))
-            # Sort rows by count descending
-            sorted_rows = sorted(row_counts, key=lambda x: x[1], reverse=True)
-            # Rearrange rows
-            for new_row, (old_row, _) in enumerate(sorted_rows):
-                for col in range(self.results_table.columnCount()):
-                    item = self.results_table.takeItem(old_row, col)
-                    self.results_table.setItem(new_row, col, item)
-            self.results_table.setSortingEnabled(True)
+    def update_summary(self):
+        """Show the result count, and how many pass the filter"""
+        total = len(self.results_model.records)
+        shown = self.results_model.rowCount()
+        if not total:
+            self.summary_label.setText("No results found")
+        elif shown == total:
+            self.summary_label.setText(f"Found {total} files")
         else:
-            # Default sorting
-            self.results_table.setSortingEnabled(True)
-            self.results_table.sortItems(logicalIndex, Qt.DescendingOrder)
+            self.summary_label.setText(f"Showing {shown} of {total} files")
 
     def filter_results(self):
-        """Filter results based on filename filter"""
-        filter_text = self.filter_input.text().lower()
-        
-        for row in range(self.results_table.rowCount()):
-            filename_item = self.results_table.item(row, 1)
-            if filename_item:
-                filename = filename_item.text().lower()
-                should_show = filter_text in filename
-                self.results_table.setRowHidden(row, not should_show)
+        """Filter results with the query in the filter box"""
+        self.filter_timer.stop()
+        self.results_model.set_filter(self.filter_input.text())
+        self.update_summary()
                 
     def clear_filter(self):
-        """Clear the filename filter"""
+        """Clear the filter"""
         self.filter_input.clear()
-        
-        # Show all rows
-        for row in range(self.results_table.rowCount()):
-            self.results_table.setRowHidden(row, False)
+        self.filter_results()
             
     def on_selection_changed(self):
         """Handle table selection changes"""
-        has_selection = len(self.results_table.selectedItems()) > 0
+        has_selection = self.results_table.selectionModel().hasSelection()
         self.open_file_button.setEnabled(has_selection)
         self.open_dir_button.setEnabled(has_selection)
         self.copy_path_button.setEnabled(has_selection)
         
+    def selected_record(self):
+        """The (path, file, occurrences, matched_terms, matched_line) record of the current row, or None"""
+        index = self.results_table.currentIndex()
+        return self.results_model.record(index.row()) if index.isValid() else None
+
     def open_selected_file(self):
         """Open the selected file in its default application (for DLLs, open the decompiled file)"""
-        current_row = self.results_table.currentRow()
-        if current_row >= 0:
-            has_dll = self.results_table.horizontalHeaderItem(0).text().lower().startswith("dll")
-            if has_dll:
-                item = self.results_table.item(current_row, 1)
-                data = item.data(Qt.UserRole) if item else None
-                if data and isinstance(data, tuple) and len(data) == 2:
-                    dll_path, decomp_file = data
-                    dialog = OpenDllDialog(self)
-                    if dialog.exec_() == QDialog.Accepted:
-                        choice = dialog.get_choice()
-                        if choice == 'ilspy':
-                            try:
-                                import subprocess
-                                # Assuming ILSpy is installed and available in PATH
-                                subprocess.run(['ilspy', dll_path], check=True)
-                            except Exception as e:
-                                QMessageBox.critical(self, "Error", f"Could not open DLL in ILSpy: {str(e)}")
-                        else:
-                            try:
-                                os.startfile(decomp_file)
-                            except Exception as e:
-                                QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
-                else:
-                    filepath = None
+        record = self.selected_record()
+        if record:
+            if is_dll_result(record):
+                dll_path, decomp_file = record[0], record[1]
+                dialog = OpenDllDialog(self)
+                if dialog.exec_() == QDialog.Accepted:
+                    choice = dialog.get_choice()
+                    if choice == 'ilspy':
+                        try:
+                            import subprocess
+                            # Assuming ILSpy is installed and available in PATH
+                            subprocess.run(['ilspy', dll_path], check=True)
+                        except Exception as e:
+                            QMessageBox.critical(self, "Error", f"Could not open DLL in ILSpy: {str(e)}")
+                    else:
+                        try:
+                            # Files in a packed cache entry are extracted on first open
+                            os.startfile(materialize(decomp_file))
+                        except Exception as e:
+                            QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
             else:
-                item = self.results_table.item(current_row, 0)
-                filepath = item.data(Qt.UserRole) if item else None
-                if filepath:
-                    try:
-                        os.startfile(filepath)
-                    except Exception as e:
-                        QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
+                filepath = record[0]
+                try:
+                    os.startfile(filepath)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Could not open file: {str(e)}")
                 
     def open_selected_directory(self):
         """Open the directory containing the selected file or DLL/decompiled file"""
-        current_row = self.results_table.currentRow()
-        if current_row >= 0:
-            has_dll = self.results_table.horizontalHeaderItem(0).text().lower().startswith("dll")
-            if has_dll:
-                item = self.results_table.item(current_row, 1)
-                data = item.data(Qt.UserRole) if item else None
-                if data and isinstance(data, tuple) and len(data) == 2:
-                    dll_path, decomp_file = data
-                    dialog = OpenDllFolderDialog(self)
-                    if dialog.exec_() == QDialog.Accepted:
-                        choice = dialog.get_choice()
+        record = self.selected_record()
+        if record:
+            if is_dll_result(record):
+                dll_path, decomp_file = record[0], record[1]
+                dialog = OpenDllFolderDialog(self)
+                if dialog.exec_() == QDialog.Accepted:
+                    choice = dialog.get_choice()
+                    try:
                         if choice == 'dll':
                             directory = os.path.dirname(dll_path)
                         else:
-                            directory = os.path.dirname(decomp_file)
-                        try:
-                            os.startfile(directory)
-                        except Exception as e:
-                            QMessageBox.critical(self, "Error", f"Could not open directory: {str(e)}")
-            else:
-                item = self.results_table.item(current_row, 0)
-                filepath = item.data(Qt.UserRole) if item else None
-                if filepath:
-                    directory = os.path.dirname(filepath)
-                    try:
+                            directory = os.path.dirname(materialize(decomp_file, whole_pack=True))
                         os.startfile(directory)
                     except Exception as e:
                         QMessageBox.critical(self, "Error", f"Could not open directory: {str(e)}")
+            else:
+                directory = os.path.dirname(record[0])
+                try:
+                    os.startfile(directory)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Could not open directory: {str(e)}")
                 
     def copy_selected_path(self):
-        """Copy the selected file path to clipboard"""
-        current_row = self.results_table.currentRow()
-        if current_row >= 0:
-            item = self.results_table.item(current_row, 0)
-            filepath = item.data(Qt.UserRole) if item else None
-            if filepath:
-                from PyQt5.QtWidgets import QApplication
-                clipboard = QApplication.clipboard()
-                clipboard.setText(filepath)
-                QMessageBox.information(self, "Copied", f"File path copied to clipboard:\n{filepath}")
+        """Copy the selected file path (the DLL path for DLL results) to clipboard"""
+        record = self.selected_record()
+        if record:
+            filepath = record[0]
+            from PyQt5.QtWidgets import QApplication
+            clipboard = QApplication.clipboard()
+            clipboard.setText(filepath)
+            QMessageBox.information(self, "Copied", f"File path copied to clipboard:\n{filepath}")
             
     def export_results(self):
         """Export results to a CSV file"""
@@ -390,14 +317,22 @@ class ResultsWindow(QWidget):
                         directory_escaped = directory.replace('"', '""')
                         matched_line_escaped = (matched_line or '').replace('"', '""')
                         f.write(f'"{filepath_escaped}","{filename_escaped}","{directory_escaped}","{modified_time}",{occurrence_count},"{matched_line_escaped}"\n')
-                QMessageBox.information(self, "Export Complete", f"Results exported to:\n{filename}")
+                message = f"Results exported to:\n{filename}"
+                # The scan's timing report goes next to the CSV unless turned off in settings.json
+                if self.scan_report is not None and Settings().get('export_scan_report', True):
+                    report_filename = os.path.splitext(filename)[0] + '.report.json'
+                    with open(report_filename, 'w', encoding='utf-8') as f:
+                        json.dump(self.scan_report, f, indent=2)
+                    message += f"\nScan report:\n{report_filename}"
+                QMessageBox.information(self, "Export Complete", message)
             except Exception as e:
                 QMessageBox.critical(self, "Export Error", f"Could not export results: {str(e)}")
                 
     def clear_results(self):
         """Clear all results"""
-        self.results_table.setRowCount(0)
-        self.scan_results.clear()
+        self.scan_results = []
+        self.scan_report = None
+        self.results_model.set_results([])
         self.summary_label.setText("No results")
         self.export_button.setEnabled(False)
         self.clear_filter()
@@ -5,10 +5,15 @@ Scan progress window showing real-time scanning status
 import os
 from datetime import datetime
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                            QLabel, QProgressBar, QTextEdit, QMessageBox)
+                            QLabel, QProgressBar, QPlainTextEdit, QMessageBox)
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QFont
 from libs.util import shorten_path
+from core.stats import format_report
+
+# Lines kept in the scan log; older ones are dropped as new batches arrive
+LOG_MAX_LINES = 5000
+
 class ScanProgressWindow(QWidget):
     """Window showing scan progress and status"""
     scan_cancelled = pyqtSignal()
@@ -17,6 +22,7 @@ class ScanProgressWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.scan_worker = None
+        self.cancelling = False
         self.initUI()
         
     def initUI(self):
@@ -63,8 +69,9 @@ class ScanProgressWindow(QWidget):
         log_label.setFont(QFont("Arial", 12, QFont.Bold))
         layout.addWidget(log_label)
         
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
         self.log_text.setFont(QFont("Consolas", 9))
         layout.addWidget(self.log_text)
         
@@ -95,6 +102,7 @@ class ScanProgressWindow(QWidget):
     def start_scan(self, scan_worker):
         """Start the scan with the given worker"""
         self.scan_worker = scan_worker
+        self.cancelling = False
         self.scan_results.clear()
         self.files_found_count = 0
         # Reset stats label
@@ -102,9 +110,10 @@ class ScanProgressWindow(QWidget):
 
         # Connect signals
         self.scan_worker.progress_updated.connect(self.update_progress)
-        self.scan_worker.status_updated.connect(self.update_status)
-        self.scan_worker.file_found.connect(self.file_found)
+        self.scan_worker.status_batch.connect(self.update_status)
+        self.scan_worker.files_found_batch.connect(self.files_found)
         self.scan_worker.scan_completed.connect(self.scan_completed)
+        self.scan_worker.scan_report.connect(self.show_report)
         # Connect to new files_counted signal
         if hasattr(self.scan_worker, 'files_counted'):
             self.scan_worker.files_counted.connect(self.update_file_counts)
@@ -122,33 +131,47 @@ class ScanProgressWindow(QWidget):
         """Update progress bar"""
         self.progress_bar.setValue(value)
         
-    def update_status(self, message):
-        """Update status label and log"""
-        self.status_label.setText(message)
+    def append_log(self, messages):
+        """Append messages to the log in one block and scroll to the bottom"""
         timestamp = datetime.now().strftime('%H:%M:%S')
-        self.log_text.append(f"[{timestamp}] {message}")
-        
-        # Auto-scroll to bottom
+        self.log_text.appendPlainText("\n".join(f"[{timestamp}] {message}" for message in messages))
         scrollbar = self.log_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
-        
-    def file_found(self, filename, occurrence_count, matches):
-        """Handle file found event"""
-        self.files_found_count += 1
+
+    def update_status(self, messages, dropped):
+        """Update status label and log from a batch of status messages"""
+        self.status_label.setText(messages[-1])
+        if dropped:
+            messages = [f"... {dropped} messages skipped ..."] + messages
+        self.append_log(messages)
+        
+    def files_found(self, found):
+        """Handle a batch of found (path, file, occurrence_count, matched_terms, matched_line) records"""
+        self.files_found_count += len(found)
         self.stats_label.setText(f"Files found: {self.files_found_count}")
+        self.append_log([f"✓ Found match: {os.path.basename(filename)} ({occurrence_count} occurrences) - [{', '.join(matches)}]"
+                         for _, filename, occurrence_count, matches, _ in found])
         
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        basename = os.path.basename(filename)
-        self.log_text.append(f"[{timestamp}] ✓ Found match: {basename} ({occurrence_count} occurrences) - [{', '.join(matches)}]")
-          # Auto-scroll to bottom
-        scrollbar = self.log_text.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
-        
+    def show_report(self, report):
+        """Log the stage timings and counters of the finished scan"""
+        self.append_log(["=== SCAN TIMING ==="] + format_report(report))
+
     def scan_completed(self, results):
         """Handle scan completion"""
         self.scan_results = results
         self.cancel_button.setEnabled(False)
         self.close_button.setEnabled(True)
+
+        if self.cancelling:
+            self.setWindowTitle("XML & DLL Scanner - Scan Cancelled (Log)")
+            self.status_label.setText(f"Scan cancelled by user. Kept {len(results)} files with matches.")
+            self.append_log(["=== SCAN CANCELLED ==="])
+            # Partial results are still worth showing
+            if results:
+                self.scan_finished.emit(results)
+            else:
+                self.scan_cancelled.emit()
+            return
         
         # Update window title to indicate completion
         self.setWindowTitle("XML & DLL Scanner - Scan Complete (Log)")
@@ -160,13 +183,8 @@ class ScanProgressWindow(QWidget):
         else:
             self.status_label.setText("Scan completed. No matches found.")
         
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        self.log_text.append(f"[{timestamp}] === SCAN COMPLETE ===")
-        self.log_text.append(f"[{timestamp}] Note: This log window can remain open while viewing results")
-        
-        # Auto-scroll to bottom
-        scrollbar = self.log_text.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        self.append_log(["=== SCAN COMPLETE ===",
+                         "Note: This log window can remain open while viewing results"])
         
         self.scan_finished.emit(results)
     def cancel_scan(self):
@@ -176,18 +194,13 @@ class ScanProgressWindow(QWidget):
                                        "Are you sure you want to cancel the scan?",
                                        QMessageBox.Yes | QMessageBox.No)
             
-            if reply == QMessageBox.Yes:
-                self.scan_worker.terminate()
-                self.scan_worker.wait()  # Wait for thread to finish
-                
-                self.status_label.setText("Scan cancelled by user")
+            if reply == QMessageBox.Yes and self.scan_worker.isRunning():
+                # The worker winds down on its own and reports what it found
+                # through scan_completed, handled above
+                self.cancelling = True
+                self.scan_worker.cancel()
+                self.status_label.setText("Cancelling scan...")
                 self.cancel_button.setEnabled(False)
-                self.close_button.setEnabled(True)
-                
-                timestamp = datetime.now().strftime('%H:%M:%S')
-                self.log_text.append(f"[{timestamp}] === SCAN CANCELLED ===")
-                
-                self.scan_cancelled.emit()
                 
     def closeEvent(self, event):
         """Handle window close event"""
@@ -197,7 +210,8 @@ class ScanProgressWindow(QWidget):
                                        QMessageBox.Yes | QMessageBox.No)
             
             if reply == QMessageBox.Yes:
-                self.scan_worker.terminate()
+                self.cancelling = True
+                self.scan_worker.cancel()
                 self.scan_worker.wait()
                 event.accept()
             else:
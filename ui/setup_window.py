@@ -9,6 +9,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QFont
 from libs.Settings import Settings
+from core.matcher import TermMatcher, parse_terms
 settings = Settings()
 class SetupWindow(QWidget):
     """Window for configuring scan parameters"""
@@ -113,7 +114,9 @@ class SetupWindow(QWidget):
                            "• Def names: 'Steel', 'ComponentIndustrial'\n" +
                            "• XML tags: '<defName>', '<workType>'\n" +
                            "• Attributes: 'Abstract=\"true\"'\n" +
-                           "Search is case-sensitive and searches file content.")
+                           "• Wildcards: 'System.Reflection.Emit.*'\n" +
+                           "• Regular expressions: 're:Marshal\\.(Alloc|Free)HGlobal'\n" +
+                           "Separate terms with ';'. Search is case-insensitive and searches file content.")
         
         search_layout.addWidget(self.search_label)
         search_layout.addWidget(self.search_input)
@@ -179,6 +182,12 @@ class SetupWindow(QWidget):
             QMessageBox.critical(self, "Error", 
                                 f"The following directories do not exist:\n" + "\n".join(invalid_dirs))
             return
+
+        try:
+            TermMatcher(parse_terms(search_string))
+        except ValueError as e:
+            QMessageBox.critical(self, "Error", f"Invalid search term:\n{e}")
+            return
             
         # Save settings
         settings.set('base_directory', base_dir)